@@ -0,0 +1,341 @@
+"""
+Аналитика GrimmStats поверх индекса свёрток по дням (DayStorage.index), без Qt.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from stats_core import RELOAD_EVENTS, AppState, DayStorage, StateEvent
+
+
+@dataclass
+class ItemYield:
+	"""Итоги по одному предмету за период."""
+	category: str
+	item: str
+	qty: float
+	unit: Optional[str]
+	income: int
+	seconds: int
+	per_hour: float  # доход за час, отработанный на этот предмет
+	avg_price: Optional[float]
+	level: Optional[int] = None
+
+
+def item_yield(storage: DayStorage, start: date, end: date, category: Optional[str] = None) -> List[ItemYield]:
+	"""Доход в час по предметам за период, по убыванию дохода в час.
+
+	Время сессии распределяется по предметам по отрезкам между продажами (см. rollup_day);
+	продажи вне сессий дают доход без времени и per_hour = 0.
+	"""
+	rows: List[ItemYield] = []
+	for (cat, item), acc in storage.index.items_between(start, end, category).items():
+		seconds = int(acc.get("seconds", 0))
+		income = int(acc["amount"])
+		rows.append(ItemYield(
+			category=cat,
+			item=item,
+			qty=acc["qty"],
+			unit=acc.get("unit"),
+			income=income,
+			seconds=seconds,
+			per_hour=(income / (seconds / 3600.0)) if seconds > 0 else 0.0,
+			avg_price=acc.get("avg_price"),
+			level=acc.get("level"),
+		))
+	rows.sort(key=lambda r: (r.per_hour, r.income), reverse=True)
+	return rows
+
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+# Меньше стольких секунд работы в ячейке — ставка не показывается (шум от коротких кусочков)
+HEATMAP_MIN_SECONDS = 300
+
+
+def hour_heatmap(storage: DayStorage, start: date, end: date, category: Optional[str] = None) -> Tuple[List[List[Optional[float]]], List[List[int]]]:
+	"""Средний доход в час по (день недели, час суток) за период.
+
+	Возвращает (ставки 7×24, секунды 7×24); ставка None — в ячейке слишком мало работы.
+	Считается по почасовым корзинам индекса, сырые транзакции не читаются.
+	"""
+	net, seconds = storage.index.hour_grid(start, end, category)
+	rates: List[List[Optional[float]]] = []
+	for weekday in range(7):
+		row: List[Optional[float]] = []
+		for hour in range(24):
+			sec = seconds[weekday][hour]
+			row.append(net[weekday][hour] / (sec / 3600.0) if sec >= HEATMAP_MIN_SECONDS else None)
+		rates.append(row)
+	return rates, seconds
+
+
+@dataclass
+class SessionRow:
+	"""Строка журнала сессий."""
+	day: date
+	category: str
+	start: datetime
+	end: Optional[datetime]  # None — сессия ещё идёт
+	seconds: int
+	income: int
+	expense: int
+	net: int
+	per_hour: float
+	transactions: int
+
+
+def session_ledger(days: Iterable[Tuple[date, Dict[str, Any]]], category: Optional[str] = None,
+		now: Optional[datetime] = None) -> List[SessionRow]:
+	"""Журнал сессий за дни (например, DayStorage.iter_days) в один проход слияния.
+
+	Сессии и транзакции дня сортируются по времени и сливаются; транзакция относится к
+	идущей в этот момент сессии своей категории (как в AppState.session_totals).
+	"""
+	now = now or datetime.now()
+	rows: List[SessionRow] = []
+	for d, raw in days:
+		day_end = datetime.combine(d, datetime.min.time()) + timedelta(days=1)
+		# События: (время, порядок, ...); при равном времени начало сессии раньше транзакции,
+		# а конец — позже, чтобы границы включались как в session_totals
+		events: List[Tuple[datetime, int, int, Any]] = []
+		for s in raw.get("sessions", []):
+			cat = s.get("category", "trucker")
+			if category is not None and cat != category:
+				continue
+			try:
+				start = datetime.fromisoformat(s.get("start_iso") or s.get("start"))
+				end = datetime.fromisoformat(s["end_iso"]) if s.get("end_iso") else None
+			except (TypeError, ValueError):
+				continue
+			row = SessionRow(d, cat, start, end, 0, 0, 0, 0, 0.0, 0)
+			rows.append(row)
+			events.append((start, 0, len(events), row))
+			events.append((end or min(now, day_end), 2, len(events), row))
+		for t in raw.get("transactions", []):
+			cat = t.get("category", "trucker")
+			if category is not None and cat != category:
+				continue
+			try:
+				when = datetime.fromisoformat(t.get("time_iso") or t.get("time"))
+			except (TypeError, ValueError):
+				continue
+			events.append((when, 1, len(events), t))
+		events.sort(key=lambda e: (e[0], e[1], e[2]))
+		active: Dict[str, SessionRow] = {}
+		for _when, order, _seq, payload in events:
+			if order == 0:
+				active[payload.category] = payload
+			elif order == 2:
+				if active.get(payload.category) is payload:
+					del active[payload.category]
+			else:
+				row = active.get(payload.get("category", "trucker"))
+				if row is None:
+					continue
+				amount = int(payload.get("amount", 0))
+				if payload.get("type") == "income":
+					row.income += amount
+				else:
+					row.expense += -amount
+				row.net += amount
+				row.transactions += 1
+	for row in rows:
+		end = row.end or min(now, datetime.combine(row.day, datetime.min.time()) + timedelta(days=1))
+		row.seconds = max(0, int((end - row.start).total_seconds()))
+		row.per_hour = row.net / (row.seconds / 3600.0) if row.seconds > 0 else 0.0
+	rows.sort(key=lambda r: r.start)
+	return rows
+
+
+# Сколько прошлых дней входит в почасовой профиль прогноза
+PROFILE_DAYS = 28
+# Поправка на сегодняшнюю форму (живой темп / исторический) ограничивается этим множителем
+FORM_FACTOR_LIMIT = 4.0
+
+
+@dataclass
+class HourProfile:
+	"""Типичный день категории: средние за день отработанные секунды и чистая прибыль по часам."""
+	seconds: List[float]
+	net: List[float]
+	days: int
+
+	@property
+	def rate(self) -> Optional[float]:
+		"""Исторический доход за час работы по всем часам."""
+		total = sum(self.seconds)
+		return sum(self.net) / (total / 3600.0) if total >= HEATMAP_MIN_SECONDS else None
+
+	def hour_rate(self, hour: int) -> Optional[float]:
+		sec = self.seconds[hour]
+		return self.net[hour] / (sec / 3600.0) if sec >= HEATMAP_MIN_SECONDS else self.rate
+
+
+def hour_profile(storage: DayStorage, before: date, category: str, days: int = PROFILE_DAYS) -> HourProfile:
+	"""Профиль по почасовым корзинам индекса за days дней до before (не включая его).
+
+	Усредняется по дням, за которые есть файл: выходные без игры профиль не размывают.
+	"""
+	seconds = [0.0] * 24
+	net = [0.0] * 24
+	count = 0
+	for _d, entry in storage.index.rollups(before - timedelta(days=days), before - timedelta(days=1)):
+		count += 1
+		for hour, (h_net, h_sec) in entry.get("hours", {}).get(category, {}).items():
+			net[int(hour)] += h_net
+			seconds[int(hour)] += h_sec
+	if count:
+		seconds = [v / count for v in seconds]
+		net = [v / count for v in net]
+	return HourProfile(seconds=seconds, net=net, days=count)
+
+
+@dataclass
+class Forecast:
+	"""Прогноз по категории на текущий день и прогресс к цели."""
+	category: str
+	period: Optional[str]  # "day" | "week" | None — цели нет
+	goal: Optional[int]
+	achieved: int  # чистая прибыль за период цели (или за день без цели)
+	rate: Optional[float]  # темп, по которому считается ETA
+	rate_source: Optional[str]  # live | history | today
+	projected_day: float  # ожидаемая чистая прибыль к концу дня
+	projected_period: float
+	eta_seconds: Optional[float] = None  # сколько ещё работать до цели; 0 — цель достигнута
+	eta_at: Optional[datetime] = None  # когда цель будет достигнута, если работать без перерыва
+
+
+class GoalForecaster:
+	"""Цели на день/неделю, ETA и прогноз конца дня по категориям.
+
+	Исторический профиль и сумма прошлых дней недели кешируются до смены дня или
+	перечитывания истории; итоги сегодняшнего дня досчитываются только по новым
+	транзакциям AppState, поэтому forecast() дёшев и вызывается на каждом тике.
+	"""
+
+	def __init__(self, state: AppState, goals: Optional[Dict[str, Dict[str, int]]] = None,
+			profile_days: int = PROFILE_DAYS) -> None:
+		self.state = state
+		self.profile_days = profile_days
+		self.goals: Dict[str, Dict[str, int]] = {}
+		self.set_goals(goals or {})
+		self._profiles: Dict[str, HourProfile] = {}
+		self._week_past: Dict[str, int] = {}
+		self._cache_day: Optional[date] = None
+		self._tx_list: Optional[list] = None
+		self._tx_seen = 0
+		self._today_net: Dict[str, int] = {}
+		state.subscribe(self._on_state_event)
+
+	def set_goals(self, goals: Dict[str, Dict[str, int]]) -> None:
+		"""goals: {категория: {"day": сумма, "week": сумма}}; 0 или отсутствие — цели нет.
+
+		Обе цели считаются независимо (см. forecasts()).
+		"""
+		self.goals = {cat: {k: int(v) for k, v in g.items() if k in ("day", "week") and int(v) > 0}
+			for cat, g in goals.items()}
+
+	def _on_state_event(self, event: StateEvent) -> None:
+		if event.kind in RELOAD_EVENTS:
+			# Записи дня правились на месте — сумму дня пересоберём заново
+			self._tx_list = None
+			if event.kind != "edited":
+				# История могла измениться (импорт, сброс) — профиль и неделю пересчитаем лениво
+				self._cache_day = None
+
+	def _sync(self) -> None:
+		if self._cache_day != self.state.day:
+			self._profiles = {}
+			self._week_past = {}
+			self._cache_day = self.state.day
+		txs = self.state.transactions
+		if txs is not self._tx_list or len(txs) < self._tx_seen:
+			self._tx_list, self._tx_seen, self._today_net = txs, 0, {}
+		for t in txs[self._tx_seen:]:
+			self._today_net[t.category] = self._today_net.get(t.category, 0) + t.amount
+		self._tx_seen = len(txs)
+
+	def profile(self, category: str) -> HourProfile:
+		self._sync()
+		prof = self._profiles.get(category)
+		if prof is None:
+			prof = self._profiles[category] = hour_profile(self.state.storage, self.state.day, category, self.profile_days)
+		return prof
+
+	def _week_before_today(self, category: str) -> int:
+		if category not in self._week_past:
+			day = self.state.day
+			monday = day - timedelta(days=day.weekday())
+			total = 0
+			if monday < day:
+				for _d, entry in self.state.storage.index.rollups(monday, day - timedelta(days=1)):
+					total += sum(h_net for h_net, _sec in entry.get("hours", {}).get(category, {}).values())
+			self._week_past[category] = total
+		return self._week_past[category]
+
+	def forecast(self, category: str, now: Optional[datetime] = None) -> Forecast:
+		"""Прогноз к первой заданной цели (день, затем неделя) или без цели."""
+		return self.forecasts(category, now)[0]
+
+	def forecasts(self, category: str, now: Optional[datetime] = None) -> List[Forecast]:
+		"""По прогнозу на каждую заданную цель категории (день, неделя); без целей — один, с goal=None."""
+		now = now or datetime.now()
+		self._sync()
+		prof = self.profile(category)
+		today_net = self._today_net.get(category, 0)
+		live = self.state.live_rates(category).get("ewma")
+		hist = prof.rate
+		# Поправка на сегодняшнюю форму: во сколько раз живой темп отличается от обычного
+		factor = 1.0
+		if live is not None and hist is not None and hist > 0:
+			factor = max(1.0 / FORM_FACTOR_LIMIT, min(FORM_FACTOR_LIMIT, live / hist))
+
+		def hour_rate(hour: int) -> Optional[float]:
+			if hist is None:
+				return live
+			rate = prof.hour_rate(hour)
+			return rate * factor if rate is not None else None
+
+		running = self.state.is_running(category)
+		hour = now.hour
+		hour_left = 3600.0 - (now.minute * 60 + now.second)
+		# Остаток текущего часа: если работа идёт — по темпу до конца часа, иначе по профилю;
+		# следующие часы — обычная для этого часа прибыль с поправкой на форму
+		projected_day = float(today_net)
+		if running:
+			projected_day += (hour_rate(hour) or 0.0) * hour_left / 3600.0
+		else:
+			projected_day += prof.net[hour] * factor * hour_left / 3600.0
+		projected_day += sum(prof.net[h] for h in range(hour + 1, 24)) * factor
+
+		if live is not None:
+			rate, source = live, "live"
+		elif hist is not None:
+			rate, source = hour_rate(hour), "history"
+		else:
+			rate, source = (self.state.profit_per_hour(category) or None), "today"
+			if rate is None:
+				source = None
+
+		goals = self.goals.get(category, {})
+		results: List[Forecast] = []
+		for period in [p for p in ("day", "week") if p in goals] or [None]:
+			goal = goals.get(period) if period else None
+			achieved = today_net
+			projected_period = projected_day
+			if period == "week":
+				past = self._week_before_today(category)
+				achieved += past
+				days_left = 6 - self.state.day.weekday()
+				projected_period = past + projected_day + days_left * sum(prof.net) * factor
+			result = Forecast(category, period, goal, achieved, rate, source, projected_day, projected_period)
+			if goal is not None:
+				remaining = goal - achieved
+				if remaining <= 0:
+					result.eta_seconds = 0.0
+				elif rate is not None and rate > 0:
+					result.eta_seconds = remaining / rate * 3600.0
+					if running:
+						result.eta_at = now + timedelta(seconds=result.eta_seconds)
+			results.append(result)
+		return results
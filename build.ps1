@@ -111,11 +111,25 @@ Write-Host "[3/6] Install requirements" -ForegroundColor Cyan
 & $venvPip install -r requirements.txt
 & $venvPip install pillow | Out-Null
 
-Write-Host "[pre] Syntax check (main.py, updater.py)" -ForegroundColor Cyan
+Write-Host "[pre] Syntax check (main.py, stats_core.py, report.py, history_io.py, analytics.py, quick_entry.py, single_instance.py, updater.py, delta_patch.py)" -ForegroundColor Cyan
 & $venvPython -m py_compile main.py
 if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: main.py"; exit 1 }
+& $venvPython -m py_compile stats_core.py
+if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: stats_core.py"; exit 1 }
+& $venvPython -m py_compile report.py
+if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: report.py"; exit 1 }
+& $venvPython -m py_compile history_io.py
+if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: history_io.py"; exit 1 }
+& $venvPython -m py_compile analytics.py
+if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: analytics.py"; exit 1 }
+& $venvPython -m py_compile quick_entry.py
+if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: quick_entry.py"; exit 1 }
+& $venvPython -m py_compile single_instance.py
+if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: single_instance.py"; exit 1 }
 & $venvPython -m py_compile updater.py
 if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: updater.py"; exit 1 }
+& $venvPython -m py_compile delta_patch.py
+if ($LASTEXITCODE -ne 0) { Write-Error "Python syntax check failed: delta_patch.py"; exit 1 }
 
 Write-Host "[4/6] Prepare icon (PNG -> ICO if needed)" -ForegroundColor Cyan
 $pngCandidates = @("icon.png", "photo_2025-09-21_18-08-53.png")
@@ -163,6 +177,11 @@ $versionFile = "version.json"
 $buildVersionInt = 1
 $buildSemver = ""
 $buildDate = Get-Date -Format "yyyy-MM-dd"
+# Предыдущая версия — от неё строится дельта-патч (см. release.yml)
+$prevVersionInt = 0
+if (Test-Path $versionFile) {
+    try { $prevVersionInt = [int](Get-Content $versionFile | ConvertFrom-Json).version } catch { $prevVersionInt = 0 }
+}
 
 # 1) Если передан параметр -Version, используем его
 if ($Version) {
@@ -221,6 +240,11 @@ $manifest = @{
     semver = $buildSemver
 	build_date = $buildDate
     exe_url = "https://github.com/vova-musin/grimm_stats/releases/download/v$buildSemver/GrimmStats.exe"
+    # SHA-256 считается в CI после сборки и публикуется рядом с exe (см. release.yml)
+    sha256_url = "https://github.com/vova-musin/grimm_stats/releases/download/v$buildSemver/GrimmStats.exe.sha256"
+    # Дельта от предыдущей сборки (если CI смог её построить); иначе клиент качает exe целиком
+    delta_from = $(if ($prevVersionInt -lt $buildVersionInt) { $prevVersionInt } else { 0 })
+    delta_url = "https://github.com/vova-musin/grimm_stats/releases/download/v$buildSemver/GrimmStats.delta"
     exe_file_id = ""
     manifest_file_id = ""
     changelog = @("Version $buildVersionInt ($buildSemver) - auto build from $buildDate")
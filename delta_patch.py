@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Блочные дельта-патчи между соседними сборками GrimmStats.exe (в духе rsync).
+Старый файл режется на блоки, новый сканируется скользящей контрольной суммой;
+совпавшие блоки кодируются ссылкой на старый файл, остальное — литералами.
+Поток операций сжимается lzma.
+Использование:
+  python delta_patch.py make OLD.exe NEW.exe OUT.delta
+  python delta_patch.py apply OLD.exe IN.delta OUT.exe
+"""
+import hashlib
+import io
+import itertools
+import lzma
+import os
+import struct
+import sys
+from typing import BinaryIO, Dict, Optional
+
+MAGIC = b'GSDELTA1'
+BLOCK = 4096
+_HEADER = struct.Struct('<8sQQ32s32sI')  # magic, old_size, new_size, old_sha, new_sha, block
+_COPY = struct.Struct('<cQI')  # b'C', old_offset, length
+_DATA = struct.Struct('<cI')  # b'D', length
+_MOD = 1 << 16
+
+
+class PatchError(Exception):
+    pass
+
+
+def _weak(block: bytes) -> int:
+    a = sum(block) % _MOD
+    b = sum(itertools.accumulate(block)) % _MOD
+    return (b << 16) | a
+
+
+def _sha256_file(path: str) -> bytes:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+
+def make_patch(old_path: str, new_path: str, out_path: str, block: int = BLOCK) -> int:
+    """Строит патч old -> new и возвращает его размер в байтах."""
+    with open(old_path, 'rb') as f:
+        old = f.read()
+    with open(new_path, 'rb') as f:
+        new = f.read()
+    index: Dict[int, int] = {}
+    for off in range(0, len(old) - block + 1, block):
+        index.setdefault(_weak(old[off:off + block]), off)
+
+    ops = io.BytesIO()
+    pending = bytearray()
+    run_off = -1
+    run_len = 0
+
+    def flush_copy() -> None:
+        nonlocal run_off, run_len
+        if run_len:
+            ops.write(_COPY.pack(b'C', run_off, run_len))
+        run_off, run_len = -1, 0
+
+    def flush_data() -> None:
+        if pending:
+            ops.write(_DATA.pack(b'D', len(pending)))
+            ops.write(pending)
+            pending.clear()
+
+    def matched(off: int) -> None:
+        nonlocal run_off, run_len
+        flush_data()
+        if run_len and run_off + run_len == off:
+            run_len += block
+        else:
+            flush_copy()
+            run_off, run_len = off, block
+
+    pos = 0
+    n = len(new)
+    while pos + block <= n:
+        # Быстрый путь: следующий блок продолжает текущую копию
+        if run_len:
+            nxt = run_off + run_len
+            if new[pos:pos + block] == old[nxt:nxt + block]:
+                matched(nxt)
+                pos += block
+                continue
+        flush_copy()
+        # Скользящая сумма до первого совпадения
+        window = new[pos:pos + block]
+        a = sum(window) % _MOD
+        b = sum(itertools.accumulate(window)) % _MOD
+        while True:
+            off = index.get((b << 16) | a)
+            if off is not None and new[pos:pos + block] == old[off:off + block]:
+                matched(off)
+                pos += block
+                break
+            if pos + block >= n:
+                pending.extend(new[pos:pos + 1])
+                pos += 1
+                break
+            out_b = new[pos]
+            in_b = new[pos + block]
+            pending.append(out_b)
+            a = (a - out_b + in_b) % _MOD
+            b = (b - block * out_b + a) % _MOD
+            pos += 1
+    flush_copy()
+    pending.extend(new[pos:])
+    flush_data()
+
+    with open(out_path, 'wb') as out:
+        out.write(_HEADER.pack(MAGIC, len(old), len(new),
+                               hashlib.sha256(old).digest(), hashlib.sha256(new).digest(), block))
+        out.write(lzma.compress(ops.getvalue(), preset=9))
+    return os.path.getsize(out_path)
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise PatchError('Патч обрезан')
+    return data
+
+
+def apply_patch(old_path: str, patch_path: str, out_path: str, expected_sha256: Optional[str] = None) -> str:
+    """Применяет патч к old_path, пишет out_path и возвращает SHA-256 результата.
+
+    Исходный файл сверяется с хэшем из заголовка, результат — с хэшем из заголовка
+    и expected_sha256 (если задан); при несовпадении out_path удаляется и
+    выбрасывается PatchError.
+    """
+    with open(patch_path, 'rb') as pf:
+        header = pf.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise PatchError('Повреждённый заголовок патча')
+        magic, old_size, new_size, old_sha, new_sha, _block = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise PatchError('Неизвестный формат патча')
+        if os.path.getsize(old_path) != old_size or _sha256_file(old_path) != old_sha:
+            raise PatchError('Патч рассчитан на другую версию')
+        h = hashlib.sha256()
+        written = 0
+        try:
+            with open(old_path, 'rb') as old, open(out_path, 'wb') as out, lzma.open(pf, 'rb') as ops:
+                while True:
+                    tag = ops.read(1)
+                    if not tag:
+                        break
+                    if tag == b'C':
+                        off, length = struct.unpack('<QI', _read_exact(ops, 12))
+                        old.seek(off)
+                        data = _read_exact(old, length)
+                    elif tag == b'D':
+                        (length,) = struct.unpack('<I', _read_exact(ops, 4))
+                        data = _read_exact(ops, length)
+                    else:
+                        raise PatchError('Неизвестная операция патча')
+                    out.write(data)
+                    h.update(data)
+                    written += len(data)
+            digest = h.hexdigest()
+            if written != new_size or h.digest() != new_sha:
+                raise PatchError('Результат патча не совпал с целевой сборкой')
+            if expected_sha256 and digest != expected_sha256.strip().lower():
+                raise PatchError('Результат патча не совпал с хэшем из манифеста')
+            return digest
+        except Exception:
+            try:
+                os.remove(out_path)
+            except Exception:
+                pass
+            raise
+
+
+def main() -> int:
+    if len(sys.argv) != 5 or sys.argv[1] not in ('make', 'apply'):
+        print(__doc__.strip())
+        return 1
+    if sys.argv[1] == 'make':
+        size = make_patch(sys.argv[2], sys.argv[3], sys.argv[4])
+        full = os.path.getsize(sys.argv[3])
+        print(f"patch: {size} bytes ({size * 100.0 / max(1, full):.1f}% of {full})")
+    else:
+        print(apply_patch(sys.argv[2], sys.argv[3], sys.argv[4]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+Потоковый экспорт/импорт истории GrimmStats: CSV, JSON Lines и Parquet (если установлен pyarrow).
+Дни читаются по одному через DayStorage.iter_days, импорт пишет дни пачками.
+Использование:
+  python history_io.py export OUT.(csv|jsonl|parquet) [--from ДАТА] [--to ДАТА] [--category fish ...]
+                       [--kind session|transaction] [--type income|expense]
+  python history_io.py import IN.(csv|jsonl|parquet) [--replace]
+Если окно GrimmStats открыто для той же папки данных, импорт передаётся ему.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from stats_core import SALE_FIELDS, DayStorage, WorkSession, attach_parent_console, default_base_dir, sale_fields, session_seconds_on
+
+# Одна плоская запись на сессию или транзакцию
+FIELDS = ["date", "kind", "category", "start_iso", "end_iso", "seconds", "time_iso", "type", "amount", "note", *SALE_FIELDS]
+FORMATS = ("csv", "jsonl", "parquet")
+PARQUET_BATCH_ROWS = 10_000
+IMPORT_BATCH_DAYS = 32
+
+
+def parquet_available() -> bool:
+	try:
+		import pyarrow  # noqa: F401
+		import pyarrow.parquet  # noqa: F401
+		return True
+	except Exception:
+		return False
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+	if fmt:
+		fmt = fmt.lower()
+	else:
+		ext = os.path.splitext(path)[1].lower().lstrip(".")
+		fmt = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl", "parquet": "parquet", "pq": "parquet"}.get(ext, "")
+	if fmt not in FORMATS:
+		raise ValueError(f"Неизвестный формат файла: {path}")
+	if fmt == "parquet" and not parquet_available():
+		raise RuntimeError("Для Parquet установите pyarrow: pip install pyarrow")
+	return fmt
+
+
+def iter_records(
+	storage: DayStorage,
+	start: date,
+	end: date,
+	categories: Optional[Iterable[str]] = None,
+	kinds: Optional[Iterable[str]] = None,
+	types: Optional[Iterable[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+	"""Плоские записи за период; в памяти держится только текущий день."""
+	wanted_cat = set(categories) if categories else None
+	wanted_kind = set(kinds) if kinds else None
+	wanted_type = set(types) if types else None
+	now = datetime.now()
+	for d, raw in storage.iter_days(start, end, strict=True):
+		day_iso = d.isoformat()
+		if wanted_kind is None or "session" in wanted_kind:
+			for s in raw.get("sessions", []):
+				category = s.get("category", "trucker")
+				if wanted_cat is not None and category not in wanted_cat:
+					continue
+				start_iso = s.get("start_iso") or s.get("start")
+				session = WorkSession(start_iso=start_iso, end_iso=s.get("end_iso"), category=category)
+				yield {"date": day_iso, "kind": "session", "category": category, "start_iso": start_iso,
+					"end_iso": s.get("end_iso"), "seconds": session_seconds_on(session, d, now),
+					"time_iso": None, "type": None, "amount": None, "note": None, **dict.fromkeys(SALE_FIELDS)}
+		if wanted_kind is None or "transaction" in wanted_kind:
+			for t in raw.get("transactions", []):
+				category = t.get("category", "trucker")
+				if wanted_cat is not None and category not in wanted_cat:
+					continue
+				if wanted_type is not None and t.get("type") not in wanted_type:
+					continue
+				yield {"date": day_iso, "kind": "transaction", "category": category, "start_iso": None,
+					"end_iso": None, "seconds": None, "time_iso": t.get("time_iso") or t.get("time"),
+					"type": t.get("type"), "amount": int(t.get("amount", 0)), "note": t.get("note", ""),
+					**dict.fromkeys(SALE_FIELDS), **sale_fields(t)}
+
+
+def _parquet_schema():
+	import pyarrow as pa
+	types = {"seconds": pa.int64(), "amount": pa.int64(), "qty": pa.float64(), "unit_price": pa.float64(), "level": pa.int64()}
+	return pa.schema([(name, types.get(name, pa.string())) for name in FIELDS])
+
+
+def write_records(records: Iterable[Dict[str, Any]], path: str, fmt: Optional[str] = None) -> int:
+	"""Пишет записи в файл по мере поступления и возвращает их число."""
+	fmt = detect_format(path, fmt)
+	count = 0
+	if fmt == "csv":
+		with open(path, "w", encoding="utf-8-sig", newline="") as f:
+			writer = csv.DictWriter(f, fieldnames=FIELDS)
+			writer.writeheader()
+			for rec in records:
+				writer.writerow(rec)
+				count += 1
+	elif fmt == "jsonl":
+		with open(path, "w", encoding="utf-8") as f:
+			for rec in records:
+				f.write(json.dumps(rec, ensure_ascii=False))
+				f.write("\n")
+				count += 1
+	else:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+		schema = _parquet_schema()
+		batch: List[Dict[str, Any]] = []
+		with pq.ParquetWriter(path, schema) as writer:
+			for rec in records:
+				batch.append(rec)
+				count += 1
+				if len(batch) >= PARQUET_BATCH_ROWS:
+					writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+					batch.clear()
+			if batch or count == 0:
+				writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+	return count
+
+
+def export_history(storage: DayStorage, path: str, start: date, end: date, fmt: Optional[str] = None,
+		categories: Optional[Iterable[str]] = None, kinds: Optional[Iterable[str]] = None,
+		types: Optional[Iterable[str]] = None) -> int:
+	return write_records(iter_records(storage, start, end, categories, kinds, types), path, fmt)
+
+
+def read_records(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+	"""Читает записи из файла экспорта построчно (Parquet — пачками)."""
+	fmt = detect_format(path, fmt)
+	if fmt == "csv":
+		with open(path, "r", encoding="utf-8-sig", newline="") as f:
+			for row in csv.DictReader(f):
+				yield {k: (v if v != "" else None) for k, v in row.items()}
+	elif fmt == "jsonl":
+		with open(path, "r", encoding="utf-8") as f:
+			for line in f:
+				line = line.strip()
+				if line:
+					yield json.loads(line)
+	else:
+		import pyarrow.parquet as pq
+		for batch in pq.ParquetFile(path).iter_batches(batch_size=PARQUET_BATCH_ROWS):
+			yield from batch.to_pylist()
+
+
+def _number(value: Any) -> Optional[float]:
+	if value is None or value == "":
+		return None
+	number = float(value)
+	return int(number) if number.is_integer() else number
+
+
+def _sale_from_record(rec: Dict[str, Any]) -> Dict[str, Any]:
+	"""Поля продажи из записи экспорта (в CSV числа приходят строками)."""
+	if not rec.get("item"):
+		return {}
+	sale: Dict[str, Any] = {"item": rec["item"]}
+	for key in ("qty", "unit_price", "level"):
+		value = _number(rec.get(key))
+		if value is not None:
+			sale[key] = int(value) if key == "level" else value
+	if rec.get("unit"):
+		sale["unit"] = rec["unit"]
+	return sale
+
+
+def _session_key(s: Dict[str, Any]) -> Tuple:
+	return (s.get("start_iso"), s.get("category"))
+
+
+def _transaction_key(t: Dict[str, Any]) -> Tuple:
+	return (t.get("time_iso"), t.get("category"), int(t.get("amount", 0)), t.get("type"), t.get("note", ""))
+
+
+def merge_day(existing: Dict[str, Any], incoming: Dict[str, Any]) -> Dict[str, Any]:
+	"""Добавляет к дню записи, которых в нём ещё нет (повторный импорт не дублирует)."""
+	sessions = list(existing.get("sessions", []))
+	transactions = list(existing.get("transactions", []))
+	seen_s = {_session_key(s) for s in sessions}
+	seen_t = {_transaction_key(t) for t in transactions}
+	for s in incoming["sessions"]:
+		if _session_key(s) not in seen_s:
+			seen_s.add(_session_key(s))
+			sessions.append(s)
+	for t in incoming["transactions"]:
+		if _transaction_key(t) not in seen_t:
+			seen_t.add(_transaction_key(t))
+			transactions.append(t)
+	sessions.sort(key=lambda s: s.get("start_iso") or "")
+	transactions.sort(key=lambda t: t.get("time_iso") or "")
+	return {**existing, "sessions": sessions, "transactions": transactions}
+
+
+def import_history(storage: DayStorage, path: str, fmt: Optional[str] = None, replace: bool = False,
+		batch_days: int = IMPORT_BATCH_DAYS, hold_day: Optional[date] = None,
+		held: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Tuple[List[date], int]:
+	"""Импортирует записи в хранилище, записывая по batch_days дней за раз.
+
+	replace=True заменяет содержимое затронутых дней, иначе записи сливаются без дублей.
+	Записи дня hold_day не пишутся, а складываются в held ({"sessions", "transactions"}):
+	этот день открыт в AppState, и слить его должен владелец состояния (см. merge_day).
+	Возвращает (затронутые дни, число записей); hold_day в них не входит.
+	"""
+	batch: Dict[date, Dict[str, List[Dict[str, Any]]]] = {}
+	touched: set = set()
+	count = 0
+
+	def flush() -> None:
+		for d, incoming in batch.items():
+			base = {"sessions": [], "transactions": []} if (replace and d not in touched) else storage.load_day(d)
+			storage.save_day(d, merge_day(base, incoming))
+			touched.add(d)
+		batch.clear()
+
+	for rec in read_records(path, fmt):
+		try:
+			d = datetime.strptime(str(rec["date"])[:10], "%Y-%m-%d").date()
+		except (KeyError, ValueError):
+			continue
+		if d == hold_day and held is not None:
+			day = held
+			held.setdefault("sessions", [])
+			held.setdefault("transactions", [])
+		else:
+			day = batch.setdefault(d, {"sessions": [], "transactions": []})
+		category = rec.get("category") or "trucker"
+		if rec.get("kind") == "session" and rec.get("start_iso"):
+			day["sessions"].append({"start_iso": rec["start_iso"], "end_iso": rec.get("end_iso"), "category": category})
+		elif rec.get("kind") == "transaction" and rec.get("time_iso"):
+			amount = int(float(rec.get("amount") or 0))
+			ttype = rec.get("type") or ("income" if amount >= 0 else "expense")
+			tx = {"amount": amount, "type": ttype, "note": rec.get("note") or "", "time_iso": rec["time_iso"], "category": category}
+			tx.update(_sale_from_record(rec))
+			day["transactions"].append(tx)
+		else:
+			continue
+		count += 1
+		if len(batch) >= batch_days:
+			flush()
+	flush()
+	return sorted(touched), count
+
+
+def _parse_date(text: str) -> date:
+	try:
+		return datetime.strptime(text, "%Y-%m-%d").date()
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"ожидается дата ГГГГ-ММ-ДД: {text}")
+
+
+def _import_locked(storage: DayStorage, args: argparse.Namespace) -> int:
+	"""Импорт под блокировкой экземпляра: если окно открыто, файл импортирует оно само,
+	иначе его autosave перезаписал бы сегодняшний день."""
+	import single_instance
+	forward = ['import', os.path.abspath(args.path)]
+	if args.format:
+		forward += ['--format', args.format]
+	if args.replace:
+		forward.append('--replace')
+	instance = single_instance.SingleInstance(storage.base_dir)
+	status = instance.acquire(forward)
+	if status == single_instance.FORWARDED:
+		print(f"Импорт передан открытому окну GrimmStats: {args.path}")
+		return 0
+	if status == single_instance.TIMEOUT:
+		print("GrimmStats запущен, но не отвечает; импорт отменён", file=sys.stderr)
+		return 1
+	try:
+		days, count = import_history(storage, args.path, args.format, replace=args.replace)
+	finally:
+		instance.release()
+	print(f"Загружено записей: {count}, дней: {len(days)}")
+	return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	attach_parent_console()
+	if sys.stdout is None:
+		return 1
+	common = argparse.ArgumentParser(add_help=False)
+	common.add_argument('--data-dir', help='Папка данных (по умолчанию %%APPDATA%%\\GrimmStats)')
+	parser = argparse.ArgumentParser(prog="history_io", description="Экспорт/импорт истории GrimmStats")
+	sub = parser.add_subparsers(dest='command', required=True)
+	exp = sub.add_parser('export', parents=[common], help='Выгрузить историю в файл')
+	exp.add_argument('path')
+	exp.add_argument('--format', choices=FORMATS)
+	exp.add_argument('--from', dest='date_from', type=_parse_date, default=date(2000, 1, 1))
+	exp.add_argument('--to', dest='date_to', type=_parse_date, default=date.today())
+	exp.add_argument('--category', action='append', default=[])
+	exp.add_argument('--kind', action='append', choices=['session', 'transaction'], default=[])
+	exp.add_argument('--type', action='append', choices=['income', 'expense'], default=[])
+	imp = sub.add_parser('import', parents=[common], help='Загрузить историю из файла')
+	imp.add_argument('path')
+	imp.add_argument('--format', choices=FORMATS)
+	imp.add_argument('--replace', action='store_true', help='Заменить затронутые дни, а не дополнить')
+	args = parser.parse_args(argv)
+
+	base_dir = args.data_dir or default_base_dir()
+	try:
+		storage = DayStorage(base_dir, maintenance=False)
+		if args.command == 'export':
+			count = export_history(storage, args.path, args.date_from, args.date_to, args.format,
+				args.category or None, args.kind or None, args.type or None)
+			print(f"Выгружено записей: {count} -> {args.path}")
+		else:
+			return _import_locked(storage, args)
+	except (ValueError, RuntimeError, OSError) as e:
+		print(str(e), file=sys.stderr)
+		return 2
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
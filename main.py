@@ -6,16 +6,39 @@ import re
 import threading
 import hashlib
 import tempfile
+import time
 import webbrowser
-from urllib import request as _urlrequest, parse as _urlparse
-from http import cookiejar as _cookiejar
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib import request as _urlrequest, parse as _urlparse, error as _urlerror
+from http import cookiejar as _cookiejar, client as _httpclient
 import email.utils as _email_utils
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from datetime import datetime, date, timedelta
-from typing import List, Optional, Dict, Any, Tuple
+from typing import Callable, List, Optional, Dict, Any, Tuple
 
-from PySide6.QtCore import QTimer, Qt, QRegularExpression
-from PySide6.QtGui import QIntValidator, QRegularExpressionValidator, QIcon
+# Консольные команды: `main.py report|export|import ...` не загружают окно и matplotlib
+# (import берёт блокировку экземпляра, см. history_io.main)
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in ("report", "export", "import"):
+	if sys.argv[1] == "report":
+		import report
+		sys.exit(report.main(sys.argv[2:]))
+	import history_io
+	sys.exit(history_io.main(sys.argv[1:]))
+
+if __name__ == "__main__":
+	# Повторный запуск передаёт аргументы работающему окну и выходит до тяжёлых импортов
+	import single_instance
+	from stats_core import default_base_dir as _default_base_dir
+	_status = single_instance.guard(_default_base_dir(), sys.argv[1:])
+	if _status == single_instance.FORWARDED:
+		sys.exit(0)
+	if _status == single_instance.TIMEOUT:
+		if sys.stderr is not None:
+			print("GrimmStats уже запущен, но не отвечает", file=sys.stderr)
+		sys.exit(1)
+
+from PySide6.QtCore import QTimer, Qt, QRegularExpression, QThread, Signal, QAbstractTableModel, QModelIndex, QDateTime
+from PySide6.QtGui import QIntValidator, QRegularExpressionValidator, QIcon, QPainter, QPen, QColor, QKeySequence, QShortcut
 from PySide6.QtWidgets import (
 	QApplication,
 	QMainWindow,
@@ -33,12 +56,42 @@ from PySide6.QtWidgets import (
 	QCheckBox,
 	QSlider,
 	QScrollArea,
+	QTableWidget,
+	QTableWidgetItem,
+	QComboBox,
+	QTableView,
+	QHeaderView,
+	QAbstractItemView,
+	QProgressBar,
+	QSpinBox,
+	QDateTimeEdit,
+	QToolTip,
 )
-from PySide6.QtWidgets import QFileDialog, QListWidget, QListWidgetItem, QInputDialog, QDialog, QDialogButtonBox
+from PySide6.QtWidgets import QFileDialog, QListWidget, QListWidgetItem, QInputDialog, QDialog, QDialogButtonBox, QProgressDialog
 from PySide6.QtWidgets import QCheckBox, QSlider
 
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+import numpy as np
+
+import delta_patch
+import history_io
+import analytics
+from quick_entry import CatalogItem, QuickEntry, parse_quick_entries, resolve_category
+from stats_core import (
+	StateEvent,
+	RELOAD_EVENTS,
+	CATEGORY_LABELS,
+	append_log,
+	DayStorage,
+	AppState,
+	default_base_dir,
+	format_seconds,
+	parse_amount,
+	parse_decimal,
+	compute_day_series,
+	compute_last_n_days,
+)
 
 
 # Источник манифеста по умолчанию (GitHub Raw)
@@ -246,312 +299,497 @@ if CraftPriceManager is None:
 	CraftPriceManager = _LocalCraftPriceManager  # type: ignore
 
 # ------------------------
-# Данные и хранилище
+# Планировщик крафта
 # ------------------------
-@dataclass
-class WorkSession:
-	start_iso: str
-	end_iso: Optional[str] = None
-	category: str = "trucker"  # trucker | farm | mine | fish | mushroom | logger
-
-	def duration_seconds(self) -> int:
-		start_dt = datetime.fromisoformat(self.start_iso)
-		end_dt = datetime.fromisoformat(self.end_iso) if self.end_iso else datetime.now()
-		return int((end_dt - start_dt).total_seconds())
+# Комиссия рынка при продаже готового предмета (как в evaluate_profitability)
+CRAFT_SALE_TAX = 0.10
 
 
 @dataclass
-class Transaction:
-	amount: int
-	type: str  # income | expense
-	note: str
-	time_iso: str
-	category: str = "trucker"
+class _UnitBill:
+	"""Ожидаемые затраты на получение 1 шт предмета."""
+	leaves: Dict[str, float]  # базовый материал -> ожидаемое кол-во
+	fee: float  # ожидаемая сумма сборов
+	attempts: Dict[str, float]  # предмет с рецептом -> ожидаемое число попыток
 
 
-class DayStorage:
-	"""Управляет сохранением/загрузкой статистики за день в JSON."""
+class CraftPlanner:
+	"""Разворачивает рецепт в ведомость базовых материалов с учётом шанса и выхода за крафт.
 
-	def __init__(self, base_dir: str) -> None:
-		self.base_dir = base_dir
-		self.data_dir = os.path.join(self.base_dir, "data")
-		os.makedirs(self.data_dir, exist_ok=True)
-		# Миграция данных из старой папки рядом с exe/скриптом
-		try:
-			if not os.listdir(self.data_dir):
-				legacy_root = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
-				legacy_dir = os.path.join(legacy_root, "data")
-				if os.path.isdir(legacy_dir):
-					for name in os.listdir(legacy_dir):
-						if name.endswith(".json"):
-							shutil.copy2(os.path.join(legacy_dir, name), os.path.join(self.data_dir, name))
-		except Exception:
-			pass
-		# Авто-очистка старых файлов (>30 дней)
-		try:
-			for name in os.listdir(self.data_dir):
-				if name.endswith('.json'):
-					path = os.path.join(self.data_dir, name)
-					mtime = os.path.getmtime(path)
-					age_days = (datetime.now() - datetime.fromtimestamp(mtime)).days
-					if age_days > 30:
-						os.remove(path)
-		except Exception:
-			pass
+	Затраты на 1 шт каждого предмета считаются один раз и кэшируются, поэтому большие
+	заказы и глубокие деревья не требуют повторных обходов. После изменения рецептов
+	нужно вызвать invalidate(); цены не кэшируются.
+	"""
 
-	def _file_for(self, day: date) -> str:
-		name = day.strftime("%Y-%m-%d") + ".json"
-		return os.path.join(self.data_dir, name)
-
-	def load_day(self, day: date) -> Dict[str, Any]:
-		file_path = self._file_for(day)
-		if not os.path.exists(file_path):
-			return {"sessions": [], "transactions": []}
-		with open(file_path, "r", encoding="utf-8") as f:
-			return json.load(f)
-
-	def save_day(self, day: date, data: Dict[str, Any]) -> None:
-		file_path = self._file_for(day)
-		with open(file_path, "w", encoding="utf-8") as f:
-			json.dump(data, f, ensure_ascii=False, indent=2)
-
-	def load_last_days(self, days: int) -> Dict[date, Dict[str, Any]]:
-		result: Dict[date, Dict[str, Any]] = {}
-		for i in range(days - 1, -1, -1):
-			d = date.today() - timedelta(days=i)
-			result[d] = self.load_day(d)
-		return result
-
-	def delete_day(self, d: date) -> None:
-		file_path = self._file_for(d)
-		try:
-			if os.path.exists(file_path):
-				os.remove(file_path)
-		except Exception:
-			pass
+	def __init__(self, craft_mgr: Any, price_mgr: Any) -> None:
+		self.craft_mgr = craft_mgr
+		self.price_mgr = price_mgr
+		self._bills: Dict[str, _UnitBill] = {}
 
-	def delete_last_days(self, n: int) -> None:
-		for i in range(n):
-			d = date.today() - timedelta(days=i)
-			self.delete_day(d)
+	def invalidate(self) -> None:
+		self._bills.clear()
 
-	def delete_all(self) -> None:
-		try:
-			for name in os.listdir(self.data_dir):
-				if name.endswith(".json"):
-					os.remove(os.path.join(self.data_dir, name))
-		except Exception:
-			pass
+	def unit_bill(self, name: str) -> _UnitBill:
+		return self._unit_bill(name, ())
 
+	def _unit_bill(self, name: str, stack: Tuple[str, ...]) -> _UnitBill:
+		cached = self._bills.get(name)
+		if cached is not None:
+			return cached
+		rec = self.craft_mgr.get_recipe(name)
+		if not rec:
+			bill = _UnitBill(leaves={name: 1.0}, fee=0.0, attempts={})
+		else:
+			if name in stack:
+				raise ValueError("Циклический рецепт: " + " -> ".join(stack + (name,)))
+			chance = max(1, min(100, int(rec.get("success_chance", 35)))) / 100.0
+			quantity = max(1, int(rec.get("quantity", 1)))
+			# Ожидаемое число попыток на 1 шт: материалы и сбор тратятся и при неудаче
+			per_unit = 1.0 / (chance * quantity)
+			leaves: Dict[str, float] = {}
+			attempts: Dict[str, float] = {name: per_unit}
+			fee = float(rec.get("craft_fee", 0)) * per_unit
+			for m, q in (rec.get("materials") or {}).items():
+				sub = self._unit_bill(m, stack + (name,))
+				k = int(q) * per_unit
+				for leaf, lq in sub.leaves.items():
+					leaves[leaf] = leaves.get(leaf, 0.0) + lq * k
+				for it, a in sub.attempts.items():
+					attempts[it] = attempts.get(it, 0.0) + a * k
+				fee += sub.fee * k
+			bill = _UnitBill(leaves=leaves, fee=fee, attempts=attempts)
+		self._bills[name] = bill
+		return bill
+
+	def missing_prices(self, name: str) -> List[str]:
+		"""Базовые материалы дерева рецепта, для которых не задана цена."""
+		return sorted(m for m in self.unit_bill(name).leaves if self.price_mgr.get_price(m) is None)
+
+	def plan(self, name: str, count: int = 1, sell_price: Optional[float] = None) -> Dict[str, Any]:
+		"""Ведомость на count шт: материалы, сборы, ожидаемые попытки и себестоимость."""
+		count = max(1, int(count))
+		bill = self.unit_bill(name)
+		materials: Dict[str, float] = {m: q * count for m, q in bill.leaves.items()}
+		missing: List[str] = []
+		materials_cost = 0.0
+		for m, q in materials.items():
+			price = self.price_mgr.get_price(m)
+			if price is None:
+				missing.append(m)
+			else:
+				materials_cost += float(price) * q
+		fees = bill.fee * count
+		if sell_price is None:
+			sp = self.price_mgr.get_price(name)
+			sell_price = float(sp) if sp is not None else 0.0
+		expected = materials_cost + fees
+		revenue = float(sell_price) * count * (1.0 - CRAFT_SALE_TAX)
+		return {
+			"item": name,
+			"count": count,
+			"materials": materials,
+			"missing": sorted(missing),
+			"attempts": {it: a * count for it, a in bill.attempts.items()},
+			"materials_cost": materials_cost,
+			"fees": fees,
+			"expected_cost": expected,
+			"unit_cost": expected / count,
+			"sell_price": float(sell_price),
+			"revenue": revenue,
+			"profit": revenue - expected,
+		}
 
-class AppState:
-	"""Логика учёта по дням и категориям."""
-
-	def __init__(self, storage: DayStorage) -> None:
-		self.storage = storage
-		self.day = date.today()
-		raw = self.storage.load_day(self.day)
-		self.sessions: List[WorkSession] = []
-		for s in raw.get("sessions", []):
-			self.sessions.append(
-				WorkSession(
-					start_iso=s.get("start_iso") or s.get("start") or s["start_iso"],
-					end_iso=s.get("end_iso"),
-					category=s.get("category", "trucker"),
-				)
-			)
-		self.transactions: List[Transaction] = []
-		for t in raw.get("transactions", []):
-			self.transactions.append(
-				Transaction(
-					amount=t["amount"],
-					type=t["type"],
-					note=t.get("note", ""),
-					time_iso=t.get("time_iso") or t.get("time") or t["time_iso"],
-					category=t.get("category", "trucker"),
-				)
-			)
 
-		self._running_index_by_category: Dict[str, Optional[int]] = {"trucker": None, "farm": None, "mine": None, "fish": None, "mushroom": None, "logger": None}
-		for idx, s in enumerate(self.sessions):
-			if s.end_iso is None and self._running_index_by_category.get(s.category) is None:
-				self._running_index_by_category[s.category] = idx
+class CraftRiskSimulator:
+	"""Монте-Карло для стоимости получения N предметов с учётом шанса успеха.
 
-	def start(self, category: str) -> None:
-		if self._running_index_by_category.get(category) is not None:
-			return
-		session = WorkSession(start_iso=datetime.now().isoformat(timespec="seconds"), category=category)
-		self.sessions.append(session)
-		self._running_index_by_category[category] = len(self.sessions) - 1
-		self._autosave()
-
-	def stop(self, category: str) -> None:
-		idx = self._running_index_by_category.get(category)
-		if idx is None:
-			return
-		self.sessions[idx].end_iso = datetime.now().isoformat(timespec="seconds")
-		self._running_index_by_category[category] = None
-		self._autosave()
+	Число попыток до нужного числа успехов — отрицательное биномиальное (сумма
+	геометрических) распределение; все прогоны считаются векторно по каждому узлу
+	дерева рецептов. Промежуточные предметы крафтятся целыми партиями, поэтому
+	среднее может быть чуть выше ожидания из CraftPlanner.
+	"""
 
-	def add_income(self, amount: int, note: str = "", category: str = "trucker") -> None:
-		self._add_transaction(amount=abs(amount), ttype="income", note=note, category=category)
+	def __init__(self, craft_mgr: Any, price_mgr: Any, seed: Optional[int] = None) -> None:
+		self.craft_mgr = craft_mgr
+		self.price_mgr = price_mgr
+		self.rng = np.random.default_rng(seed)
 
-	def add_expense(self, amount: int, note: str = "", category: str = "trucker") -> None:
-		self._add_transaction(amount=-abs(amount), ttype="expense", note=note, category=category)
+	def _simulate(self, name: str, units: "np.ndarray", stack: Tuple[str, ...]) -> "np.ndarray":
+		rec = self.craft_mgr.get_recipe(name)
+		if not rec:
+			price = self.price_mgr.get_price(name)
+			if price is None:
+				raise ValueError(f"Нет цены: {name}")
+			return units * float(price)
+		if name in stack:
+			raise ValueError("Циклический рецепт: " + " -> ".join(stack + (name,)))
+		chance = max(1, min(100, int(rec.get("success_chance", 35)))) / 100.0
+		quantity = max(1, int(rec.get("quantity", 1)))
+		successes = -(-units // quantity)
+		attempts = successes.copy()
+		mask = successes > 0
+		if chance < 1.0 and mask.any():
+			attempts[mask] += self.rng.negative_binomial(successes[mask], chance)
+		cost = attempts * float(rec.get("craft_fee", 0))
+		for m, q in (rec.get("materials") or {}).items():
+			cost += self._simulate(m, attempts * int(q), stack + (name,))
+		return cost
+
+	def simulate(self, name: str, count: int = 1, trials: int = 100_000, sell_price: Optional[float] = None) -> Dict[str, Any]:
+		"""Распределение себестоимости count шт и вероятность убытка при цене продажи."""
+		count = max(1, int(count))
+		trials = max(1, int(trials))
+		cost = self._simulate(name, np.full(trials, count, dtype=np.int64), ())
+		if sell_price is None:
+			sp = self.price_mgr.get_price(name)
+			sell_price = float(sp) if sp is not None else 0.0
+		revenue = float(sell_price) * count * (1.0 - CRAFT_SALE_TAX)
+		p50, p90, p99 = np.percentile(cost, [50, 90, 99])
+		return {
+			"item": name,
+			"count": count,
+			"trials": trials,
+			"mean": float(cost.mean()),
+			"p50": float(p50),
+			"p90": float(p90),
+			"p99": float(p99),
+			"revenue": revenue,
+			"loss_probability": float((cost > revenue).mean()),
+		}
 
-	def _add_transaction(self, amount: int, ttype: str, note: str, category: str) -> None:
-		self.transactions.append(Transaction(amount=amount, type=ttype, note=note, time_iso=datetime.now().isoformat(timespec="seconds"), category=category))
-		self._autosave()
 
-	def total_seconds(self, category: Optional[str] = None) -> int:
-		seconds = 0
-		for s in self.sessions:
-			if category is not None and s.category != category:
+class CraftSensitivity:
+	"""Чувствительность прибыли рецептов к ценам базовых материалов.
+
+	Себестоимость 1 шт линейна по ценам листьев (ведомость из CraftPlanner), поэтому
+	производная по цене материала — его ожидаемое количество, а точка безубыточности
+	решается напрямую. Для what-if пересчитываются только рецепты, в дерево которых
+	входят изменённые позиции.
+	"""
+
+	def __init__(self, planner: CraftPlanner) -> None:
+		self.planner = planner
+		self.recipes: List[str] = []
+		self._dependents: Dict[str, set] = {}
+		self._profits: Dict[str, Optional[float]] = {}
+		self._leaf_report: Optional[Dict[str, List[Dict[str, Any]]]] = None
+		self.rebuild()
+
+	def rebuild(self) -> None:
+		"""Перестраивает обратный индекс материал -> рецепты и базовые прибыли."""
+		self.recipes = []
+		self._dependents = {}
+		for _lvl, recs in self.planner.craft_mgr.get_all_recipes().items():
+			for name in recs:
+				try:
+					bill = self.planner.unit_bill(name)
+				except ValueError:
+					continue
+				self.recipes.append(name)
+				for leaf in bill.leaves:
+					self._dependents.setdefault(leaf, set()).add(name)
+				# цена продажи самого предмета тоже влияет на его прибыль
+				self._dependents.setdefault(name, set()).add(name)
+		self._profits = {name: self._unit_profit(name, {}) for name in self.recipes}
+		self._leaf_report = None
+
+	def _price(self, name: str, overrides: Dict[str, float]) -> Optional[float]:
+		if name in overrides:
+			return float(overrides[name])
+		price = self.planner.price_mgr.get_price(name)
+		return None if price is None else float(price)
+
+	def _unit_profit(self, name: str, overrides: Dict[str, float], skip: Optional[str] = None) -> Optional[float]:
+		bill = self.planner.unit_bill(name)
+		cost = bill.fee
+		for leaf, q in bill.leaves.items():
+			if leaf == skip:
 				continue
-			seconds += s.duration_seconds()
-		return seconds
+			price = self._price(leaf, overrides)
+			if price is None:
+				return None
+			cost += price * q
+		sell = self._price(name, overrides) or 0.0
+		return sell * (1.0 - CRAFT_SALE_TAX) - cost
+
+	def break_even(self, name: str) -> List[Dict[str, Any]]:
+		"""Для каждого материала рецепта: производная себестоимости и цена безубыточности."""
+		out: List[Dict[str, Any]] = []
+		for leaf, q in sorted(self.planner.unit_bill(name).leaves.items()):
+			rest = self._unit_profit(name, {}, skip=leaf)
+			out.append({
+				"material": leaf,
+				"recipe": name,
+				"qty_per_unit": q,
+				"price": self._price(leaf, {}),
+				"break_even_price": (rest / q) if (rest is not None and q > 0) else None,
+			})
+		return out
+
+	def leaf_report(self) -> Dict[str, List[Dict[str, Any]]]:
+		"""Материал -> точки безубыточности во всех зависящих от него рецептах (считается один раз)."""
+		if self._leaf_report is None:
+			report: Dict[str, List[Dict[str, Any]]] = {}
+			for name in self.recipes:
+				for row in self.break_even(name):
+					report.setdefault(row["material"], []).append(row)
+			self._leaf_report = report
+		return self._leaf_report
+
+	def what_if(self, changes: Dict[str, float]) -> Dict[str, Any]:
+		"""Применяет изменения цен и возвращает новый рейтинг прибыли и рецепты, сменившие знак."""
+		affected: set = set()
+		for name in changes:
+			affected |= self._dependents.get(name, set())
+		profits = dict(self._profits)
+		for name in affected:
+			profits[name] = self._unit_profit(name, changes)
+		flipped: List[str] = []
+		for name in sorted(affected):
+			before, after = self._profits.get(name), profits.get(name)
+			if before is not None and after is not None and (before >= 0) != (after >= 0):
+				flipped.append(name)
+		ranking = sorted(((n, p) for n, p in profits.items() if p is not None), key=lambda t: t[1], reverse=True)
+		return {"ranking": ranking, "affected": sorted(affected), "flipped": flipped}
+
+
+# ------------------------
+# UI — Текущий темп
+# ------------------------
+class RateSparkline(QWidget):
+	"""Мини-график EWMA-темпа за последний час (без осей, рисуется QPainter)."""
 
-	def total_income(self, category: Optional[str] = None) -> int:
-		return sum(t.amount for t in self.transactions if t.type == "income" and (category is None or t.category == category))
+	def __init__(self, parent: Optional[QWidget] = None) -> None:
+		super().__init__(parent)
+		self._values: List[Optional[float]] = []
+		self.setMinimumHeight(32)
 
-	def total_expense(self, category: Optional[str] = None) -> int:
-		return -sum(t.amount for t in self.transactions if t.type == "expense" and (category is None or t.category == category))
+	def set_values(self, values: List[Optional[float]]) -> None:
+		self._values = values
+		self.update()
 
-	def net_profit(self, category: Optional[str] = None) -> int:
-		return self.total_income(category) - self.total_expense(category)
+	def paintEvent(self, _event: Any) -> None:  # type: ignore[override]
+		known = [v for v in self._values if v is not None]
+		if not known:
+			return
+		lo, hi = min(min(known), 0.0), max(max(known), 0.0)
+		span = (hi - lo) or 1.0
+		w, h = self.width() - 2, self.height() - 2
+		step = w / max(1, len(self._values) - 1)
+		painter = QPainter(self)
+		painter.setRenderHint(QPainter.Antialiasing)
+		zero_y = 1 + h - (0.0 - lo) / span * h
+		painter.setPen(QPen(QColor(128, 128, 128), 1, Qt.DashLine))
+		painter.drawLine(1, int(zero_y), 1 + w, int(zero_y))
+		painter.setPen(QPen(QColor(46, 139, 87), 1.5))
+		prev = None
+		for i, v in enumerate(self._values):
+			if v is None:
+				prev = None
+				continue
+			point = (1 + i * step, 1 + h - (v - lo) / span * h)
+			if prev is not None:
+				painter.drawLine(int(prev[0]), int(prev[1]), int(point[0]), int(point[1]))
+			prev = point
+		painter.end()
 
-	def profit_per_hour(self, category: Optional[str] = None) -> float:
-		seconds = self.total_seconds(category)
-		if seconds <= 0:
-			return 0.0
-		return self.net_profit(category) / (seconds / 3600.0)
 
-	def current_session(self, category: str) -> Optional[WorkSession]:
-		idx = self._running_index_by_category.get(category)
-		return self.sessions[idx] if idx is not None else None
+class LiveRateBox(QGroupBox):
+	"""Текущий темп категории: 15 минут, час, EWMA и спарклайн (данные — AppState.rates)."""
 
-	def last_session(self, category: str) -> Optional[WorkSession]:
-		for s in reversed(self.sessions):
-			if s.category == category:
-				return s
-		return None
+	def __init__(self, state: AppState, category: str) -> None:
+		super().__init__("Текущий темп")
+		self.state = state
+		self.category = category
+		# Прогноз и цели подключает MainWindow (analytics.GoalForecaster)
+		self.forecaster: Optional[analytics.GoalForecaster] = None
+		self.rate_label = QLabel("15 мин: — • Час: — • Сглаж.: —")
+		self.forecast_label = QLabel("")
+		# Полосы целей дня и недели: показываются те, что заданы
+		self.goal_bars: Dict[str, QProgressBar] = {}
+		for period in ("day", "week"):
+			bar = QProgressBar()
+			bar.setTextVisible(True)
+			bar.setVisible(False)
+			self.goal_bars[period] = bar
+		self.sparkline = RateSparkline()
+		layout = QVBoxLayout()
+		layout.addWidget(self.rate_label)
+		layout.addWidget(self.forecast_label)
+		for bar in self.goal_bars.values():
+			layout.addWidget(bar)
+		layout.addWidget(self.sparkline)
+		self.setLayout(layout)
 
-	def current_or_last_session(self, category: str) -> Optional[WorkSession]:
-		return self.current_session(category) or self.last_session(category)
+	@staticmethod
+	def _fmt(value: Optional[float]) -> str:
+		return "—" if value is None else f"{value:,.0f}".replace(",", " ")
 
-	def session_totals(self, session: WorkSession, category: Optional[str] = None) -> Tuple[int, int, int]:
-		start_dt = datetime.fromisoformat(session.start_iso)
-		end_dt = datetime.fromisoformat(session.end_iso) if session.end_iso else datetime.now()
-		inc = 0
-		exp = 0
-		for t in self.transactions:
-			if category is not None and t.category != category:
-				continue
-			time_dt = datetime.fromisoformat(t.time_iso)
-			if start_dt <= time_dt <= end_dt:
-				if t.type == "income":
-					inc += t.amount
-				else:
-					exp += -t.amount
-		return inc, exp, inc - exp
+	def refresh(self) -> None:
+		rates = self.state.live_rates(self.category)
+		self.rate_label.setText(f"15 мин: {self._fmt(rates['15m'])} • Час: {self._fmt(rates['60m'])} • Сглаж.: {self._fmt(rates['ewma'])}")
+		self.sparkline.set_values(self.state.rates.sparkline(self.category))
+		self._refresh_forecast()
 
-	def _autosave(self) -> None:
-		data = {"sessions": [asdict(s) for s in self.sessions], "transactions": [asdict(t) for t in self.transactions]}
-		self.storage.save_day(self.day, data)
+	def _refresh_forecast(self) -> None:
+		if self.forecaster is None:
+			return
+		forecasts = self.forecaster.forecasts(self.category)
+		lines = [f"Прогноз на конец дня: {self._fmt(forecasts[0].projected_day)}"]
+		shown = set()
+		for fc in forecasts:
+			if fc.goal is None:
+				continue
+			title = "дня" if fc.period == "day" else "недели"
+			text = f"Цель {title}:"
+			if fc.period == "week":
+				text += f" прогноз {self._fmt(fc.projected_period)},"
+			if fc.eta_seconds == 0:
+				text += " достигнута"
+			elif fc.eta_seconds is not None:
+				text += f" ещё ≈ {format_seconds(int(fc.eta_seconds))} работы"
+				if fc.eta_at is not None:
+					text += f" (к {fc.eta_at:%H:%M})" if fc.eta_at.date() == date.today() else f" (к {fc.eta_at:%d.%m %H:%M})"
+			else:
+				text += " темп неизвестен"
+			lines.append(text)
+			bar = self.goal_bars[fc.period]
+			bar.setRange(0, fc.goal)
+			bar.setValue(max(0, min(fc.goal, fc.achieved)))
+			bar.setFormat(f"Цель {title}: {self._fmt(fc.achieved)} / {self._fmt(fc.goal)} (%p%)")
+			shown.add(fc.period)
+		self.forecast_label.setText("\n".join(lines))
+		for period, bar in self.goal_bars.items():
+			bar.setVisible(period in shown)
 
 
 # ------------------------
-# Вспомогательные функции
+# UI — Быстрый ввод
 # ------------------------
+class QuickEntryDialog(QDialog):
+	"""Палитра быстрого ввода: строки копятся в списке и записываются одной пачкой (AppState.add_many)."""
 
-def format_seconds(total_seconds: int) -> str:
-	hours = total_seconds // 3600
-	minutes = (total_seconds % 3600) // 60
-	seconds = total_seconds % 60
-	return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+	def __init__(self, state: AppState, catalog: Dict[str, List[CatalogItem]], default_category: Optional[str] = None,
+			parent: Optional[QWidget] = None) -> None:
+		super().__init__(parent)
+		self.state = state
+		self.catalog = catalog
+		self.default_category = default_category
+		self.staged: List[QuickEntry] = []
+		self.setWindowTitle("Быстрый ввод")
+		self.resize(560, 320)
+
+		self.input = QLineEdit()
+		self.input.setPlaceholderText("fish лещ 300г 0.7 • +17000 trucker • mine железная 50x120; медная 20x90")
+		self.preview_label = QLabel("")
+		self.staged_list = QListWidget()
+		self.total_label = QLabel("")
+		self.remove_button = QPushButton("Убрать")
+		self.commit_button = QPushButton("Записать всё (Ctrl+Enter)")
+		self.commit_button.setDefault(False)
+		self.commit_button.setAutoDefault(False)
+		self.remove_button.setAutoDefault(False)
+
+		hint = f"Категория по умолчанию: {CATEGORY_LABELS[default_category]}" if default_category in CATEGORY_LABELS else "Категорию можно указать словом в строке"
+		layout = QVBoxLayout()
+		layout.addWidget(QLabel(f"Enter — добавить в список. {hint}."))
+		layout.addWidget(self.input)
+		layout.addWidget(self.preview_label)
+		layout.addWidget(self.staged_list)
+		bottom = QHBoxLayout()
+		bottom.addWidget(self.total_label)
+		bottom.addStretch(1)
+		bottom.addWidget(self.remove_button)
+		bottom.addWidget(self.commit_button)
+		layout.addLayout(bottom)
+		self.setLayout(layout)
 
+		self.input.textChanged.connect(self._on_text_changed)
+		self.input.returnPressed.connect(self._on_stage)
+		self.remove_button.clicked.connect(self._on_remove)
+		self.commit_button.clicked.connect(self._on_commit)
+		QShortcut(QKeySequence("Ctrl+Return"), self, activated=self._on_commit)
+		QShortcut(QKeySequence("Ctrl+Enter"), self, activated=self._on_commit)
+		self._refresh_total()
 
-def parse_amount(text: str) -> Optional[int]:
-	if not text:
-		return None
-	clean = text.strip().replace(" ", "").replace(",", ".")
-	if not clean:
-		return None
-	try:
-		value = float(clean)
-		return int(value)
-	except ValueError:
-		return None
+	def _parse(self, text: str) -> List[QuickEntry]:
+		return parse_quick_entries(text, self.catalog, self.default_category)
+
+	def _on_text_changed(self, text: str) -> None:
+		if not text.strip():
+			self.preview_label.setText("")
+			return
+		try:
+			self.preview_label.setText(" • ".join(e.describe() for e in self._parse(text)))
+		except ValueError as e:
+			self.preview_label.setText(f"⚠ {e}")
+
+	def _on_stage(self) -> None:
+		text = self.input.text()
+		if not text.strip():
+			# Enter в пустой строке — записать накопленное
+			self._on_commit()
+			return
+		try:
+			entries = self._parse(text)
+		except ValueError as e:
+			self.preview_label.setText(f"⚠ {e}")
+			return
+		for entry in entries:
+			self.staged.append(entry)
+			self.staged_list.addItem(entry.describe())
+		self.input.clear()
+		self._refresh_total()
+
+	def _on_remove(self) -> None:
+		row = self.staged_list.currentRow()
+		if 0 <= row < len(self.staged):
+			del self.staged[row]
+			self.staged_list.takeItem(row)
+			self._refresh_total()
+
+	def _refresh_total(self) -> None:
+		net = sum(e.amount for e in self.staged)
+		self.total_label.setText(f"Записей: {len(self.staged)} • Итого: {net:+,}".replace(",", " "))
+		self.commit_button.setEnabled(bool(self.staged))
+
+	def _on_commit(self) -> None:
+		if self.input.text().strip():
+			self._on_stage()
+			if self.input.text().strip():
+				return
+		if not self.staged:
+			return
+		self.state.add_many([e.to_entry() for e in self.staged])
+		self.accept()
 
 
-def parse_decimal(text: str) -> Optional[float]:
-	if not text:
-		return None
-	clean = text.strip().replace(" ", "").replace(",", ".")
-	if not clean:
-		return None
-	try:
-		return float(clean)
-	except ValueError:
-		return None
+# ------------------------
+# UI — Общее для вкладок работ
+# ------------------------
+class WorkTabMixin:
+	"""Старт/стоп и реакция на события AppState, общие для вкладок работ.
 
+	Вкладка задаёт self.state, self.category и методы _refresh_all/_refresh_totals.
+	"""
 
-def compute_day_series(sessions: List[WorkSession], transactions: List[Transaction]) -> Tuple[List[datetime], List[int], List[float]]:
-	events: List[datetime] = [datetime.fromisoformat(t.time_iso) for t in transactions]
-	if not events:
-		return [], [], []
-	events.sort()
-	now_dt = datetime.now()
-	if events[-1] < now_dt:
-		events.append(now_dt)
-
-	tx_sorted = sorted(transactions, key=lambda t: t.time_iso)
-	tx_idx = 0
-	cum_net = 0
-	net_series: List[int] = []
-	rph_series: List[float] = []
-	for moment in events:
-		while tx_idx < len(tx_sorted) and datetime.fromisoformat(tx_sorted[tx_idx].time_iso) <= moment:
-			cum_net += tx_sorted[tx_idx].amount
-			tx_idx += 1
-		sec = 0
-		for s in sessions:
-			start_dt = datetime.fromisoformat(s.start_iso)
-			end_dt = datetime.fromisoformat(s.end_iso) if s.end_iso else moment
-			if moment <= start_dt:
-				continue
-			clip_end = min(end_dt, moment)
-			if clip_end > start_dt:
-				sec += int((clip_end - start_dt).total_seconds())
-		rph = (cum_net / (sec / 3600.0)) if sec > 0 else 0.0
-		net_series.append(cum_net)
-		rph_series.append(rph)
-	return events, net_series, rph_series
-
-
-def compute_last_n_days(storage: DayStorage, n: int) -> Tuple[List[date], List[int], List[float]]:
-	raw_days = storage.load_last_days(n)
-	dates_list: List[date] = []
-	net_per_day: List[int] = []
-	rph_per_day: List[float] = []
-	for d, raw in raw_days.items():
-		sessions = [WorkSession(**s) for s in raw.get("sessions", [])]
-		transactions = [Transaction(**t) for t in raw.get("transactions", [])]
-		net = sum(t.amount for t in transactions)
-		sec = 0
-		for s in sessions:
-			sec += WorkSession(**asdict(s)).duration_seconds()
-		rph = (net / (sec / 3600.0)) if sec > 0 else 0.0
-		dates_list.append(d)
-		net_per_day.append(net)
-		rph_per_day.append(rph)
-	return dates_list, net_per_day, rph_per_day
+	def _on_state_event(self, event: StateEvent) -> None:
+		if event.kind in RELOAD_EVENTS or (event.kind in ("session_started", "session_stopped") and event.category == self.category):
+			self._refresh_all()
+		elif event.kind == "transaction_added" and event.category == self.category:
+			self._refresh_totals()
+
+	def _on_start(self) -> None:
+		self.state.start(self.category)
+
+	def _on_stop(self) -> None:
+		self.state.stop(self.category)
 
 
 # ------------------------
 # UI — Дальнобойщик
 # ------------------------
-class TruckerTab(QWidget):
+class TruckerTab(WorkTabMixin, QWidget):
 	def __init__(self, state: AppState) -> None:
 		super().__init__()
 		self.state = state
@@ -583,6 +821,7 @@ class TruckerTab(QWidget):
 		self.total_expense_label = QLabel("Расход: 0")
 		self.net_profit_label = QLabel("Чистая прибыль: 0")
 		self.rate_hour_label = QLabel("Заработок в час: 0.00")
+		self.live_rate_box = LiveRateBox(state, self.category)
 
 		self._build_layout()
 		self._connect()
@@ -591,6 +830,7 @@ class TruckerTab(QWidget):
 		self.timer.setInterval(1000)
 		self.timer.timeout.connect(self._tick)
 		self._refresh_all()
+		self.state.subscribe(self._on_state_event)
 
 	def _build_layout(self) -> None:
 		root = QVBoxLayout()
@@ -637,6 +877,7 @@ class TruckerTab(QWidget):
 		root.addWidget(money_group)
 		root.addWidget(sess_group)
 		root.addWidget(totals)
+		root.addWidget(self.live_rate_box)
 		root.addStretch(1)
 		self.setLayout(root)
 
@@ -646,23 +887,6 @@ class TruckerTab(QWidget):
 		self.income_add_button.clicked.connect(self._on_add_income)
 		self.expense_add_button.clicked.connect(self._on_add_expense)
 
-	def _on_start(self) -> None:
-		self.state.start(self.category)
-		self.start_button.setEnabled(False)
-		self.stop_button.setEnabled(True)
-		self.status_label.setText("Статус: Идёт работа")
-		self.timer.start()
-		self._refresh_totals()
-
-	def _on_stop(self) -> None:
-		self.state.stop(self.category)
-		self.start_button.setEnabled(True)
-		self.stop_button.setEnabled(False)
-		self.status_label.setText("Статус: Остановлено")
-		self.timer.stop()
-		self._refresh_totals()
-		self._refresh_time()
-
 	def _on_add_income(self) -> None:
 		amount = parse_amount(self.income_input.text())
 		if amount is None or amount <= 0:
@@ -670,7 +894,6 @@ class TruckerTab(QWidget):
 			return
 		self.state.add_income(amount, category=self.category)
 		self.income_input.clear()
-		self._refresh_totals()
 
 	def _on_add_expense(self) -> None:
 		amount = parse_amount(self.expense_input.text())
@@ -679,11 +902,11 @@ class TruckerTab(QWidget):
 			return
 		self.state.add_expense(amount, category=self.category)
 		self.expense_input.clear()
-		self._refresh_totals()
 
 	def _tick(self) -> None:
 		self._refresh_time()
 		self._refresh_session_totals()
+		self.live_rate_box.refresh()
 
 	def _refresh_time(self) -> None:
 		self.work_time_label.setText(format_seconds(self.state.total_seconds(self.category)))
@@ -709,6 +932,7 @@ class TruckerTab(QWidget):
 		self.total_expense_label.setText(f"Расход: {self.state.total_expense(self.category):,}".replace(",", " "))
 		self.net_profit_label.setText(f"Чистая прибыль: {self.state.net_profit(self.category):,}".replace(",", " "))
 		self.rate_hour_label.setText(f"Заработок в час: {self.state.profit_per_hour(self.category):.2f}")
+		self.live_rate_box.refresh()
 		self._refresh_session_totals()
 
 	def _refresh_all(self) -> None:
@@ -727,7 +951,7 @@ class TruckerTab(QWidget):
 # ------------------------
 # UI — Ферма
 # ------------------------
-class FarmTab(QWidget):
+class FarmTab(WorkTabMixin, QWidget):
 	def __init__(self, state: AppState) -> None:
 		super().__init__()
 		self.state = state
@@ -768,6 +992,7 @@ class FarmTab(QWidget):
 		self.total_expense_label = QLabel("Расход: 0")
 		self.net_profit_label = QLabel("Чистая прибыль: 0")
 		self.rate_hour_label = QLabel("Заработок в час: 0.00")
+		self.live_rate_box = LiveRateBox(state, self.category)
 
 		self._build_layout()
 		self._connect()
@@ -776,6 +1001,7 @@ class FarmTab(QWidget):
 		self.timer.setInterval(1000)
 		self.timer.timeout.connect(self._tick)
 		self._refresh_all()
+		self.state.subscribe(self._on_state_event)
 
 	def _build_layout(self) -> None:
 		root = QVBoxLayout()
@@ -826,6 +1052,7 @@ class FarmTab(QWidget):
 		root.addWidget(farm_group)
 		root.addWidget(sess_group)
 		root.addWidget(totals)
+		root.addWidget(self.live_rate_box)
 		root.addStretch(1)
 		self.setLayout(root)
 
@@ -834,22 +1061,12 @@ class FarmTab(QWidget):
 		self.stop_button.clicked.connect(self._on_stop)
 		self.add_sale_button.clicked.connect(self._on_add_sale)
 
-	def _on_start(self) -> None:
-		self.state.start(self.category)
-		self.start_button.setEnabled(False)
-		self.stop_button.setEnabled(True)
-		self.status_label.setText("Статус: Идёт работа")
-		self.timer.start()
-		self._refresh_totals()
-
-	def _on_stop(self) -> None:
-		self.state.stop(self.category)
-		self.start_button.setEnabled(True)
-		self.stop_button.setEnabled(False)
-		self.status_label.setText("Статус: Остановлено")
-		self.timer.stop()
-		self._refresh_totals()
-		self._refresh_time()
+	def catalog_items(self) -> List[CatalogItem]:
+		"""Каталог для быстрого ввода: семена — расход, урожай — продажа."""
+		return [
+			CatalogItem(self.category, "Урожай", "шт", note="Продажа"),
+			CatalogItem(self.category, "Семена", "шт", expense=True, note="Семена"),
+		]
 
 	def _on_add_sale(self) -> None:
 		seed_qty = parse_amount(self.seed_qty_input.text()) or 0
@@ -861,19 +1078,22 @@ class FarmTab(QWidget):
 			return
 		seed_cost = seed_qty * seed_price
 		sale_income = sale_qty * sale_price
+		entries: List[Dict[str, Any]] = []
 		if seed_cost > 0:
-			self.state.add_expense(seed_cost, note="Семена", category=self.category)
+			entries.append({"amount": -seed_cost, "note": "Семена", "category": self.category, "item": "Семена", "qty": seed_qty, "unit": "шт", "unit_price": seed_price})
 		if sale_income > 0:
-			self.state.add_income(sale_income, note="Продажа", category=self.category)
+			entries.append({"amount": sale_income, "note": "Продажа", "category": self.category, "item": "Урожай", "qty": sale_qty, "unit": "шт", "unit_price": sale_price})
+		# Покупка семян и продажа — одна запись дня
+		self.state.add_many(entries)
 		self.seed_qty_input.clear()
 		self.seed_price_input.clear()
 		self.sale_qty_input.clear()
 		self.sale_price_input.clear()
-		self._refresh_totals()
 
 	def _tick(self) -> None:
 		self._refresh_time()
 		self._refresh_session_totals()
+		self.live_rate_box.refresh()
 
 	def _refresh_time(self) -> None:
 		self.work_time_label.setText(format_seconds(self.state.total_seconds(self.category)))
@@ -899,6 +1119,7 @@ class FarmTab(QWidget):
 		self.total_expense_label.setText(f"Расход: {self.state.total_expense(self.category):,}".replace(",", " "))
 		self.net_profit_label.setText(f"Чистая прибыль: {self.state.net_profit(self.category):,}".replace(",", " "))
 		self.rate_hour_label.setText(f"Заработок в час: {self.state.profit_per_hour(self.category):.2f}")
+		self.live_rate_box.refresh()
 		self._refresh_session_totals()
 
 	def _refresh_all(self) -> None:
@@ -917,7 +1138,7 @@ class FarmTab(QWidget):
 # ------------------------
 # UI — Карьер
 # ------------------------
-class MineTab(QWidget):
+class MineTab(WorkTabMixin, QWidget):
 	def __init__(self, state: AppState) -> None:
 		super().__init__()
 		self.state = state
@@ -954,6 +1175,7 @@ class MineTab(QWidget):
 		self.total_expense_label = QLabel("Расход: 0")
 		self.net_profit_label = QLabel("Чистая прибыль: 0")
 		self.rate_hour_label = QLabel("Заработок в час: 0.00")
+		self.live_rate_box = LiveRateBox(state, self.category)
 
 		self._build_layout()
 		self._connect()
@@ -962,6 +1184,7 @@ class MineTab(QWidget):
 		self.timer.setInterval(1000)
 		self.timer.timeout.connect(self._tick)
 		self._refresh_all()
+		self.state.subscribe(self._on_state_event)
 
 	def _build_layout(self) -> None:
 		root = QVBoxLayout()
@@ -1017,6 +1240,7 @@ class MineTab(QWidget):
 		root.addWidget(ore_group)
 		root.addWidget(sess_group)
 		root.addWidget(totals)
+		root.addWidget(self.live_rate_box)
 		root.addStretch(1)
 		self.setLayout(root)
 
@@ -1025,40 +1249,30 @@ class MineTab(QWidget):
 		self.stop_button.clicked.connect(self._on_stop)
 		self.add_sales_button.clicked.connect(self._on_add_sales)
 
-	def _on_start(self) -> None:
-		self.state.start(self.category)
-		self.start_button.setEnabled(False)
-		self.stop_button.setEnabled(True)
-		self.status_label.setText("Статус: Идёт работа")
-		self.timer.start()
-		self._refresh_totals()
-
-	def _on_stop(self) -> None:
-		self.state.stop(self.category)
-		self.start_button.setEnabled(True)
-		self.stop_button.setEnabled(False)
-		self.status_label.setText("Статус: Остановлено")
-		self.timer.stop()
-		self._refresh_totals(); self._refresh_time()
+	def catalog_items(self) -> List[CatalogItem]:
+		return [CatalogItem(self.category, name, "шт", note="Продажа ({name})") for name in self.ores]
 
 	def _on_add_sales(self) -> None:
 		total_income = 0
+		entries: List[Dict[str, Any]] = []
 		for name in self.ores:
 			qty = parse_amount(self.qty_inputs[name].text()) or 0
 			price = parse_amount(self.price_inputs[name].text()) or 0
 			if qty > 0 and price >= 0:
 				income = qty * price
 				total_income += income
-				self.state.add_income(income, note=f"Продажа ({name})", category=self.category)
+				entries.append({"amount": income, "note": f"Продажа ({name})", "category": self.category, "item": name, "qty": qty, "unit": "шт", "unit_price": price})
 				self.qty_inputs[name].clear()
 				self.price_inputs[name].clear()
+		# Все строки — одна пачка: одно сохранение дня вместо записи на каждую руду
+		self.state.add_many(entries)
 		if total_income == 0:
 			QMessageBox.information(self, "Продажи", "Нет валидных значений для добавления")
-		self._refresh_totals()
 
 	def _tick(self) -> None:
 		self._refresh_time()
 		self._refresh_session_totals()
+		self.live_rate_box.refresh()
 
 	def _refresh_time(self) -> None:
 		self.work_time_label.setText(format_seconds(self.state.total_seconds(self.category)))
@@ -1084,6 +1298,7 @@ class MineTab(QWidget):
 		self.total_expense_label.setText(f"Расход: {self.state.total_expense(self.category):,}".replace(",", " "))
 		self.net_profit_label.setText(f"Чистая прибыль: {self.state.net_profit(self.category):,}".replace(",", " "))
 		self.rate_hour_label.setText(f"Заработок в час: {self.state.profit_per_hour(self.category):.2f}")
+		self.live_rate_box.refresh()
 		self._refresh_session_totals()
 
 	def _refresh_all(self) -> None:
@@ -1101,7 +1316,7 @@ class MineTab(QWidget):
 # ------------------------
 # UI — Рыбалка
 # ------------------------
-class FishTab(QWidget):
+class FishTab(WorkTabMixin, QWidget):
 	def __init__(self, state: AppState) -> None:
 		super().__init__()
 		self.state = state
@@ -1231,6 +1446,7 @@ class FishTab(QWidget):
 		self.total_expense_label = QLabel("Расход: 0")
 		self.net_profit_label = QLabel("Чистая прибыль: 0")
 		self.rate_hour_label = QLabel("Заработок в час: 0.00")
+		self.live_rate_box = LiveRateBox(state, self.category)
 
 		self._build_layout()
 		self._connect()
@@ -1239,6 +1455,7 @@ class FishTab(QWidget):
 		self.timer.setInterval(1000)
 		self.timer.timeout.connect(self._tick)
 		self._refresh_all()
+		self.state.subscribe(self._on_state_event)
 
 	def _build_layout(self) -> None:
 		root = QVBoxLayout()
@@ -1271,6 +1488,7 @@ class FishTab(QWidget):
 		root.addWidget(self.levels_tabs)
 		root.addWidget(sess_group)
 		root.addWidget(totals)
+		root.addWidget(self.live_rate_box)
 		root.addStretch(1)
 		self.setLayout(root)
 
@@ -1278,38 +1496,27 @@ class FishTab(QWidget):
 		self.start_button.clicked.connect(self._on_start)
 		self.stop_button.clicked.connect(self._on_stop)
 
-	def _on_start(self) -> None:
-		self.state.start(self.category)
-		self.start_button.setEnabled(False)
-		self.stop_button.setEnabled(True)
-		self.status_label.setText("Статус: Идёт работа")
-		self.timer.start()
-		self._refresh_totals()
-
-	def _on_stop(self) -> None:
-		self.state.stop(self.category)
-		self.start_button.setEnabled(True)
-		self.stop_button.setEnabled(False)
-		self.status_label.setText("Статус: Остановлено")
-		self.timer.stop()
-		self._refresh_totals(); self._refresh_time()
+	def catalog_items(self) -> List[CatalogItem]:
+		return [CatalogItem(self.category, fish["name"], "г", level=lvl, note="Рыба {name} (L{level}) {qty} г")
+			for lvl, fishes in self.fish_levels.items() for fish in fishes]
 
 	def _on_add_sales_level(self, level: int) -> None:
 		total_income = 0
+		entries: List[Dict[str, Any]] = []
 		for name, qty_input in self.qty_inputs_by_level[level].items():
 			grams = parse_amount(qty_input.text()) or 0
 			price_per_gram = parse_decimal(self.price_inputs_by_level[level][name].text()) or 0.0
 			if grams > 0 and price_per_gram >= 0:
 				income = int(grams * price_per_gram)
 				total_income += income
-				self.state.add_income(income, note=f"Рыба {name} (L{level}) {grams} г", category=self.category)
+				entries.append({"amount": income, "note": f"Рыба {name} (L{level}) {grams} г", "category": self.category, "item": name, "qty": grams, "unit": "г", "unit_price": price_per_gram, "level": level})
 				qty_input.clear(); self.price_inputs_by_level[level][name].clear()
+		self.state.add_many(entries)
 		if total_income == 0:
 			QMessageBox.information(self, "Продажи", "Нет валидных значений для добавления")
-		self._refresh_totals()
 
 	def _tick(self) -> None:
-		self._refresh_time(); self._refresh_session_totals()
+		self._refresh_time(); self._refresh_session_totals(); self.live_rate_box.refresh()
 
 	def _refresh_time(self) -> None:
 		self.work_time_label.setText(format_seconds(self.state.total_seconds(self.category)))
@@ -1335,6 +1542,7 @@ class FishTab(QWidget):
 		self.total_expense_label.setText(f"Расход: {self.state.total_expense(self.category):,}".replace(",", " "))
 		self.net_profit_label.setText(f"Чистая прибыль: {self.state.net_profit(self.category):,}".replace(",", " "))
 		self.rate_hour_label.setText(f"Заработок в час: {self.state.profit_per_hour(self.category):.2f}")
+		self.live_rate_box.refresh()
 		self._refresh_session_totals()
 
 	def _refresh_all(self) -> None:
@@ -1352,6 +1560,349 @@ class FishTab(QWidget):
 # ------------------------
 # UI — Статистика
 # ------------------------
+class _SortItem(QTableWidgetItem):
+	"""Ячейка, которая сортируется по значению из UserRole, а показывает отформатированный текст."""
+
+	def __init__(self, text: str, value: Any) -> None:
+		super().__init__(text)
+		self.setData(Qt.UserRole, value)
+
+	def __lt__(self, other: QTableWidgetItem) -> bool:  # type: ignore[override]
+		a, b = self.data(Qt.UserRole), other.data(Qt.UserRole)
+		if a is None or b is None:
+			return (a is None) and (b is not None)
+		return a < b
+
+
+class SessionLedgerModel(QAbstractTableModel):
+	"""Модель журнала сессий: текст в DisplayRole, сырые значения в UserRole.
+
+	Сортирует себя сама по заранее посчитанным ключам — одна сортировка списка вместо
+	тысяч вызовов data() через QSortFilterProxyModel.
+	"""
+
+	HEADERS = ["Дата", "Категория", "Начало", "Конец", "Длительность", "Доход", "Расход", "Чистая", "Зар/час", "Операций"]
+
+	def __init__(self, parent: Optional[QWidget] = None) -> None:
+		super().__init__(parent)
+		self._rows: List[analytics.SessionRow] = []
+		self._keys: List[Tuple[Any, ...]] = []
+		# Текст строк форматируется лениво — только для тех, что реально показаны
+		self._display: Dict[int, Tuple[str, ...]] = {}
+
+		self._sort_column = 2
+		self._sort_order = Qt.DescendingOrder
+
+	def set_rows(self, rows: List[analytics.SessionRow]) -> None:
+		self.beginResetModel()
+		self._rows = rows
+		self._keys = [(
+			row.day.toordinal(), row.category, row.start.timestamp(),
+			row.end.timestamp() if row.end else float("inf"), row.seconds,
+			row.income, row.expense, row.net, row.per_hour, row.transactions,
+		) for row in rows]
+		self._display = {}
+		self._apply_sort()
+		self.endResetModel()
+
+	def _apply_sort(self) -> None:
+		col = self._sort_column
+		order = sorted(range(len(self._rows)), key=lambda i: self._keys[i][col], reverse=self._sort_order == Qt.DescendingOrder)
+		self._rows = [self._rows[i] for i in order]
+		self._keys = [self._keys[i] for i in order]
+		self._display = {}
+
+	def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:  # type: ignore[override]
+		self._sort_column, self._sort_order = column, order
+		self.layoutAboutToBeChanged.emit()
+		self._apply_sort()
+		self.layoutChanged.emit()
+
+	def _display_row(self, r: int) -> Tuple[str, ...]:
+		text = self._display.get(r)
+		if text is None:
+			row = self._rows[r]
+			money = lambda v: f"{v:,}".replace(",", " ")
+			text = (
+				row.day.strftime("%d.%m.%Y"),
+				CATEGORY_LABELS.get(row.category, row.category),
+				row.start.strftime("%H:%M:%S"),
+				row.end.strftime("%H:%M:%S") if row.end else "идёт",
+				format_seconds(row.seconds),
+				money(row.income),
+				money(row.expense),
+				money(row.net),
+				f"{row.per_hour:,.0f}".replace(",", " "),
+				str(row.transactions),
+			)
+			self._display[r] = text
+		return text
+
+	def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:  # type: ignore[override]
+		return 0 if parent.isValid() else len(self._rows)
+
+	def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:  # type: ignore[override]
+		return 0 if parent.isValid() else len(self.HEADERS)
+
+	def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:  # type: ignore[override]
+		if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+			return self.HEADERS[section]
+		return None
+
+	def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:  # type: ignore[override]
+		if not index.isValid():
+			return None
+		col = index.column()
+		if role == Qt.UserRole:
+			return self._keys[index.row()][col]
+		if role == Qt.DisplayRole:
+			return self._display_row(index.row())[col]
+		if role == Qt.TextAlignmentRole and col >= 4:
+			return int(Qt.AlignRight | Qt.AlignVCenter)
+		return None
+
+
+class SessionLedgerDialog(QDialog):
+	"""Журнал сессий за период: таблица с сортировкой по любой колонке."""
+
+	PERIODS = [("7 дней", 7), ("30 дней", 30), ("90 дней", 90), ("365 дней", 365)]
+
+	def __init__(self, state: AppState, parent: Optional[QWidget] = None) -> None:
+		super().__init__(parent)
+		self.state = state
+		self.setWindowTitle("Журнал сессий")
+		self.resize(860, 480)
+		self.period_combo = QComboBox()
+		for title, days in self.PERIODS:
+			self.period_combo.addItem(title, days)
+		self.period_combo.setCurrentIndex(1)
+		self.category_combo = QComboBox()
+		self.category_combo.addItem("Все категории", None)
+		for key, title in CATEGORY_LABELS.items():
+			self.category_combo.addItem(title, key)
+		self.summary_label = QLabel("")
+
+		self.model = SessionLedgerModel(self)
+		# QTableView запрашивает данные только видимых строк — годовой журнал открывается мгновенно
+		self.view = QTableView()
+		self.view.setModel(self.model)
+		self.view.setSortingEnabled(True)
+		self.view.sortByColumn(2, Qt.DescendingOrder)
+		self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+		self.view.verticalHeader().setVisible(False)
+		self.view.horizontalHeader().setStretchLastSection(True)
+		# Ширина колонок — по первым строкам, без обхода всего журнала
+		self.view.horizontalHeader().setResizeContentsPrecision(20)
+
+		top = QHBoxLayout()
+		top.addWidget(QLabel("Период:"))
+		top.addWidget(self.period_combo)
+		top.addWidget(self.category_combo)
+		top.addStretch(1)
+		top.addWidget(self.summary_label)
+		layout = QVBoxLayout()
+		layout.addLayout(top)
+		layout.addWidget(self.view)
+		self.setLayout(layout)
+
+		self._sized = False
+		self.period_combo.currentIndexChanged.connect(lambda _i: self.reload())
+		self.category_combo.currentIndexChanged.connect(lambda _i: self.reload())
+		self.reload()
+
+	def reload(self) -> None:
+		days = int(self.period_combo.currentData())
+		end = self.state.day
+		rows = analytics.session_ledger(self.state.storage.iter_days(end - timedelta(days=days - 1), end), self.category_combo.currentData())
+		self.model.set_rows(rows)
+		if not self._sized and rows:
+			self.view.resizeColumnsToContents()
+			self._sized = True
+		total_sec = sum(r.seconds for r in rows)
+		total_net = sum(r.net for r in rows)
+		rate = total_net / (total_sec / 3600.0) if total_sec else 0.0
+		self.summary_label.setText(f"Сессий: {len(rows)}  •  {format_seconds(total_sec)}  •  {total_net:,}  •  {rate:,.0f}/ч".replace(",", " "))
+
+
+class DayEditDialog(QDialog):
+	"""Правка записей и сессий текущего дня с отменой (Ctrl+Z) и повтором (Ctrl+Y).
+
+	Изменения пишутся в журнал дня (AppState.edit_*/delete_*), файл дня не перезаписывается.
+	"""
+
+	def __init__(self, state: AppState, parent: Optional[QWidget] = None) -> None:
+		super().__init__(parent)
+		self.state = state
+		self.setWindowTitle("Правка дня")
+		self.resize(760, 520)
+
+		self.tx_table = self._make_table(["Время", "Категория", "Сумма", "Заметка"])
+		self.session_table = self._make_table(["Категория", "Начало", "Конец", "Время"])
+		self.tx_edit_button = QPushButton("Изменить…")
+		self.tx_delete_button = QPushButton("Удалить")
+		self.session_edit_button = QPushButton("Изменить…")
+		self.session_delete_button = QPushButton("Удалить")
+		self.undo_button = QPushButton("Отменить")
+		self.redo_button = QPushButton("Повторить")
+
+		layout = QVBoxLayout()
+		top = QHBoxLayout()
+		top.addWidget(QLabel(f"Дата: {self.state.day.strftime('%d.%m.%Y')}"))
+		top.addStretch(1)
+		top.addWidget(self.undo_button)
+		top.addWidget(self.redo_button)
+		layout.addLayout(top)
+		for title, table, edit_button, delete_button in (
+			("Записи", self.tx_table, self.tx_edit_button, self.tx_delete_button),
+			("Сессии", self.session_table, self.session_edit_button, self.session_delete_button),
+		):
+			row = QHBoxLayout()
+			row.addWidget(QLabel(title))
+			row.addStretch(1)
+			row.addWidget(edit_button)
+			row.addWidget(delete_button)
+			layout.addLayout(row)
+			layout.addWidget(table)
+		self.setLayout(layout)
+
+		self.tx_edit_button.clicked.connect(self._on_edit_transaction)
+		self.tx_delete_button.clicked.connect(self._on_delete_transaction)
+		self.session_edit_button.clicked.connect(self._on_edit_session)
+		self.session_delete_button.clicked.connect(self._on_delete_session)
+		self.tx_table.doubleClicked.connect(lambda _i: self._on_edit_transaction())
+		self.session_table.doubleClicked.connect(lambda _i: self._on_edit_session())
+		self.undo_button.clicked.connect(self._on_undo)
+		self.redo_button.clicked.connect(self._on_redo)
+		# Окно модальное — горячие клавиши главного окна сюда не доходят
+		QShortcut(QKeySequence("Ctrl+Z"), self, activated=self._on_undo)
+		QShortcut(QKeySequence("Ctrl+Shift+Z"), self, activated=self._on_redo)
+		QShortcut(QKeySequence("Ctrl+Y"), self, activated=self._on_redo)
+
+		self.state.subscribe(self._on_state_event)
+		self.finished.connect(lambda _r: self.state.unsubscribe(self._on_state_event))
+		self.reload()
+
+	@staticmethod
+	def _make_table(headers: List[str]) -> QTableWidget:
+		table = QTableWidget(0, len(headers))
+		table.setHorizontalHeaderLabels(headers)
+		table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+		table.setSelectionBehavior(QAbstractItemView.SelectRows)
+		table.setSelectionMode(QAbstractItemView.SingleSelection)
+		table.verticalHeader().setVisible(False)
+		table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+		table.horizontalHeader().setStretchLastSection(True)
+		return table
+
+	@staticmethod
+	def _fill(table: QTableWidget, rows: List[List[str]]) -> None:
+		current = table.currentRow()
+		table.setRowCount(len(rows))
+		for r, values in enumerate(rows):
+			for c, value in enumerate(values):
+				table.setItem(r, c, QTableWidgetItem(value))
+		if rows:
+			table.selectRow(min(max(current, 0), len(rows) - 1))
+
+	def _on_state_event(self, event: StateEvent) -> None:
+		self.reload()
+
+	def reload(self) -> None:
+		self._fill(self.tx_table, [
+			[t.time_iso[11:19], CATEGORY_LABELS.get(t.category, t.category), f"{t.amount:+,}".replace(",", " "), t.note]
+			for t in self.state.transactions
+		])
+		self._fill(self.session_table, [
+			[CATEGORY_LABELS.get(s.category, s.category), s.start_iso[11:19], s.end_iso[11:19] if s.end_iso else "идёт", format_seconds(s.duration_seconds())]
+			for s in self.state.sessions
+		])
+		undo, redo = self.state.undo_label(), self.state.redo_label()
+		self.undo_button.setEnabled(undo is not None)
+		self.redo_button.setEnabled(redo is not None)
+		self.undo_button.setToolTip(f"Отменить: {undo}" if undo else "")
+		self.redo_button.setToolTip(f"Повторить: {redo}" if redo else "")
+
+	def _run(self, action: Callable[[], Any]) -> None:
+		try:
+			action()
+		except (ValueError, IndexError) as e:
+			QMessageBox.warning(self, "Правка дня", str(e))
+
+	def _on_edit_transaction(self) -> None:
+		index = self.tx_table.currentRow()
+		if not 0 <= index < len(self.state.transactions):
+			return
+		tx = self.state.transactions[index]
+		dialog = QDialog(self)
+		dialog.setWindowTitle("Запись")
+		category_combo = QComboBox()
+		for key, title in CATEGORY_LABELS.items():
+			category_combo.addItem(title, key)
+		category_combo.setCurrentIndex(max(0, category_combo.findData(tx.category)))
+		amount_input = QLineEdit(str(tx.amount))
+		amount_input.setValidator(QIntValidator(-1_000_000_000, 1_000_000_000))
+		amount_input.setToolTip("Минус — расход")
+		note_input = QLineEdit(tx.note)
+		form = QFormLayout()
+		form.addRow("Категория:", category_combo)
+		form.addRow("Сумма:", amount_input)
+		form.addRow("Заметка:", note_input)
+		buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+		buttons.accepted.connect(dialog.accept)
+		buttons.rejected.connect(dialog.reject)
+		form.addRow(buttons)
+		dialog.setLayout(form)
+		if dialog.exec() != QDialog.Accepted:
+			return
+		try:
+			amount = int(amount_input.text())
+		except ValueError:
+			return
+		self._run(lambda: self.state.edit_transaction(index, amount=amount, category=category_combo.currentData(), note=note_input.text().strip()))
+
+	def _on_delete_transaction(self) -> None:
+		index = self.tx_table.currentRow()
+		if 0 <= index < len(self.state.transactions):
+			self._run(lambda: self.state.delete_transaction(index))
+
+	def _on_edit_session(self) -> None:
+		index = self.session_table.currentRow()
+		if not 0 <= index < len(self.state.sessions):
+			return
+		session = self.state.sessions[index]
+		dialog = QDialog(self)
+		dialog.setWindowTitle("Сессия")
+		start_edit = QDateTimeEdit(QDateTime.fromString(session.start_iso, Qt.ISODate))
+		end_edit = QDateTimeEdit(QDateTime.fromString(session.end_iso, Qt.ISODate) if session.end_iso else QDateTime.currentDateTime())
+		for edit in (start_edit, end_edit):
+			edit.setDisplayFormat("dd.MM.yyyy HH:mm:ss")
+		end_edit.setEnabled(session.end_iso is not None)
+		form = QFormLayout()
+		form.addRow("Начало:", start_edit)
+		form.addRow("Конец:", end_edit)
+		buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+		buttons.accepted.connect(dialog.accept)
+		buttons.rejected.connect(dialog.reject)
+		form.addRow(buttons)
+		dialog.setLayout(form)
+		if dialog.exec() != QDialog.Accepted:
+			return
+		start_iso = start_edit.dateTime().toString(Qt.ISODate)
+		end_iso = end_edit.dateTime().toString(Qt.ISODate) if session.end_iso else None
+		self._run(lambda: self.state.edit_session(index, start_iso=start_iso, end_iso=end_iso))
+
+	def _on_delete_session(self) -> None:
+		index = self.session_table.currentRow()
+		if 0 <= index < len(self.state.sessions):
+			self._run(lambda: self.state.delete_session(index))
+
+	def _on_undo(self) -> None:
+		self.state.undo()
+
+	def _on_redo(self) -> None:
+		self.state.redo()
+
+
 class StatsTab(QWidget):
 	def __init__(self, state: AppState) -> None:
 		super().__init__()
@@ -1366,6 +1917,8 @@ class StatsTab(QWidget):
 		self.period_tabs.addTab(QWidget(), "7 дней")
 		self.period_tabs.addTab(QWidget(), "30 дней")
 
+		self.ledger_button = QPushButton("Журнал сессий…")
+		self.edit_day_button = QPushButton("Правка дня…")
 		self.reset_button = QPushButton("Сброс…")
 		self.reset_menu = QMenu(self)
 		self._add_reset_actions()
@@ -1373,36 +1926,94 @@ class StatsTab(QWidget):
 
 		self.figure = Figure(figsize=(5, 3), tight_layout=True)
 		self.canvas = FigureCanvas(self.figure)
+		# Вид графика: линии за период или тепловая карта «день недели × час»
+		self.view_combo = QComboBox()
+		self.view_combo.addItems(["Линии", "Тепловая карта"])
+		self.heat_category_combo = QComboBox()
+		self.heat_category_combo.addItem("Все категории", None)
+		for key, title in CATEGORY_LABELS.items():
+			self.heat_category_combo.addItem(title, key)
+		self.heat_category_combo.setEnabled(False)
 
 		header = QHBoxLayout()
 		header.addWidget(QLabel("Статистика"))
 		header.addStretch(1)
+		header.addWidget(self.ledger_button)
+		header.addWidget(self.edit_day_button)
 		header.addWidget(self.reset_button)
 
 		layout = QVBoxLayout()
 		layout.addLayout(header)
-		layout.addWidget(QLabel(f"Дата: {date.today().strftime('%d.%m.%Y')}"))
+		self.date_label = QLabel()
+		layout.addWidget(self.date_label)
 		layout.addWidget(QLabel("Общее рабочее время:"))
 		layout.addWidget(self.time_label)
 		layout.addWidget(self.net_label)
 		layout.addWidget(self.rph_label)
 		layout.addWidget(self.period_tabs)
+		view_row = QHBoxLayout()
+		view_row.addWidget(QLabel("Вид:"))
+		view_row.addWidget(self.view_combo)
+		view_row.addWidget(self.heat_category_combo)
+		view_row.addStretch(1)
+		layout.addLayout(view_row)
 		layout.addWidget(self.canvas)
 		layout.addWidget(QLabel("Сводка по категориям"))
 		# Заменяем скролл на вкладки по категориям
 		self.summary_tabs = QTabWidget()
+		# Страницы сводки создаются один раз и далее только обновляются
+		self._summary_pages: Dict[str, Tuple[QWidget, QLabel]] = {}
+		self._summary_values: Dict[str, int] = {}
+		self._summary_keys: List[str] = []
 		layout.addWidget(self.summary_tabs)
+		layout.addWidget(QLabel("Доход в час по предметам"))
+		self.items_table = QTableWidget(0, 7)
+		self.items_table.setHorizontalHeaderLabels(["Категория", "Предмет", "Кол-во", "Доход", "Время", "Доход/ч", "Ср. цена"])
+		self.items_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+		self.items_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+		self.items_table.verticalHeader().setVisible(False)
+		self.items_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+		self.items_table.horizontalHeader().setStretchLastSection(True)
+		self.items_table.setSortingEnabled(True)
+		self.items_table.sortByColumn(5, Qt.DescendingOrder)
+		self.items_table.setMaximumHeight(220)
+		layout.addWidget(self.items_table)
 		layout.addStretch(1)
 		self.setLayout(layout)
 
 		self.period_tabs.currentChanged.connect(self._on_period_changed)
+		self.view_combo.currentIndexChanged.connect(self._on_view_changed)
+		self.ledger_button.clicked.connect(self._on_ledger)
+		self.edit_day_button.clicked.connect(self._on_edit_day)
+		self.heat_category_combo.currentIndexChanged.connect(lambda _i: self.replot())
 
+		# Таймер нужен только для живых часов; остальное обновляется по событиям AppState
 		self.timer = QTimer(self)
 		self.timer.setInterval(1000)
-		self.timer.timeout.connect(self.refresh)
-		self.timer.start()
+		self.timer.timeout.connect(self._tick)
+		self._refresh_pending = False
+		self._day_net_by_cat: Optional[Dict[str, int]] = None
+		self.state.subscribe(self._on_state_event)
 		self.refresh()
 
+	def _on_state_event(self, event: StateEvent) -> None:
+		if event.kind == "transaction_added" and self._day_net_by_cat is not None and event.category is not None:
+			self._day_net_by_cat[event.category] = self._day_net_by_cat.get(event.category, 0) + event.delta
+		elif event.kind in RELOAD_EVENTS:
+			self._day_net_by_cat = None
+		self._schedule_refresh()
+
+	def _schedule_refresh(self) -> None:
+		# Пачка событий подряд даёт одну перерисовку
+		if self._refresh_pending:
+			return
+		self._refresh_pending = True
+		QTimer.singleShot(0, self.refresh)
+
+	def _tick(self) -> None:
+		self.time_label.setText(format_seconds(self.state.total_seconds()))
+		self.rph_label.setText(f"Заработок в час: {self.state.profit_per_hour():.2f}")
+
 	def _add_reset_actions(self) -> None:
 		act_today = self.reset_menu.addAction("Сегодня")
 		act_7 = self.reset_menu.addAction("Последние 7 дней")
@@ -1414,11 +2025,6 @@ class StatsTab(QWidget):
 		act_30.triggered.connect(lambda: self._confirm_and_reset("30"))
 		act_all.triggered.connect(lambda: self._confirm_and_reset("all"))
 
-	def _clear_state(self) -> None:
-		self.state.sessions = []
-		self.state.transactions = []
-		self.state._running_index_by_category = {"trucker": None, "farm": None, "mine": None, "fish": None, "mushroom": None, "logger": None}
-
 	def _confirm_and_reset(self, scope: str) -> None:
 		map_title = {
 			"today": "Сбросить статистику за сегодня?",
@@ -1430,32 +2036,68 @@ class StatsTab(QWidget):
 		if ret != QMessageBox.StandardButton.Yes:
 			return
 		if scope == "today":
-			self._clear_state()
-			self.state.storage.delete_day(date.today())
+			self.state.storage.delete_day(self.state.day)
 		elif scope == "7":
-			self._clear_state()
 			self.state.storage.delete_last_days(7)
 		elif scope == "30":
-			self._clear_state()
 			self.state.storage.delete_last_days(30)
 		else:
-			self._clear_state()
 			self.state.storage.delete_all()
-		self.state._autosave()
-		self.refresh()
+		self.state.reset()
 
 	def refresh(self) -> None:
-		self.time_label.setText(format_seconds(self.state.total_seconds()))
+		self._refresh_pending = False
+		self.date_label.setText(f"Дата: {self.state.day.strftime('%d.%m.%Y')}")
+		self._tick()
 		self.net_label.setText(f"Чистая прибыль: {self.state.net_profit():,}".replace(",", " "))
-		self.rph_label.setText(f"Заработок в час: {self.state.profit_per_hour():.2f}")
+		if self.state.is_running():
+			self.timer.start()
+		else:
+			self.timer.stop()
 		self.replot()
 		# Сводку пересчитываем по активному периоду
 		index = self.period_tabs.currentIndex()
-		self._build_summary_tabs(1 if index == 0 else (7 if index == 1 else 30))
+		days = 1 if index == 0 else (7 if index == 1 else 30)
+		self._build_summary_tabs(days)
+		self._build_items_table(days)
+
+	def _on_ledger(self) -> None:
+		SessionLedgerDialog(self.state, self).exec()
+
+	def _on_edit_day(self) -> None:
+		DayEditDialog(self.state, self).exec()
+
+	def _on_view_changed(self, _index: int) -> None:
+		self.heat_category_combo.setEnabled(self.view_combo.currentIndex() == 1)
+		self.replot()
+
+	def _plot_heatmap(self, days: int) -> None:
+		end = self.state.day
+		category = self.heat_category_combo.currentData()
+		rates, _seconds = analytics.hour_heatmap(self.state.storage, end - timedelta(days=days - 1), end, category)
+		grid = np.ma.masked_invalid(np.array([[np.nan if v is None else v for v in row] for row in rates], dtype=float))
+		ax = self.figure.add_subplot(111)
+		if grid.count() == 0:
+			ax.text(0.5, 0.5, "Нет данных", transform=ax.transAxes, ha="center")
+			ax.set_axis_off()
+			self.canvas.draw_idle()
+			return
+		# Шкала симметрична вокруг нуля, чтобы убыточные часы были красными
+		limit = float(np.abs(grid).max()) or 1.0
+		image = ax.imshow(grid, aspect="auto", cmap="RdYlGn", vmin=-limit, vmax=limit, interpolation="nearest")
+		ax.set_yticks(range(7))
+		ax.set_yticklabels(analytics.WEEKDAYS)
+		ax.set_xticks(range(0, 24, 2))
+		ax.set_xlabel("Час")
+		self.figure.colorbar(image, ax=ax, label="Зар/час")
+		self.canvas.draw_idle()
 
 	def replot(self) -> None:
 		index = self.period_tabs.currentIndex()
 		self.figure.clear()
+		if self.view_combo.currentIndex() == 1:
+			self._plot_heatmap(1 if index == 0 else (7 if index == 1 else 30))
+			return
 		ax_left = self.figure.add_subplot(111)
 		ax_right = ax_left.twinx()
 		ax_left.margins(y=0.3)
@@ -1490,18 +2132,26 @@ class StatsTab(QWidget):
 		self.figure.autofmt_xdate()
 		self.canvas.draw_idle()
 
-	def _build_summary_tabs(self, days: int) -> None:
-		# запомним текущую вкладку по тексту
-		current_text = None
-		if self.summary_tabs.count() > 0 and self.summary_tabs.currentIndex() >= 0:
-			current_text = self.summary_tabs.tabText(self.summary_tabs.currentIndex())
-		self.summary_tabs.clear()
+	def _summary_page(self, key: str) -> Tuple[QWidget, QLabel]:
+		entry = self._summary_pages.get(key)
+		if entry is None:
+			page = QWidget(); v = QVBoxLayout()
+			label = QLabel("Нет данных" if key == "" else "")
+			v.addWidget(label); v.addStretch(1); page.setLayout(v)
+			entry = (page, label)
+			self._summary_pages[key] = entry
+		return entry
 
+	def _build_summary_tabs(self, days: int) -> None:
 		# Агрегация по категориям
 		cat_to_net: Dict[str, int] = {}
 		if days <= 1:
-			for t in self.state.transactions:
-				cat_to_net[t.category] = cat_to_net.get(t.category, 0) + t.amount
+			# Итоги дня поддерживаются по дельтам из событий, полный пересчёт только после сброса
+			if self._day_net_by_cat is None:
+				self._day_net_by_cat = {}
+				for t in self.state.transactions:
+					self._day_net_by_cat[t.category] = self._day_net_by_cat.get(t.category, 0) + t.amount
+			cat_to_net = dict(self._day_net_by_cat)
 		else:
 			raw_days = self.state.storage.load_last_days(days)
 			for _d, raw in raw_days.items():
@@ -1510,32 +2160,27 @@ class StatsTab(QWidget):
 					amt = int(t.get("amount", 0))
 					cat_to_net[cat] = cat_to_net.get(cat, 0) + amt
 
-		labels = {
-			"trucker": "Дальнобойщик",
-			"farm": "Ферма",
-			"mine": "Карьер",
-			"fish": "Рыбалка",
-			"mushroom": "Грибник",
-			"logger": "Лесоруб",
-		}
-		added_titles: List[str] = []
-		if not cat_to_net:
-			page = QWidget(); v = QVBoxLayout(); v.addWidget(QLabel("Нет данных")); v.addStretch(1); page.setLayout(v)
-			self.summary_tabs.addTab(page, "Все")
-			return
+		labels = CATEGORY_LABELS
+		# "" — страница "Нет данных"
+		keys = list(cat_to_net.keys()) if cat_to_net else [""]
+		if keys != self._summary_keys:
+			# Набор категорий изменился: переставляем вкладки, сохраняя выбранную
+			current = self.summary_tabs.currentWidget()
+			self.summary_tabs.blockSignals(True)
+			while self.summary_tabs.count():
+				self.summary_tabs.removeTab(0)
+			for key in keys:
+				page, _label = self._summary_page(key)
+				self.summary_tabs.addTab(page, labels.get(key, key) if key else "Все")
+			if current is not None and self.summary_tabs.indexOf(current) >= 0:
+				self.summary_tabs.setCurrentWidget(current)
+			self.summary_tabs.blockSignals(False)
+			self._summary_keys = keys
 		for cat, total in cat_to_net.items():
-			page = QWidget(); v = QVBoxLayout();
-			v.addWidget(QLabel(f"Чистая прибыль: {total:,}".replace(",", " ")))
-			v.addStretch(1); page.setLayout(v)
-			title = labels.get(cat, cat)
-			self.summary_tabs.addTab(page, title)
-			added_titles.append(title)
-		# восстановим выбор, если возможно
-		if current_text and current_text in added_titles:
-			for i in range(self.summary_tabs.count()):
-				if self.summary_tabs.tabText(i) == current_text:
-					self.summary_tabs.setCurrentIndex(i)
-					break
+			if self._summary_values.get(cat) == total:
+				continue
+			self._summary_values[cat] = total
+			self._summary_page(cat)[1].setText(f"Чистая прибыль: {total:,}".replace(",", " "))
 
 	def _on_period_changed(self, _index: int) -> None:
 		# Перестраиваем график и сводку сразу при переключении периода
@@ -1543,9 +2188,33 @@ class StatsTab(QWidget):
 		index = self.period_tabs.currentIndex()
 		days = 1 if index == 0 else (7 if index == 1 else 30)
 		self._build_summary_tabs(days)
-
-
-class MushroomTab(QWidget):
+		self._build_items_table(days)
+
+	def _build_items_table(self, days: int) -> None:
+		# Только свёртки индекса — сырые транзакции не перечитываются
+		end = self.state.day
+		rows = analytics.item_yield(self.state.storage, end - timedelta(days=days - 1), end)
+		table = self.items_table
+		table.setSortingEnabled(False)
+		table.setRowCount(len(rows))
+		for r, row in enumerate(rows):
+			qty_text = f"{row.qty:g} {row.unit}" if row.qty and row.unit else (f"{row.qty:g}" if row.qty else "—")
+			item_text = f"{row.item} (L{row.level})" if row.level is not None else row.item
+			cells = [
+				_SortItem(CATEGORY_LABELS.get(row.category, row.category), row.category),
+				_SortItem(item_text, row.item),
+				_SortItem(qty_text, row.qty),
+				_SortItem(f"{row.income:,}".replace(",", " "), row.income),
+				_SortItem(format_seconds(row.seconds) if row.seconds else "—", row.seconds),
+				_SortItem(f"{row.per_hour:,.0f}".replace(",", " ") if row.seconds else "—", row.per_hour),
+				_SortItem(f"{row.avg_price:.2f}" if row.avg_price is not None else "—", row.avg_price),
+			]
+			for c, cell in enumerate(cells):
+				table.setItem(r, c, cell)
+		table.setSortingEnabled(True)
+
+
+class MushroomTab(WorkTabMixin, QWidget):
 	def __init__(self, state: AppState) -> None:
 		super().__init__()
 		self.state = state
@@ -1579,6 +2248,7 @@ class MushroomTab(QWidget):
 		self.total_expense_label = QLabel("Расход: 0")
 		self.net_profit_label = QLabel("Чистая прибыль: 0")
 		self.rate_hour_label = QLabel("Заработок в час: 0.00")
+		self.live_rate_box = LiveRateBox(state, self.category)
 
 		self._build_layout()
 		self._connect()
@@ -1587,6 +2257,7 @@ class MushroomTab(QWidget):
 		self.timer.setInterval(1000)
 		self.timer.timeout.connect(self._tick)
 		self._refresh_all()
+		self.state.subscribe(self._on_state_event)
 
 	def _build_layout(self) -> None:
 		root = QVBoxLayout()
@@ -1634,6 +2305,7 @@ class MushroomTab(QWidget):
 		root.addWidget(ore_group)
 		root.addWidget(sess_group)
 		root.addWidget(totals)
+		root.addWidget(self.live_rate_box)
 		root.addStretch(1)
 		self.setLayout(root)
 
@@ -1642,38 +2314,26 @@ class MushroomTab(QWidget):
 		self.stop_button.clicked.connect(self._on_stop)
 		self.add_sales_button.clicked.connect(self._on_add_sales)
 
-	def _on_start(self) -> None:
-		self.state.start(self.category)
-		self.start_button.setEnabled(False)
-		self.stop_button.setEnabled(True)
-		self.status_label.setText("Статус: Идёт работа")
-		self.timer.start()
-		self._refresh_totals()
-
-	def _on_stop(self) -> None:
-		self.state.stop(self.category)
-		self.start_button.setEnabled(True)
-		self.stop_button.setEnabled(False)
-		self.status_label.setText("Статус: Остановлено")
-		self.timer.stop()
-		self._refresh_totals(); self._refresh_time()
+	def catalog_items(self) -> List[CatalogItem]:
+		return [CatalogItem(self.category, item["name"], "шт", note="Гриб {name} x{qty}") for item in self.items]
 
 	def _on_add_sales(self) -> None:
 		total_income = 0
+		entries: List[Dict[str, Any]] = []
 		for item in self.items:
 			qty = parse_amount(self.qty_inputs[item['name']].text()) or 0
 			price = parse_amount(self.price_inputs[item['name']].text()) or 0
 			if qty > 0 and price >= 0:
 				income = qty * price
 				total_income += income
-				self.state.add_income(income, note=f"Гриб {item['name']} x{qty}", category=self.category)
+				entries.append({"amount": income, "note": f"Гриб {item['name']} x{qty}", "category": self.category, "item": item['name'], "qty": qty, "unit": "шт", "unit_price": price})
 				self.qty_inputs[item['name']].clear(); self.price_inputs[item['name']].clear()
+		self.state.add_many(entries)
 		if total_income == 0:
 			QMessageBox.information(self, "Продажи", "Нет валидных значений для добавления")
-		self._refresh_totals()
 
 	def _tick(self) -> None:
-		self._refresh_time(); self._refresh_session_totals()
+		self._refresh_time(); self._refresh_session_totals(); self.live_rate_box.refresh()
 
 	def _refresh_time(self) -> None:
 		self.work_time_label.setText(format_seconds(self.state.total_seconds(self.category)))
@@ -1699,6 +2359,7 @@ class MushroomTab(QWidget):
 		self.total_expense_label.setText(f"Расход: {self.state.total_expense(self.category):,}".replace(",", " "))
 		self.net_profit_label.setText(f"Чистая прибыль: {self.state.net_profit(self.category):,}".replace(",", " "))
 		self.rate_hour_label.setText(f"Заработок в час: {self.state.profit_per_hour(self.category):.2f}")
+		self.live_rate_box.refresh()
 		self._refresh_session_totals()
 
 	def _refresh_all(self) -> None:
@@ -1713,7 +2374,7 @@ class MushroomTab(QWidget):
 		self._refresh_totals(); self._refresh_time()
 
 
-class LoggerTab(QWidget):
+class LoggerTab(WorkTabMixin, QWidget):
 	def __init__(self, state: AppState) -> None:
 		super().__init__()
 		self.state = state
@@ -1745,6 +2406,7 @@ class LoggerTab(QWidget):
 		self.total_expense_label = QLabel("Расход: 0")
 		self.net_profit_label = QLabel("Чистая прибыль: 0")
 		self.rate_hour_label = QLabel("Заработок в час: 0.00")
+		self.live_rate_box = LiveRateBox(state, self.category)
 
 		self._build_layout()
 		self._connect()
@@ -1753,6 +2415,7 @@ class LoggerTab(QWidget):
 		self.timer.setInterval(1000)
 		self.timer.timeout.connect(self._tick)
 		self._refresh_all()
+		self.state.subscribe(self._on_state_event)
 
 	def _build_layout(self) -> None:
 		root = QVBoxLayout()
@@ -1800,6 +2463,7 @@ class LoggerTab(QWidget):
 		root.addWidget(ore_group)
 		root.addWidget(sess_group)
 		root.addWidget(totals)
+		root.addWidget(self.live_rate_box)
 		root.addStretch(1)
 		self.setLayout(root)
 
@@ -1808,38 +2472,26 @@ class LoggerTab(QWidget):
 		self.stop_button.clicked.connect(self._on_stop)
 		self.add_sales_button.clicked.connect(self._on_add_sales)
 
-	def _on_start(self) -> None:
-		self.state.start(self.category)
-		self.start_button.setEnabled(False)
-		self.stop_button.setEnabled(True)
-		self.status_label.setText("Статус: Идёт работа")
-		self.timer.start()
-		self._refresh_totals()
-
-	def _on_stop(self) -> None:
-		self.state.stop(self.category)
-		self.start_button.setEnabled(True)
-		self.stop_button.setEnabled(False)
-		self.status_label.setText("Статус: Остановлено")
-		self.timer.stop()
-		self._refresh_totals(); self._refresh_time()
+	def catalog_items(self) -> List[CatalogItem]:
+		return [CatalogItem(self.category, item["name"], "шт", note="Лес {name} x{qty}") for item in self.items]
 
 	def _on_add_sales(self) -> None:
 		total_income = 0
+		entries: List[Dict[str, Any]] = []
 		for item in self.items:
 			qty = parse_amount(self.qty_inputs[item['name']].text()) or 0
 			price = parse_amount(self.price_inputs[item['name']].text()) or 0
 			if qty > 0 and price >= 0:
 				income = qty * price
 				total_income += income
-				self.state.add_income(income, note=f"Лес {item['name']} x{qty}", category=self.category)
+				entries.append({"amount": income, "note": f"Лес {item['name']} x{qty}", "category": self.category, "item": item['name'], "qty": qty, "unit": "шт", "unit_price": price})
 				self.qty_inputs[item['name']].clear(); self.price_inputs[item['name']].clear()
+		self.state.add_many(entries)
 		if total_income == 0:
 			QMessageBox.information(self, "Продажи", "Нет валидных значений для добавления")
-		self._refresh_totals()
 
 	def _tick(self) -> None:
-		self._refresh_time(); self._refresh_session_totals()
+		self._refresh_time(); self._refresh_session_totals(); self.live_rate_box.refresh()
 
 	def _refresh_time(self) -> None:
 		self.work_time_label.setText(format_seconds(self.state.total_seconds(self.category)))
@@ -1865,6 +2517,7 @@ class LoggerTab(QWidget):
 		self.total_expense_label.setText(f"Расход: {self.state.total_expense(self.category):,}".replace(",", " "))
 		self.net_profit_label.setText(f"Чистая прибыль: {self.state.net_profit(self.category):,}".replace(",", " "))
 		self.rate_hour_label.setText(f"Заработок в час: {self.state.profit_per_hour(self.category):.2f}")
+		self.live_rate_box.refresh()
 		self._refresh_session_totals()
 
 	def _refresh_all(self) -> None:
@@ -1886,6 +2539,9 @@ class CraftTab(QWidget):
 		# Инициализация менеджеров крафта и цен
 		self.craft_mgr = None
 		self.price_mgr = None
+		self.planner: Optional[CraftPlanner] = None
+		# Строится по первому запросу и сбрасывается вместе с памятью планировщика и при смене цен
+		self._sensitivity: Optional[CraftSensitivity] = None
 		self._ensure_managers()
 
 		# UI элементы
@@ -1899,6 +2555,9 @@ class CraftTab(QWidget):
 		self.export_button = QPushButton("Экспорт CSV")
 		self.calc_button = QPushButton("Рассчитать прибыль")
 		self.prices_button = QPushButton("Изменить цены…")
+		self.plan_button = QPushButton("План крафта…")
+		self.break_even_button = QPushButton("Безубыточность")
+		self.what_if_button = QPushButton("Что если…")
 
 		self.list_widget = QListWidget()
 
@@ -1919,6 +2578,8 @@ class CraftTab(QWidget):
 				self.price_mgr = CraftPriceManager(prices_file=prices_path)
 		except Exception:
 			self.price_mgr = None
+		if self.craft_mgr and self.price_mgr and self.planner is None:
+			self.planner = CraftPlanner(self.craft_mgr, self.price_mgr)
 
 	def _build_layout(self) -> None:
 		root = QVBoxLayout()
@@ -1931,7 +2592,8 @@ class CraftTab(QWidget):
 		row = QHBoxLayout()
 		row.addWidget(self.add_button); row.addWidget(self.edit_button); row.addWidget(self.delete_button)
 		row.addStretch(1)
-		row.addWidget(self.import_button); row.addWidget(self.export_button); row.addWidget(self.calc_button); row.addWidget(self.prices_button)
+		row.addWidget(self.import_button); row.addWidget(self.export_button); row.addWidget(self.calc_button); row.addWidget(self.plan_button); row.addWidget(self.prices_button)
+		row.addWidget(self.break_even_button); row.addWidget(self.what_if_button)
 		root.addLayout(row)
 		self.setLayout(root)
 
@@ -1946,9 +2608,15 @@ class CraftTab(QWidget):
 		self.calc_button.clicked.connect(self._on_calc)
 		self.list_widget.itemDoubleClicked.connect(lambda *_: self._on_edit())
 		self.prices_button.clicked.connect(self._on_prices)
+		self.plan_button.clicked.connect(self._on_plan)
+		self.break_even_button.clicked.connect(self._on_break_even)
+		self.what_if_button.clicked.connect(self._on_what_if)
 
 	def _reload_list(self) -> None:
 		self.list_widget.clear()
+		if self.planner:
+			self.planner.invalidate()
+		self._sensitivity = None
 		if not self.craft_mgr:
 			self.list_widget.addItem("Модуль крафта не найден")
 			return
@@ -2083,27 +2751,148 @@ class CraftTab(QWidget):
 		name = item.data(Qt.UserRole)
 		# Перед расчётом убедимся, что есть цены на все базовые материалы
 		missing = self._find_missing_leaf_prices(name)
-		if missing:
-			if not self._prompt_set_prices(missing):
-				return
-			ev = self.craft_mgr.evaluate_profitability(name, self.price_mgr)
-		else:
-			ev = self.craft_mgr.evaluate_profitability(name, self.price_mgr)
+		if missing is None or (missing and not self._prompt_set_prices(missing)):
+			return
+		ev = self.craft_mgr.evaluate_profitability(name, self.price_mgr)
 		if not ev:
 			QMessageBox.information(self, "Калькулятор", "Невозможно посчитать. Проверьте цены материалов и шанс.")
 			return
+		quantity = int(ev.get('quantity', 1))
+		try:
+			# Себестоимость — по той же модели, что план и симуляция: шанс учитывается и у промежуточных рецептов
+			plan = self.planner.plan(name, quantity, sell_price=ev['sell_price'])
+		except ValueError as e:
+			QMessageBox.warning(self, "Калькулятор", str(e))
+			return
 		info = [
 			f"Предмет: {ev['item']}",
 			f"Шанс: {ev['chance']:.1f}%",
-			f"Кол-во за крафт: {ev.get('quantity',1)}",
-			f"Материалы: ${ev['materials_cost']:.0f}",
-			f"Сбор: ${ev['fee_per_attempt']:.0f}",
-			f"Ожид. себестоимость: ${ev['expected_cost']:.0f}",
+			f"Кол-во за крафт: {quantity}",
+			f"Материалы: ${plan['materials_cost']:.0f}",
+			f"Сборы: ${plan['fees']:.0f} (${ev['fee_per_attempt']:.0f} за попытку)",
+			f"Ожид. себестоимость: ${plan['expected_cost']:.0f}",
+		]
+		try:
+			risk = CraftRiskSimulator(self.craft_mgr, self.price_mgr).simulate(name, quantity, sell_price=ev['sell_price'])
+			info += [
+				f"Себестоимость P50/P90/P99: ${risk['p50']:.0f} / ${risk['p90']:.0f} / ${risk['p99']:.0f}",
+				f"Вероятность убытка: {risk['loss_probability'] * 100:.1f}%",
+			]
+		except ValueError:
+			pass
+		info += [
 			f"Цена продажи: ${ev['sell_price']:.0f}",
-			f"Прибыль: ${ev['profit']:.0f}",
+			f"Прибыль: ${plan['profit']:.0f}",
 		]
 		QMessageBox.information(self, "Калькулятор", "\n".join(info))
 
+	def _on_plan(self) -> None:
+		"""Ведомость материалов и ожидаемая себестоимость для заказа из N предметов."""
+		if not self.planner:
+			QMessageBox.warning(self, "План крафта", "Нет модулей крафта/цен")
+			return
+		item = self.list_widget.currentItem()
+		if not item:
+			QMessageBox.information(self, "План крафта", "Выберите рецепт")
+			return
+		name = item.data(Qt.UserRole)
+		count, ok = QInputDialog.getInt(self, "План крафта", f"{name}: сколько штук нужно получить?", 1, 1, 1_000_000, 1)
+		if not ok:
+			return
+		try:
+			plan = self.planner.plan(name, count)
+		except ValueError as e:
+			QMessageBox.warning(self, "План крафта", str(e))
+			return
+		info = [f"Предмет: {plan['item']} × {plan['count']}", "", "Материалы:"]
+		for m, q in sorted(plan["materials"].items()):
+			price = self.price_mgr.get_price(m)
+			cost = f"${float(price) * q:.0f}" if price is not None else "нет цены"
+			info.append(f"  {m}: {q:.1f} шт — {cost}")
+		info.append("")
+		info.append("Ожидаемые попытки:")
+		for it, a in sorted(plan["attempts"].items()):
+			info.append(f"  {it}: {a:.1f}")
+		info += [
+			"",
+			f"Материалы: ${plan['materials_cost']:.0f}",
+			f"Сборы: ${plan['fees']:.0f}",
+			f"Ожид. себестоимость: ${plan['expected_cost']:.0f} (${plan['unit_cost']:.0f} за шт)",
+			f"Выручка: ${plan['revenue']:.0f}",
+			f"Прибыль: ${plan['profit']:.0f}",
+		]
+		if plan["missing"]:
+			info.append("")
+			info.append("Нет цен: " + ", ".join(plan["missing"]))
+		QMessageBox.information(self, "План крафта", "\n".join(info))
+
+	def _craft_sensitivity(self) -> CraftSensitivity:
+		if self._sensitivity is None:
+			self._sensitivity = CraftSensitivity(self.planner)
+		return self._sensitivity
+
+	def _on_break_even(self) -> None:
+		"""Показывает для выбранного рецепта цены материалов, при которых прибыль обнуляется."""
+		if not self.planner:
+			QMessageBox.warning(self, "Безубыточность", "Нет модулей крафта/цен")
+			return
+		item = self.list_widget.currentItem()
+		if not item:
+			QMessageBox.information(self, "Безубыточность", "Выберите рецепт")
+			return
+		name = item.data(Qt.UserRole)
+		try:
+			sensitivity = self._craft_sensitivity()
+			rows = sensitivity.break_even(name)
+		except ValueError as e:
+			QMessageBox.warning(self, "Безубыточность", str(e))
+			return
+		info = [f"Предмет: {name}", "Материал: кол-во на 1 шт (= $ себестоимости за $1 цены), цена → безубыточность", ""]
+		for row in rows:
+			cur = f"${row['price']:.0f}" if row["price"] is not None else "—"
+			be = f"${row['break_even_price']:.0f}" if row["break_even_price"] is not None else "—"
+			info.append(f"  {row['material']}: {row['qty_per_unit']:.2f}, {cur} → {be}")
+		# Те же материалы в других рецептах: самая низкая безубыточная цена ограничивает закупку
+		report = sensitivity.leaf_report()
+		others = []
+		for row in rows:
+			limits = [r for r in report.get(row["material"], []) if r["recipe"] != name and r["break_even_price"] is not None]
+			if limits:
+				low = min(limits, key=lambda r: r["break_even_price"])
+				others.append(f"  {row['material']}: ещё в {len(limits)} рец., минимум ${low['break_even_price']:.0f} ({low['recipe']})")
+		if others:
+			info += ["", "В других рецептах:"] + others
+		QMessageBox.information(self, "Безубыточность", "\n".join(info))
+
+	def _on_what_if(self) -> None:
+		"""Пересчитывает рейтинг прибыли всех рецептов при гипотетических ценах (цены не сохраняются)."""
+		if not self.planner:
+			QMessageBox.warning(self, "Что если", "Нет модулей крафта/цен")
+			return
+		text, ok = QInputDialog.getMultiLineText(self, "Что если", "Материал:новая цена через запятую или с новой строки", "")
+		if not ok:
+			return
+		changes: Dict[str, float] = {}
+		for part in [p.strip() for p in re.split(r"[,\n]", text) if p.strip()]:
+			if ':' in part:
+				m, v = part.rsplit(':', 1)
+				val = parse_decimal(v)
+				if m.strip() and val is not None:
+					changes[m.strip()] = val
+		if not changes:
+			QMessageBox.information(self, "Что если", "Нет валидных изменений")
+			return
+		res = self._craft_sensitivity().what_if(changes)
+		info = [f"Затронуто рецептов: {len(res['affected'])}"]
+		if res["flipped"]:
+			info.append("Сменили знак прибыли: " + ", ".join(res["flipped"]))
+		info.append("")
+		info.append("Прибыль за 1 шт:")
+		for n, p in res["ranking"][:30]:
+			mark = " *" if n in res["affected"] else ""
+			info.append(f"  {n}: ${p:.0f}{mark}")
+		QMessageBox.information(self, "Что если", "\n".join(info))
+
 	def _on_prices(self) -> None:
 		"""Открывает диалог правки цен: все материалы рецепта + цена продажи."""
 		if not (self.craft_mgr and self.price_mgr):
@@ -2133,6 +2922,8 @@ class CraftTab(QWidget):
 		collect(name)
 		# Добавим сам предмет как продаваемый
 		positions[name] = self.price_mgr.get_price(name)
+		# Кэш сбрасывается до цикла: при отмене на середине уже введённые цены сохранены
+		self._sensitivity = None
 		# Пройдемся по позициям и запросим цену
 		for pname, cur in positions.items():
 			label = "Цена продажи" if pname == name else "Цена материала"
@@ -2149,34 +2940,24 @@ class CraftTab(QWidget):
 				QMessageBox.warning(self, "Цены", f"Не удалось сохранить цену: {pname}")
 		QMessageBox.information(self, "Цены", "Цены обновлены")
 
-	def _find_missing_leaf_prices(self, item_name: str) -> List[str]:
-		"""Собирает список базовых (не имеющих собственного рецепта) материалов без цены."""
-		if not (self.craft_mgr and self.price_mgr):
+	def _find_missing_leaf_prices(self, item_name: str) -> Optional[List[str]]:
+		"""Собирает список базовых (не имеющих собственного рецепта) материалов без цены.
+
+		None — дерево рецепта не разворачивается (цикл); ошибка уже показана.
+		"""
+		if not self.planner:
 			return []
-		seen: set[str] = set()
-		missing: set[str] = set()
-		def walk(name: str) -> None:
-			if name in seen: return
-			seen.add(name)
-			rec = self.craft_mgr.get_recipe(name)
-			if rec:
-				for m, _q in (rec.get("materials") or {}).items():
-					if self.craft_mgr.get_recipe(m):
-						walk(m)
-					else:
-						if self.price_mgr.get_price(m) is None:
-							missing.add(m)
-			else:
-				# это базовый материал
-				if self.price_mgr.get_price(name) is None:
-					missing.add(name)
-		walk(item_name)
-		return sorted(missing)
+		try:
+			return self.planner.missing_prices(item_name)
+		except ValueError as e:
+			QMessageBox.warning(self, "Калькулятор", str(e))
+			return None
 
 	def _prompt_set_prices(self, materials: List[str]) -> bool:
 		"""Запрашивает у пользователя цены для материалов и сохраняет их. Возвращает True, если всё введено."""
 		if not self.price_mgr:
 			return False
+		self._sensitivity = None
 		for mat in materials:
 			price, ok = QInputDialog.getInt(self, "Цена материала", f"{mat}: введите цену за 1 шт", 0, 0, 1_000_000_000, 1)
 			if not ok:
@@ -2204,6 +2985,7 @@ class SettingsManager:
 			"always_on_top": False,
 			"tabs_visibility": {"stats": True, "trucker": True, "farm": True, "mine": True, "fish": True, "mushroom": True, "logger": True, "craft": True},
 			"updates": {"github_manifest_url": DEFAULT_MANIFEST_URL, "auto_check": True},
+			"goals": {},  # {категория: {"day": сумма, "week": сумма}}
 		}
 		try:
 			if os.path.exists(self.file_path):
@@ -2240,9 +3022,14 @@ class SettingsTab(QWidget):
 		self.always_on_top = QCheckBox("Поверх всех окон")
 		self.data_path_label = QLabel(self.data_dir)
 		self.data_size_label = QLabel("-")
+		self.month_size_label = QLabel("")
+		self.compact_label = QLabel("")
+		self.compact_button = QPushButton("Сжать журнал правок")
 		self.open_dir_button = QPushButton("Открыть папку")
 		self.refresh_size_button = QPushButton("Обновить размер")
 		self.update_button = QPushButton("Обновить приложение…")
+		self.export_button = QPushButton("Экспорт истории…")
+		self.import_button = QPushButton("Импорт истории…")
 		self.discord_button = QPushButton("Discord")
 		self.discord_button.setToolTip("Открыть Discord сообщество")
 		try:
@@ -2269,6 +3056,19 @@ class SettingsTab(QWidget):
 		self.cb_logger = QCheckBox("Лесоруб")
 		self.cb_craft = QCheckBox("Крафт")
 
+		# Цели: по паре полей (день, неделя) на категорию; 0 — цели нет
+		self.goal_spins: Dict[str, Tuple[QSpinBox, QSpinBox]] = {}
+		for key in CATEGORY_LABELS:
+			pair = []
+			for _period in ("day", "week"):
+				spin = QSpinBox()
+				spin.setRange(0, 1_000_000_000)
+				spin.setSingleStep(1000)
+				spin.setGroupSeparatorShown(True)
+				spin.setSpecialValueText("нет")
+				pair.append(spin)
+			self.goal_spins[key] = (pair[0], pair[1])
+
 		self._build_layout()
 		self._connect()
 		self._apply_loaded()
@@ -2295,7 +3095,18 @@ class SettingsTab(QWidget):
 		btn_row.addWidget(self.discord_button)
 		data_form.addRow("Путь:", self.data_path_label)
 		data_form.addRow("Размер:", self.data_size_label)
+		data_form.addRow("По месяцам:", self.month_size_label)
+		compact_row = QHBoxLayout()
+		compact_row.addWidget(self.compact_label)
+		compact_row.addWidget(self.compact_button)
+		compact_row.addStretch(1)
+		data_form.addRow("", compact_row)
 		data_form.addRow("", btn_row)
+		io_row = QHBoxLayout()
+		io_row.addWidget(self.export_button)
+		io_row.addWidget(self.import_button)
+		io_row.addStretch(1)
+		data_form.addRow("История:", io_row)
 		data_group.setLayout(data_form)
 
 		vis_group = QGroupBox("Видимость вкладок")
@@ -2310,9 +3121,21 @@ class SettingsTab(QWidget):
 		vis_form.addRow(self.cb_craft)
 		vis_group.setLayout(vis_form)
 
+		goals_group = QGroupBox("Цели (чистая прибыль)")
+		goals_form = QFormLayout()
+		for key, (day_spin, week_spin) in self.goal_spins.items():
+			row = QHBoxLayout()
+			row.addWidget(QLabel("день"))
+			row.addWidget(day_spin)
+			row.addWidget(QLabel("неделя"))
+			row.addWidget(week_spin)
+			goals_form.addRow(f"{CATEGORY_LABELS[key]}:", row)
+		goals_group.setLayout(goals_form)
+
 		root.addWidget(win_group)
 		root.addWidget(data_group)
 		root.addWidget(vis_group)
+		root.addWidget(goals_group)
 		root.addStretch(1)
 		self.setLayout(root)
 
@@ -2320,8 +3143,13 @@ class SettingsTab(QWidget):
 		self.opacity_slider.valueChanged.connect(self._on_opacity_changed)
 		self.always_on_top.toggled.connect(self._on_top_toggled)
 		self.open_dir_button.clicked.connect(self._on_open_dir)
-		self.refresh_size_button.clicked.connect(self._update_data_size)
+		self.refresh_size_button.clicked.connect(lambda: self._update_data_size(rescan=True))
+		self.compact_button.clicked.connect(self._on_compact_journal)
+		# Счётчики места ведёт DayStorage — обновлять подпись дёшево на каждое изменение
+		self.main_window.state.subscribe(lambda _event: self._update_data_size())
 		self.update_button.clicked.connect(self._on_update)
+		self.export_button.clicked.connect(self._on_export_history)
+		self.import_button.clicked.connect(self._on_import_history)
 		self.discord_button.clicked.connect(lambda: webbrowser.open('https://discord.gg/n5hcWe2JUg'))
 		self.cb_stats.toggled.connect(lambda v: self._on_tab_toggle('stats', v))
 		self.cb_trucker.toggled.connect(lambda v: self._on_tab_toggle('trucker', v))
@@ -2331,6 +3159,9 @@ class SettingsTab(QWidget):
 		self.cb_mushroom.toggled.connect(lambda v: self._on_tab_toggle('mushroom', v))
 		self.cb_logger.toggled.connect(lambda v: self._on_tab_toggle('logger', v))
 		self.cb_craft.toggled.connect(lambda v: self._on_tab_toggle('craft', v))
+		for key, spins in self.goal_spins.items():
+			for period, spin in zip(("day", "week"), spins):
+				spin.valueChanged.connect(lambda v, k=key, p=period: self._on_goal_changed(k, p, v))
 
 	def _apply_loaded(self) -> None:
 		opacity = float(self.settings.get("opacity", 1.0))
@@ -2353,6 +3184,12 @@ class SettingsTab(QWidget):
 		self.cb_logger.setChecked(bool(vis.get('logger', True)))
 		self.cb_craft.setChecked(bool(vis.get('craft', True)))
 		self._apply_tabs_visibility()
+		goals = dict(self.settings.get('goals', {}))
+		for key, spins in self.goal_spins.items():
+			for period, spin in zip(("day", "week"), spins):
+				spin.blockSignals(True)
+				spin.setValue(int(goals.get(key, {}).get(period, 0)))
+				spin.blockSignals(False)
 
 	def _on_opacity_changed(self, value: int) -> None:
 		opacity = max(0.5, min(1.0, value / 100.0))
@@ -2368,6 +3205,22 @@ class SettingsTab(QWidget):
 		self.settings["always_on_top"] = bool(checked)
 		self.manager.save(self.settings)
 
+	def _on_goal_changed(self, key: str, period: str, value: int) -> None:
+		goals = dict(self.settings.get('goals', {}))
+		goal = dict(goals.get(key, {}))
+		if value > 0:
+			goal[period] = value
+		else:
+			goal.pop(period, None)
+		if goal:
+			goals[key] = goal
+		else:
+			goals.pop(key, None)
+		self.settings['goals'] = goals
+		self.manager.save(self.settings)
+		if hasattr(self.main_window, 'set_goals'):
+			self.main_window.set_goals(goals)
+
 	def _on_open_dir(self) -> None:
 		try:
 			os.startfile(self.data_dir)
@@ -2378,13 +3231,97 @@ class SettingsTab(QWidget):
 		# Показываем диалог сравнения версий и предлагаем только релизные обновления
 		self.main_window.show_update_prompt()
 
-	def _update_data_size(self) -> None:
-		total = 0
-		for root, _, files in os.walk(self.data_dir):
-			for name in files:
-				if name.endswith('.json'):
-					total += os.path.getsize(os.path.join(root, name))
-		self.data_size_label.setText(self._format_bytes(total))
+	@staticmethod
+	def _history_filters() -> str:
+		filters = ["CSV (*.csv)", "JSON Lines (*.jsonl)"]
+		if history_io.parquet_available():
+			filters.append("Parquet (*.parquet)")
+		return ";;".join(filters)
+
+	def _on_export_history(self) -> None:
+		path, _ = QFileDialog.getSaveFileName(self, "Экспорт истории", self.base_dir, self._history_filters())
+		if not path:
+			return
+		storage = self.main_window.storage
+		self.export_button.setEnabled(False)
+
+		def done(count: Any) -> None:
+			self.export_button.setEnabled(True)
+			QMessageBox.information(self, "Экспорт", f"Выгружено записей: {count}")
+
+		def failed(err: str) -> None:
+			self.export_button.setEnabled(True)
+			QMessageBox.warning(self, "Экспорт", f"Ошибка: {err}")
+
+		self.main_window._run_task(lambda _task: history_io.export_history(storage, path, date(2000, 1, 1), date.today()), done, failed)
+
+	def _on_import_history(self) -> None:
+		path, _ = QFileDialog.getOpenFileName(self, "Импорт истории", self.base_dir, self._history_filters())
+		if path:
+			self.import_history_file(path)
+
+	def import_history_file(self, path: str, fmt: Optional[str] = None, replace: bool = False) -> None:
+		"""Импорт в фоне: все дни, кроме сегодняшнего, пишет задача, сегодняшний сливается в AppState."""
+		storage = self.main_window.storage
+		state = self.main_window.state
+		hold_day = state.day
+		held: Dict[str, List[Dict[str, Any]]] = {}
+		self.import_button.setEnabled(False)
+
+		def done(result: Any) -> None:
+			self.import_button.setEnabled(True)
+			days, count = result
+			if held.get("sessions") or held.get("transactions"):
+				empty: Dict[str, Any] = {"sessions": [], "transactions": []}
+				if state.day == hold_day:
+					# Сегодняшний файл пишет только AppState — продажи, добавленные во время импорта, сохранятся
+					state.replace_day(history_io.merge_day(empty if replace else state.day_data(), held))
+				else:
+					# Полночь прошла во время импорта: день уже закрыт, дописываем его файл
+					storage.flush()
+					storage.save_day(hold_day, history_io.merge_day(empty if replace else storage.load_day(hold_day), held))
+					state.reload()
+				days = sorted(set(days) | {hold_day})
+			else:
+				# Графики и сводки перечитываются из обновлённых файлов
+				state.reload()
+			self._update_data_size()
+			QMessageBox.information(self, "Импорт", f"Загружено записей: {count}, дней: {len(days)}")
+
+		def failed(err: str) -> None:
+			self.import_button.setEnabled(True)
+			QMessageBox.warning(self, "Импорт", f"Ошибка: {err}")
+
+		self.main_window._run_task(
+			lambda _task: history_io.import_history(storage, path, fmt, replace=replace, hold_day=hold_day, held=held), done, failed)
+
+	def _update_data_size(self, rescan: bool = False) -> None:
+		usage = self.main_window.storage.usage(rescan)
+		text = self._format_bytes(usage.total)
+		if usage.journals:
+			text += f" (журнал правок {self._format_bytes(usage.journals)})"
+		self.data_size_label.setText(text)
+		months = sorted(usage.by_month.items(), reverse=True)
+		self.month_size_label.setText("  •  ".join(f"{m}: {self._format_bytes(b)}" for m, b in months[:3]) or "-")
+		self.month_size_label.setToolTip("\n".join(f"{m}: {self._format_bytes(b)}" for m, b in months))
+		suggest = usage.compaction_suggested
+		self.compact_label.setText("Журнал правок разросся — его можно вписать в файлы дней" if suggest else "")
+		self.compact_label.setVisible(suggest)
+		self.compact_button.setVisible(suggest)
+
+	def _on_compact_journal(self) -> None:
+		storage = self.main_window.storage
+		self.compact_button.setEnabled(False)
+
+		def done(_result: Any) -> None:
+			self.compact_button.setEnabled(True)
+			self._update_data_size()
+
+		def failed(err: str) -> None:
+			self.compact_button.setEnabled(True)
+			QMessageBox.warning(self, "Сжатие журнала", f"Ошибка: {err}")
+
+		self.main_window._run_task(lambda _task: storage.compact_journals(), done, failed)
 
 	def _on_tab_toggle(self, key: str, checked: bool) -> None:
 		vis = dict(self.settings.get('tabs_visibility', {}))
@@ -2409,6 +3346,466 @@ class SettingsTab(QWidget):
 		return f"{num:.1f} ПБ"
 
 
+# ------------------------
+# Загрузка обновлений
+# ------------------------
+DOWNLOAD_CHUNK = 256 * 1024
+
+
+SEGMENT_MIN_SIZE = 1024 * 1024
+
+
+def _retry_pause(failures: int, *stop_events: Optional[threading.Event]) -> None:
+	"""Экспоненциальная пауза перед повтором; отмена прерывает её сразу (RuntimeError)."""
+	deadline = time.monotonic() + min(8.0, 0.5 * (2 ** (failures - 1)))
+	while True:
+		if any(ev is not None and ev.is_set() for ev in stop_events):
+			raise RuntimeError("Загрузка отменена")
+		left = deadline - time.monotonic()
+		if left <= 0:
+			return
+		time.sleep(min(0.1, left))
+
+
+def _probe_ranges(url: str, timeout: int = 15, cancel: Optional[threading.Event] = None) -> Tuple[str, Optional[int]]:
+	"""Возвращает (итоговый URL после редиректов, размер) если сервер отдаёт Range, иначе размер None."""
+	if cancel is not None and cancel.is_set():
+		raise RuntimeError("Загрузка отменена")
+	req = _urlrequest.Request(url, headers={'Range': 'bytes=0-0', 'User-Agent': 'Mozilla/5.0'})
+	with _urlrequest.urlopen(req, timeout=timeout) as resp:
+		final_url = resp.geturl()
+		m = re.match(r'bytes\s+0-0/(\d+)', resp.headers.get('Content-Range') or '')
+		if cancel is not None and cancel.is_set():
+			raise RuntimeError("Загрузка отменена")
+		if resp.status == 206 and m:
+			return final_url, int(m.group(1))
+	return final_url, None
+
+
+def _read_segment_state(meta_path: str, key: str, size: int) -> Optional[List[List[int]]]:
+	"""Сегменты [start, end, pos] прошлой загрузки того же файла или None."""
+	try:
+		with open(meta_path, "r", encoding="utf-8") as f:
+			meta = json.load(f)
+		if meta.get("key") != key or int(meta.get("size", -1)) != size:
+			return None
+		segments = [[int(a), int(b), int(p)] for a, b, p in meta["segments"]]
+		if segments and all(a <= p <= b + 1 for a, b, p in segments):
+			return segments
+	except Exception:
+		pass
+	return None
+
+
+def download_file_segmented(
+	url: str,
+	dst_path: str,
+	expected_sha256: Optional[str] = None,
+	progress: Optional[Callable[[int, Optional[int], float, Optional[float]], None]] = None,
+	cancel: Optional[threading.Event] = None,
+	connections: int = 4,
+	retries: int = 5,
+	timeout: int = 30,
+) -> str:
+	"""Скачивает файл несколькими соединениями по диапазонам байт и возвращает SHA-256.
+
+	Файл заранее выделяется целиком, сегменты качаются пулом потоков и пишутся
+	каждый по своему смещению; оборванный сегмент докачивается с места обрыва с
+	экспоненциальной паузой. Докачанные позиции сегментов хранятся рядом
+	(dst_path + '.seg.json'), поэтому прерванная загрузка продолжается и после
+	перезапуска. Если сервер не поддерживает Range, файл мал или уже есть .part
+	обычной загрузки, используется download_file.
+	"""
+	if os.path.exists(dst_path + ".part"):
+		# Начатую потоковую загрузку продолжаем ею же, а не качаем заново
+		return download_file(url, dst_path, expected_sha256, progress, cancel, retries, timeout)
+	try:
+		final_url, size = _probe_ranges(url, cancel=cancel)
+	except (OSError, _httpclient.HTTPException):
+		final_url, size = url, None
+	if size is None or size < 2 * SEGMENT_MIN_SIZE or connections <= 1:
+		return download_file(url, dst_path, expected_sha256, progress, cancel, retries, timeout)
+
+	# Отдельное имя: .part у download_file — непрерывный префикс, а здесь файл с дырами
+	seg_path = dst_path + ".seg"
+	meta_path = seg_path + ".json"
+	# Ссылка на релиз обычно редиректит на подписанный URL, который меняется, — ключ по исходному
+	key = (expected_sha256 or "").strip().lower() or url
+	segments = None
+	if os.path.exists(seg_path) and os.path.getsize(seg_path) == size:
+		segments = _read_segment_state(meta_path, key, size)
+	if segments is None:
+		with open(seg_path, "wb") as f:
+			f.truncate(size)
+		seg_size = max(SEGMENT_MIN_SIZE, -(-size // (connections * 4)))
+		segments = [[start, min(size, start + seg_size) - 1, start] for start in range(0, size, seg_size)]
+	lock = threading.Lock()
+	state = {"done": sum(pos - start for start, _end, pos in segments), "last": 0.0, "saved": time.monotonic()}
+	started = time.monotonic()
+	resumed_bytes = state["done"]
+	abort = threading.Event()  # сбой одного сегмента останавливает остальные
+
+	def stopped() -> bool:
+		return abort.is_set() or (cancel is not None and cancel.is_set())
+
+	def save_state() -> None:
+		# Вызывается под lock
+		try:
+			tmp = meta_path + ".tmp"
+			with open(tmp, "w", encoding="utf-8") as f:
+				json.dump({"key": key, "size": size, "segments": segments}, f)
+			os.replace(tmp, meta_path)
+		except Exception:
+			pass
+		state["saved"] = time.monotonic()
+
+	def advance(segment: List[int], pos: int, n: int) -> None:
+		with lock:
+			segment[2] = pos
+			state["done"] += n
+			now = time.monotonic()
+			if now - state["saved"] >= 1.0:
+				save_state()
+			if progress is None or now - state["last"] < 0.2:
+				return
+			state["last"] = now
+			done = state["done"]
+		speed = (done - resumed_bytes) / max(1e-6, now - started)
+		progress(done, size, speed, (size - done) / speed if speed > 0 else None)
+
+	def fetch(segment: List[int]) -> None:
+		start, end, pos = segment
+		failures = 0
+		with open(seg_path, "r+b") as out:
+			while pos <= end:
+				if stopped():
+					raise RuntimeError("Загрузка отменена")
+				attempt_pos = pos
+				req = _urlrequest.Request(final_url, headers={'Range': f'bytes={pos}-{end}', 'User-Agent': 'Mozilla/5.0'})
+				try:
+					with _urlrequest.urlopen(req, timeout=timeout) as resp:
+						if resp.status != 206:
+							raise RuntimeError("Сервер перестал отдавать диапазоны")
+						out.seek(pos)
+						while pos <= end:
+							if stopped():
+								raise RuntimeError("Загрузка отменена")
+							chunk = resp.read(min(DOWNLOAD_CHUNK, end - pos + 1))
+							if not chunk:
+								break
+							out.write(chunk)
+							# Позиция попадает в .seg.json только после записи данных на диск
+							out.flush()
+							pos += len(chunk)
+							advance(segment, pos, len(chunk))
+					if pos <= end:
+						raise ConnectionError("Сегмент оборван")
+				except RuntimeError:
+					raise
+				except Exception as e:
+					# Как в download_file: лимит — на обрывы подряд без прогресса
+					failures = 1 if pos > attempt_pos else failures + 1
+					if failures > retries:
+						raise RuntimeError(f"Не удалось скачать сегмент {start}-{end}: {e}")
+					_retry_pause(failures, cancel, abort)
+
+	try:
+		with ThreadPoolExecutor(max_workers=connections) as pool:
+			futures = [pool.submit(fetch, seg) for seg in segments if seg[2] <= seg[1]]
+			for fut in as_completed(futures):
+				try:
+					fut.result()
+				except Exception:
+					abort.set()
+					raise
+	finally:
+		with lock:
+			save_state()
+	hasher = hashlib.sha256()
+	with open(seg_path, "rb") as f:
+		for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK * 4), b""):
+			hasher.update(chunk)
+	digest = hasher.hexdigest()
+	if expected_sha256 and digest != expected_sha256.strip().lower():
+		# Испорченные данные докачкой не исправить — в следующий раз с нуля
+		for path in (seg_path, meta_path):
+			try:
+				os.remove(path)
+			except Exception:
+				pass
+		raise RuntimeError('Контрольная сумма SHA-256 не совпала')
+	if progress is not None:
+		progress(size, size, (size - resumed_bytes) / max(1e-6, time.monotonic() - started), 0.0)
+	os.replace(seg_path, dst_path)
+	try:
+		os.remove(meta_path)
+	except Exception:
+		pass
+	return digest
+
+
+# Не чаще одного сетевого запроса манифеста за этот интервал (ручная проверка — условный GET)
+MANIFEST_MIN_INTERVAL = 600
+
+
+class ManifestClient:
+	"""Загружает манифест обновлений с дисковым кэшем и условными запросами.
+
+	Последний манифест хранится на диске вместе с ETag/Last-Modified. Повторный
+	запрос в пределах min_interval не идёт в сеть, иначе отправляется
+	If-None-Match/If-Modified-Since и ответ 304 берётся из кэша. Соединение с
+	хостом держится открытым и переиспользуется между проверками.
+	"""
+
+	def __init__(self, url: str, cache_path: str, min_interval: int = MANIFEST_MIN_INTERVAL, timeout: int = 20) -> None:
+		self.url = url
+		self.cache_path = cache_path
+		self.min_interval = min_interval
+		self.timeout = timeout
+		self._lock = threading.Lock()
+		self._conn: Optional[_httpclient.HTTPConnection] = None
+		self._conn_key: Optional[Tuple[str, str, Optional[int]]] = None
+		self._cache: Dict[str, Any] = {}
+		try:
+			with open(self.cache_path, "r", encoding="utf-8") as f:
+				self._cache = json.load(f)
+		except Exception:
+			self._cache = {}
+		if self._cache.get("url") != self.url:
+			self._cache = {}
+
+	def _save_cache(self) -> None:
+		try:
+			tmp = self.cache_path + ".tmp"
+			with open(tmp, "w", encoding="utf-8") as f:
+				json.dump(self._cache, f, ensure_ascii=False)
+			os.replace(tmp, self.cache_path)
+		except Exception:
+			pass
+
+	def _connection(self, parts: _urlparse.SplitResult) -> _httpclient.HTTPConnection:
+		key = (parts.scheme, parts.hostname or "", parts.port)
+		if self._conn is None or self._conn_key != key:
+			self.close()
+			cls = _httpclient.HTTPSConnection if parts.scheme == "https" else _httpclient.HTTPConnection
+			self._conn = cls(parts.hostname or "", parts.port, timeout=self.timeout)
+			self._conn_key = key
+		return self._conn
+
+	def _request(self, url: str, headers: Dict[str, str]) -> Tuple[int, Any, bytes]:
+		for _redirect in range(5):
+			parts = _urlparse.urlsplit(url)
+			path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+			for attempt in range(2):
+				conn = self._connection(parts)
+				try:
+					conn.request("GET", path, headers={"User-Agent": "Mozilla/5.0", **headers})
+					resp = conn.getresponse()
+					body = resp.read()
+					break
+				except (_httpclient.HTTPException, OSError):
+					# Сервер закрыл keep-alive соединение — переподключаемся один раз
+					self.close()
+					if attempt:
+						raise
+			if resp.status in (301, 302, 303, 307, 308) and resp.getheader("Location"):
+				url = _urlparse.urljoin(url, resp.getheader("Location"))
+				continue
+			return resp.status, resp, body
+		raise RuntimeError("Слишком много перенаправлений")
+
+	def fetch(self, force: bool = False) -> Optional[dict]:
+		"""Возвращает манифест; force=True пропускает интервал, но всё равно шлёт условный запрос."""
+		with self._lock:
+			cached = self._cache.get("manifest")
+			fresh = (time.time() - float(self._cache.get("fetched_at", 0))) < self.min_interval
+			if cached is not None and fresh and not force:
+				return cached
+			headers: Dict[str, str] = {}
+			if cached is not None and self._cache.get("etag"):
+				headers["If-None-Match"] = self._cache["etag"]
+			if cached is not None and self._cache.get("last_modified"):
+				headers["If-Modified-Since"] = self._cache["last_modified"]
+			try:
+				status, resp, body = self._request(self.url, headers)
+			except Exception as e:
+				MainWindow._log(f"manifest fetch error: {e}")
+				return cached
+			if status == 304 and cached is not None:
+				MainWindow._log("manifest not modified (304)")
+			elif status == 200:
+				try:
+					manifest = json.loads(body.decode("utf-8-sig", errors="ignore"))
+					if not isinstance(manifest, dict):
+						raise ValueError("ожидался объект JSON")
+				except ValueError as e:
+					# Битый ответ (обрезанный файл, страница ошибки прокси) не должен затирать кэш
+					MainWindow._log(f"manifest invalid JSON from {self.url}: {e}")
+					return cached
+				cached = manifest
+				self._cache = {
+					"url": self.url,
+					"manifest": cached,
+					"etag": resp.getheader("ETag"),
+					"last_modified": resp.getheader("Last-Modified"),
+				}
+				MainWindow._log(f"manifest loaded from {self.url}")
+			else:
+				MainWindow._log(f"manifest fetch HTTP {status}")
+				return cached
+			self._cache["fetched_at"] = time.time()
+			self._save_cache()
+			return cached
+
+	def close(self) -> None:
+		if self._conn is not None:
+			try:
+				self._conn.close()
+			except Exception:
+				pass
+		self._conn = None
+		self._conn_key = None
+
+
+# Задачи, не успевшие завершиться к закрытию окна: main() дожидается их перед выходом
+_detached_tasks: set = set()
+
+
+def wait_detached_tasks() -> None:
+	for task in list(_detached_tasks):
+		task.wait()
+	_detached_tasks.clear()
+
+
+class BackgroundTask(QThread):
+	"""Выполняет функцию в фоновом потоке и возвращает результат сигналом в GUI-поток."""
+	succeeded = Signal(object)
+	failed = Signal(str)
+	progress = Signal(int, object, float, object)  # done, total, bytes/s, eta
+
+	def __init__(self, fn: Callable[["BackgroundTask"], Any], parent: Optional[QWidget] = None) -> None:
+		super().__init__(parent)
+		self._fn = fn
+		self.cancel_event = threading.Event()
+
+	def run(self) -> None:
+		try:
+			self.succeeded.emit(self._fn(self))
+		except Exception as e:
+			self.failed.emit(str(e))
+
+	def report_progress(self, done: int, total: Optional[int], speed: float, eta: Optional[float]) -> None:
+		self.progress.emit(done, total, speed, eta)
+
+
+def _format_speed(bps: float) -> str:
+	return SettingsTab._format_bytes(int(bps)) + "/с"
+
+
+def download_file(
+	url: str,
+	dst_path: str,
+	expected_sha256: Optional[str] = None,
+	progress: Optional[Callable[[int, Optional[int], float, Optional[float]], None]] = None,
+	cancel: Optional[threading.Event] = None,
+	retries: int = 5,
+	timeout: int = 30,
+) -> str:
+	"""Потоково скачивает файл в dst_path и возвращает его SHA-256.
+
+	Данные пишутся кусками в dst_path + '.part'; после обрыва соединения загрузка
+	продолжается через HTTP Range с того же места (в том числе из недокачанного
+	.part прошлого запуска). Если expected_sha256 задан и не совпал, файл удаляется
+	и выбрасывается RuntimeError. progress(done, total, bytes/s, eta_sec) вызывается
+	не чаще 5 раз в секунду.
+	"""
+	part = dst_path + ".part"
+	hasher = hashlib.sha256()
+	offset = 0
+	if os.path.exists(part):
+		with open(part, "rb") as f:
+			for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK), b""):
+				hasher.update(chunk)
+				offset += len(chunk)
+	resumed_from_disk = offset > 0
+	total: Optional[int] = None
+	started = time.monotonic()
+	session_bytes = 0
+	last_report = 0.0
+	failures = 0
+	opener = _urlrequest.build_opener()
+	opener.addheaders = [('User-Agent', 'Mozilla/5.0')]
+	while True:
+		if cancel is not None and cancel.is_set():
+			raise RuntimeError("Загрузка отменена")
+		headers = {'Range': f'bytes={offset}-'} if offset > 0 else {}
+		attempt_offset = offset
+		try:
+			with opener.open(_urlrequest.Request(url, headers=headers), timeout=timeout) as resp:
+				if offset > 0 and resp.status != 206:
+					# Сервер не поддерживает Range — начинаем заново
+					offset = 0
+					hasher = hashlib.sha256()
+				ctype = (resp.headers.get('Content-Type') or '').lower()
+				if 'text/html' in ctype:
+					raise RuntimeError('Сервер вернул HTML вместо файла')
+				length = resp.headers.get('Content-Length')
+				if length is not None:
+					total = offset + int(length)
+				with open(part, "ab" if offset > 0 else "wb") as out:
+					while True:
+						if cancel is not None and cancel.is_set():
+							raise RuntimeError("Загрузка отменена")
+						chunk = resp.read(DOWNLOAD_CHUNK)
+						if not chunk:
+							break
+						out.write(chunk)
+						hasher.update(chunk)
+						offset += len(chunk)
+						session_bytes += len(chunk)
+						now = time.monotonic()
+						if progress is not None and now - last_report >= 0.2:
+							last_report = now
+							speed = session_bytes / max(1e-6, now - started)
+							eta = ((total - offset) / speed) if (total is not None and speed > 0) else None
+							progress(offset, total, speed, eta)
+			if total is not None and offset < total:
+				raise ConnectionError(f"Соединение оборвано на {offset} из {total} байт")
+			break
+		except RuntimeError:
+			raise
+		except _urlerror.HTTPError as e:
+			if e.code == 416 and offset > 0:
+				# .part уже докачан целиком
+				break
+			failures += 1
+			if failures > retries:
+				raise RuntimeError(f"Не удалось скачать файл: {e}")
+			_retry_pause(failures, cancel)
+		except Exception as e:
+			# Лимит — на обрывы подряд без прогресса: попытка, которая что-то скачала, обнуляет счёт
+			failures = 1 if offset > attempt_offset else failures + 1
+			if failures > retries:
+				raise RuntimeError(f"Не удалось скачать файл: {e}")
+			_retry_pause(failures, cancel)
+	if offset == 0:
+		raise RuntimeError('Пустой ответ при скачивании файла')
+	digest = hasher.hexdigest()
+	if expected_sha256 and digest.lower() != expected_sha256.strip().lower():
+		try:
+			os.remove(part)
+		except Exception:
+			pass
+		if resumed_from_disk:
+			# Остаток от другой загрузки — пробуем один раз с нуля
+			return download_file(url, dst_path, expected_sha256, progress, cancel, retries, timeout)
+		raise RuntimeError('Контрольная сумма SHA-256 не совпала')
+	if progress is not None:
+		progress(offset, total or offset, session_bytes / max(1e-6, time.monotonic() - started), 0.0)
+	os.replace(part, dst_path)
+	return digest
+
+
 class MainWindow(QMainWindow):
 	def __init__(self) -> None:
 		super().__init__()
@@ -2421,6 +3818,18 @@ class MainWindow(QMainWindow):
 
 		self.storage = DayStorage(base_dir=self._data_dir())
 		self.state = AppState(storage=self.storage)
+		self.forecaster = analytics.GoalForecaster(self.state, self._load_goals())
+		# Фоновые задачи обновления (держим ссылки до завершения потоков)
+		self._tasks: set = set()
+		self._download_task: Optional[BackgroundTask] = None
+		self._manifest_client: Optional[ManifestClient] = None
+		# _fetch_manifest зовётся из фоновых задач — клиент создаётся/заменяется под блокировкой
+		self._manifest_lock = threading.Lock()
+		# Смена дня в полночь: один таймер на сутки вместо проверок на каждом тике
+		self._midnight_timer = QTimer(self)
+		self._midnight_timer.setSingleShot(True)
+		self._midnight_timer.timeout.connect(self._on_midnight)
+		self._schedule_midnight()
 
 		# Проверку обновлений покажем позже, чтобы не задерживать запуск UI
 
@@ -2432,6 +3841,10 @@ class MainWindow(QMainWindow):
 		self.fish_tab = FishTab(self.state)
 		self.mushroom_tab = MushroomTab(self.state)
 		self.logger_tab = LoggerTab(self.state)
+		self._work_tabs = [self.trucker_tab, self.farm_tab, self.mine_tab, self.fish_tab, self.mushroom_tab, self.logger_tab]
+		for tab in self._work_tabs:
+			tab.live_rate_box.forecaster = self.forecaster
+			tab.live_rate_box.refresh()
 		# Вкладка Крафт (после Лесоруба)
 		base_dir = os.path.dirname(self.storage.data_dir)
 		self.craft_tab = CraftTab(base_dir)
@@ -2452,6 +3865,103 @@ class MainWindow(QMainWindow):
 
 		# Версию перенесли в заголовок окна — панель сверху не нужна
 		self.setCentralWidget(self.tabs)
+		# Быстрый ввод из любой вкладки
+		self._quick_dialog: Optional[QuickEntryDialog] = None
+		QShortcut(QKeySequence("Ctrl+K"), self, activated=self.open_quick_entry, context=Qt.ApplicationShortcut)
+		# Отмена/повтор записей дня; в полях ввода Ctrl+Z остаётся за самим полем
+		QShortcut(QKeySequence("Ctrl+Z"), self, activated=self.undo)
+		QShortcut(QKeySequence("Ctrl+Shift+Z"), self, activated=self.redo)
+		QShortcut(QKeySequence("Ctrl+Y"), self, activated=self.redo)
+
+	def undo(self) -> None:
+		label = self.state.undo()
+		self._show_hint(f"Отменено: {label}" if label else "Нечего отменять")
+
+	def redo(self) -> None:
+		label = self.state.redo()
+		self._show_hint(f"Повторено: {label}" if label else "Нечего повторять")
+
+	def _show_hint(self, text: str) -> None:
+		QToolTip.showText(self.mapToGlobal(self.rect().center()), text, self)
+
+	def quick_catalog(self) -> Dict[str, List[CatalogItem]]:
+		"""Каталоги вкладок для быстрого ввода (дальнобойщик — только суммы)."""
+		catalog: Dict[str, List[CatalogItem]] = {"trucker": []}
+		for tab in self._work_tabs:
+			if hasattr(tab, "catalog_items"):
+				catalog[tab.category] = tab.catalog_items()
+		return catalog
+
+	def open_quick_entry(self, text: str = "") -> None:
+		if self._quick_dialog is not None and self._quick_dialog.isVisible():
+			self._quick_dialog.raise_()
+			self._quick_dialog.activateWindow()
+		else:
+			current = getattr(self.tabs.currentWidget(), "category", None)
+			self._quick_dialog = QuickEntryDialog(self.state, self.quick_catalog(), current, self)
+			self._quick_dialog.show()
+		if text:
+			self._quick_dialog.input.setText(text)
+		self._quick_dialog.input.setFocus()
+
+	def handle_instance_args(self, argv: List[str], activate: bool = True) -> None:
+		"""Аргументы запуска (свои или повторного запуска, см. single_instance).
+
+		Команды: start КАТЕГОРИЯ, stop КАТЕГОРИЯ, add СУММА КАТЕГОРИЯ [заметка]
+		(сумма со знаком минус — расход), quick [строка быстрого ввода] — записывает строку
+		сразу (несколько записей через «;»), без строки открывает палитру,
+		import ФАЙЛ [--format F] [--replace] — от консольного импорта (history_io). Без команды
+		окно просто выводится вперёд.
+		"""
+		if activate:
+			if self.isMinimized():
+				self.showNormal()
+			self.show()
+			self.raise_()
+			self.activateWindow()
+		if not argv:
+			return
+		try:
+			command, args = argv[0].lower(), argv[1:]
+			if command in ("start", "stop") and args:
+				category = resolve_category(args[0])
+				if category is None:
+					raise ValueError(f"неизвестная категория: {args[0]}")
+				(self.state.start if command == "start" else self.state.stop)(category)
+			elif command == "quick":
+				if not args:
+					self.open_quick_entry()
+					return
+				self.state.add_many([e.to_entry() for e in parse_quick_entries(" ".join(args), self.quick_catalog())])
+			elif command == "add" and len(args) >= 2:
+				amount = parse_amount(args[0].lstrip("+-"))
+				category = resolve_category(args[1])
+				if amount is None or amount <= 0 or category is None:
+					raise ValueError(f"ожидается: add СУММА КАТЕГОРИЯ, получено: {' '.join(args)}")
+				note = " ".join(args[2:])
+				if args[0].startswith("-"):
+					self.state.add_expense(amount, note=note, category=category)
+				else:
+					self.state.add_income(amount, note=note, category=category)
+			elif command == "import" and args:
+				fmt = args[args.index("--format") + 1] if "--format" in args[:-1] else None
+				self.settings_tab.import_history_file(args[0], fmt, replace="--replace" in args)
+			else:
+				self._log(f"instance args ignored: {argv}")
+		except (ValueError, TypeError) as e:
+			QMessageBox.warning(self, "Команда", str(e))
+
+	def _load_goals(self) -> Dict[str, Dict[str, int]]:
+		try:
+			return dict(SettingsManager(os.path.dirname(self.storage.data_dir)).load().get('goals', {}))
+		except Exception:
+			return {}
+
+	def set_goals(self, goals: Dict[str, Dict[str, int]]) -> None:
+		self.forecaster.set_goals(goals)
+		for tab in self._work_tabs:
+			tab.live_rate_box.refresh()
+
 	def _load_tabs_visibility(self) -> Dict[str, bool]:
 		try:
 			mgr = SettingsManager(os.path.dirname(self.storage.data_dir))
@@ -2491,6 +4001,22 @@ class MainWindow(QMainWindow):
 			pass
 
 	def closeEvent(self, event) -> None:  # type: ignore[override]
+		# Отменим фоновые загрузки, чтобы потоки не пережили окно
+		for task in list(self._tasks):
+			task.cancel_event.set()
+		for task in list(self._tasks):
+			if task.wait(3000):
+				continue
+			# Запрос манифеста не прерывается до таймаута сокета: отцепляем поток от окна,
+			# чтобы Qt не уничтожил работающий QThread, и дожидаемся его в main()
+			for signal in (task.succeeded, task.failed, task.progress):
+				try:
+					signal.disconnect()
+				except (RuntimeError, TypeError):
+					pass
+			task.setParent(None)
+			self._tasks.discard(task)
+			_detached_tasks.add(task)
 		# Остановим все активные сессии
 		self.state.stop("trucker")
 		self.state.stop("farm")
@@ -2498,8 +4024,21 @@ class MainWindow(QMainWindow):
 		self.state.stop("fish")
 		self.state.stop("mushroom")
 		self.state.stop("logger")
+		self.storage.flush(5.0)
 		event.accept()
 
+	def _schedule_midnight(self) -> None:
+		now = datetime.now()
+		midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+		# Небольшой запас, чтобы date.today() уже вернул новый день
+		self._midnight_timer.start(int((midnight - now).total_seconds() * 1000) + 500)
+
+	def _on_midnight(self) -> None:
+		try:
+			self.state.roll_day()
+		finally:
+			self._schedule_midnight()
+
 	@staticmethod
 	def _app_dir() -> str:
 		if getattr(sys, 'frozen', False):
@@ -2512,44 +4051,44 @@ class MainWindow(QMainWindow):
 
 	@staticmethod
 	def _data_dir() -> str:
-		base = os.getenv('APPDATA') or os.path.expanduser('~')
-		# Новое имя приложения: GrimmStats. Переносим данные из старой папки при первом запуске
-		new_path = os.path.join(base, 'GrimmStats')
-		old_path = os.path.join(base, 'MajesticRPStats')
-		try:
-			if os.path.isdir(old_path) and not os.path.isdir(new_path):
-				os.rename(old_path, new_path)
-		except Exception:
-			pass
-		path = new_path
-		os.makedirs(path, exist_ok=True)
-		return path
+		return default_base_dir()
 
 	@staticmethod
 	def _log(msg: str) -> None:
-		try:
-			log_path = os.path.join(MainWindow._data_dir(), 'updater.log')
-			with open(log_path, 'a', encoding='utf-8') as f:
-				f.write(f"{datetime.now().isoformat(timespec='seconds')} {msg}\n")
-		except Exception:
-			pass
+		# Зовётся и из фоновых задач — запись под общей блокировкой append_log
+		append_log(MainWindow._data_dir(), msg, 'updater.log')
+
+	def _run_task(self, fn: Callable[["BackgroundTask"], Any], on_success: Callable[[Any], None], on_error: Optional[Callable[[str], None]] = None) -> "BackgroundTask":
+		"""Запускает fn в фоновом потоке; колбэки выполняются в GUI-потоке."""
+		task = BackgroundTask(fn, self)
+		self._tasks.add(task)
+		task.succeeded.connect(on_success)
+		if on_error is not None:
+			task.failed.connect(on_error)
+		task.finished.connect(lambda: self._tasks.discard(task))
+		task.finished.connect(task.deleteLater)
+		task.start()
+		return task
 
 	def _check_version_on_startup(self) -> None:
 		"""Фоновая проверка версии после старта: только показывает предложение обновиться."""
-		try:
-			local_version = self._get_local_version()
-			self._log(f"local_version={local_version}")
-			manifest = self._fetch_manifest()
+		local_version = self._get_local_version()
+		self._log(f"local_version={local_version}")
+
+		def done(manifest: Optional[dict]) -> None:
 			if not manifest:
 				self._log("manifest: None (fetch failed)")
 				return
-			remote_version = int(manifest.get('version', 0))
-			self._log(f"remote_version={remote_version}")
-			if remote_version > local_version:
-				# Не обновляем автоматически. Покажем диалог для пользователя.
-				self.show_update_prompt()
-		except Exception as e:
-			self._log(f"_check_version_on_startup error: {e}")
+			try:
+				remote_version = int(manifest.get('version', 0))
+				self._log(f"remote_version={remote_version}")
+				if remote_version > local_version:
+					# Не обновляем автоматически. Покажем диалог для пользователя.
+					self.show_update_prompt(manifest)
+			except Exception as e:
+				self._log(f"_check_version_on_startup error: {e}")
+
+		self._run_task(lambda _t: self._fetch_manifest(), done)
 
 	def _get_local_version(self) -> int:
 		"""Получает локальную версию из version.json рядом с exe."""
@@ -2591,51 +4130,48 @@ class MainWindow(QMainWindow):
 		except Exception:
 			return "v0.0.0"
 
-	def _fetch_manifest(self) -> Optional[dict]:
+	def _fetch_manifest(self, force: bool = False) -> Optional[dict]:
 		"""Возвращает содержимое манифеста (dict) только из GitHub (Raw/настроенный URL)."""
 		try:
-			mgr = SettingsManager(os.path.dirname(self.storage.data_dir))
-			st = mgr.load()
+			base_dir = os.path.dirname(self.storage.data_dir)
+			# URL перечитываем каждый раз: его могли поменять в settings.json
+			st = SettingsManager(base_dir).load()
 			u = (st.get('updates', {}) or {}).get('github_manifest_url') or DEFAULT_MANIFEST_URL
-			cj = _cookiejar.CookieJar()
-			opener = _urlrequest.build_opener(_urlrequest.HTTPCookieProcessor(cj))
-			opener.addheaders = [('User-Agent','Mozilla/5.0')]
-			with opener.open(u, timeout=20) as resp:
-				content = resp.read().decode('utf-8-sig', errors='ignore')
-				obj = json.loads(content)
-				self._log(f"manifest loaded from {u}")
-				return obj
+			with self._manifest_lock:
+				if self._manifest_client is None or self._manifest_client.url != u:
+					# Старый клиент не закрываем: им может пользоваться другая задача
+					self._manifest_client = ManifestClient(u, os.path.join(base_dir, 'manifest_cache.json'))
+				client = self._manifest_client
+			return client.fetch(force=force)
 		except Exception as e:
 			self._log(f"_fetch_manifest error: {e}")
 			return None
 
-	def _auto_update_to_version(self, new_version: int, exe_file_id: Optional[str]) -> None:
-		"""Автоматически скачивает и запускает updater для новой версии (только GitHub)."""
-		try:
+	def _auto_update_to_version(self, new_version: int, exe_file_id: Optional[str], manifest: Optional[dict] = None) -> None:
+		"""Скачивает новую версию в фоне и запускает updater (только GitHub)."""
+		def start(m: Optional[dict]) -> None:
 			# URL для скачивания берём только из GitHub манифеста (exe_url)
-			app_dir = self._app_dir()
-			manifest = self._fetch_manifest() or {}
-			exe_url = manifest.get('exe_url')
+			exe_url = (m or {}).get('exe_url')
 			if not exe_url:
-				raise RuntimeError('В манифесте отсутствует exe_url')
-			# Создаем временный файл для скачивания
-			temp_dir = tempfile.gettempdir()
-			temp_exe = os.path.join(temp_dir, f"GrimmStats_v{new_version}.exe")
-			# Скачиваем надёжным методом с обработкой confirm
-			self._http_download(exe_url, temp_exe)
-		# Запускаем updater, текущее приложение корректно закроется
-			self._log(f"downloaded new exe to {temp_exe}")
-			self._run_updater_or_launch(temp_exe)
-		except Exception as e:
-			self._log(f"_auto_update_to_version error: {e}")
+				self._log("_auto_update_to_version error: В манифесте отсутствует exe_url")
+				QMessageBox.warning(self, "Обновление", "В манифесте отсутствует exe_url")
+				return
+			# Имя стабильно — недокачанный .part или .seg продолжится при следующей попытке
+			temp_exe = os.path.join(tempfile.gettempdir(), f"GrimmStats_v{new_version}.exe")
+			self._start_download(exe_url, temp_exe, m)
+
+		if manifest is not None:
+			start(manifest)
+		else:
+			self._run_task(lambda _t: self._fetch_manifest(), start)
 
-	def show_update_prompt(self) -> None:
+	def show_update_prompt(self, manifest: Optional[dict] = None) -> None:
 		"""Показывает диалог с текущей и последней версиями. Предлагает обновление только если последняя не предрелизная и новее локальной."""
-		def run():
+		def run(manifest: Optional[dict]) -> None:
 			try:
 				local_num = self._get_local_version()
 				local_sem = self._get_local_semver()
-				manifest = self._fetch_manifest() or {}
+				manifest = manifest or {}
 				remote_num = int(manifest.get('version', 0))
 				remote_sem = str(manifest.get('semver') or '')
 				is_prerelease = ('-' in remote_sem)
@@ -2651,10 +4187,13 @@ class MainWindow(QMainWindow):
 				# Предложить релизное обновление
 				ret = QMessageBox.question(self, "Обновление", f"У вас: v{local_sem}\nДоступна новая релизная: v{remote_sem}.\nСкачать и установить?")
 				if ret == QMessageBox.StandardButton.Yes:
-					self._auto_update_to_version(remote_num, None)
+					self._auto_update_to_version(remote_num, None, manifest)
 			except Exception as e:
 				QMessageBox.warning(self, "Обновление", f"Ошибка проверки: {e}")
-		QTimer.singleShot(0, run)
+		if manifest is not None:
+			QTimer.singleShot(0, lambda: run(manifest))
+		else:
+			self._run_task(lambda _t: self._fetch_manifest(force=True), run)
 
 	def _download_file(self, url: str, dest_path: str) -> bool:
 		"""Скачивает файл по URL в указанное место."""
@@ -2670,71 +4209,116 @@ class MainWindow(QMainWindow):
 		return False
 	def _check_updates_background(self) -> None:
 		"""Проверяет новую версию по GitHub и предлагает скачать и установить."""
-		try:
-			manifest = self._fetch_manifest()
+		def done(manifest: Optional[dict]) -> None:
+			dl_url = (manifest or {}).get('exe_url')
+			if dl_url:
+				self._ask_download_update('GrimmStats.exe', dl_url, manifest)
+		self._run_task(lambda _t: self._fetch_manifest(), done)
+
+	def _check_manifest_and_ask(self, error_title: str) -> None:
+		def done(manifest: Optional[dict]) -> None:
 			if not manifest:
+				QMessageBox.information(self, "Обновление", "Не удалось получить манифест с GitHub")
 				return
-			file_name = 'GrimmStats.exe'
 			dl_url = manifest.get('exe_url')
 			if not dl_url:
+				QMessageBox.information(self, "Обновление", "В манифесте отсутствует exe_url")
 				return
-			self._ask_download_update(file_name, dl_url)
-		except Exception:
-			pass
+			self._ask_download_update('GrimmStats.exe', dl_url, manifest)
+		self._run_task(lambda _t: self._fetch_manifest(force=True), done, lambda err: QMessageBox.warning(self, "Обновление", f"{error_title}: {err}"))
 
 	def force_check_updates(self, file_id_override: str = "") -> None:
-		def run():
-			try:
-				manifest = self._fetch_manifest()
-				if not manifest:
-					QMessageBox.information(self, "Обновление", "Не удалось получить манифест с GitHub")
-					return
-				file_name = 'GrimmStats.exe'
-				dl_url = manifest.get('exe_url')
-				if not dl_url:
-					QMessageBox.information(self, "Обновление", "В манифесте отсутствует exe_url")
-					return
-				self._ask_download_update(file_name, dl_url)
-			except Exception as e:
-				QMessageBox.warning(self, "Обновление", f"Ошибка проверки: {e}")
-		QTimer.singleShot(0, run)
+		self._check_manifest_and_ask("Ошибка проверки")
 
 	def update_from_local_or_drive(self, file_id_override: str = "") -> None:
 		"""Обновить до последней версии: загрузка только с GitHub по манифесту."""
-		def run():
-			try:
-				manifest = self._fetch_manifest()
-				if not manifest:
-					QMessageBox.information(self, "Обновление", "Не удалось получить манифест с GitHub")
-					return
-				file_name = 'GrimmStats.exe'
-				dl_url = manifest.get('exe_url')
-				if not dl_url:
-					QMessageBox.information(self, "Обновление", "В манифесте отсутствует exe_url")
-					return
-				self._ask_download_update(file_name, dl_url)
-			except Exception as e:
-				QMessageBox.warning(self, "Обновление", f"Ошибка обновления: {e}")
-		QTimer.singleShot(0, run)
+		self._check_manifest_and_ask("Ошибка обновления")
 
 	# Удалены все функции и ссылки, связанные с Google Drive
 
-	def _ask_download_update(self, file_name: str, dl_url: str) -> None:
-		def _prompt():
-			ret = QMessageBox.question(self, "Обновление", f"Найдена новая версия: {file_name}.\nСкачать сейчас?")
-			if ret != QMessageBox.StandardButton.Yes:
-				return
-			# Скачиваем во временный файл
+	def _ask_download_update(self, file_name: str, dl_url: str, manifest: Optional[dict] = None) -> None:
+		ret = QMessageBox.question(self, "Обновление", f"Найдена новая версия: {file_name}.\nСкачать сейчас?")
+		if ret != QMessageBox.StandardButton.Yes:
+			return
+		try:
+			tmp_fd, tmp_path = tempfile.mkstemp(prefix="GrimmStats_", suffix=".exe")
+			os.close(tmp_fd)
+		except Exception as e:
+			QMessageBox.warning(self, "Обновление", f"Не удалось скачать обновление: {e}")
+			return
+		self._start_download(dl_url, tmp_path, manifest)
+
+	def _try_delta_update(self, manifest: Optional[dict], dst_path: str, sha: Optional[str], task: "BackgroundTask") -> bool:
+		"""Собирает новый exe из текущего и дельта-патча. False — нужен полный exe."""
+		if not manifest or not getattr(sys, 'frozen', False):
+			return False
+		delta_url = manifest.get('delta_url')
+		try:
+			delta_from = int(manifest.get('delta_from', 0))
+		except Exception:
+			delta_from = 0
+		if not delta_url or not sha or delta_from != self._get_local_version():
+			return False
+		patch_path = dst_path + '.delta'
+		try:
+			download_file(delta_url, patch_path, progress=task.report_progress, cancel=task.cancel_event, retries=2)
+			delta_patch.apply_patch(sys.executable, patch_path, dst_path, sha)
+			self._log(f"delta update applied from {delta_url} ({os.path.getsize(patch_path)} bytes)")
+			return True
+		except Exception as e:
+			if task.cancel_event.is_set():
+				raise
+			self._log(f"delta update failed, falling back to full download: {e}")
+			return False
+		finally:
 			try:
-				tmp_fd, tmp_path = tempfile.mkstemp(prefix="GrimmStats_", suffix=".exe")
-				os.close(tmp_fd)
-				self._http_download(dl_url, tmp_path)
-				# Запускаем updater.exe для подмены
-				self._run_updater_or_launch(tmp_path)
-			except Exception as e:
-				QMessageBox.warning(self, "Обновление", f"Не удалось скачать обновление: {e}")
-		# Показать в GUI-потоке
-		QTimer.singleShot(0, _prompt)
+				os.remove(patch_path)
+			except Exception:
+				pass
+
+	def _start_download(self, url: str, dst_path: str, manifest: Optional[dict]) -> None:
+		"""Скачивает обновление в фоне с окном прогресса и отменой; по готовности запускает updater."""
+		if self._download_task is not None and self._download_task.isRunning():
+			return
+		dialog = QProgressDialog("Скачивание обновления…", "Отмена", 0, 0, self)
+		dialog.setWindowTitle("Обновление")
+		dialog.setMinimumDuration(0)
+		dialog.setAutoClose(False)
+		dialog.setAutoReset(False)
+
+		def work(task: "BackgroundTask") -> str:
+			sha = self._manifest_sha256(manifest)
+			if self._try_delta_update(manifest, dst_path, sha, task):
+				return dst_path
+			digest = download_file_segmented(url, dst_path, expected_sha256=sha, progress=task.report_progress, cancel=task.cancel_event)
+			self._log(f"downloaded {url} sha256={digest} verified={bool(sha)}")
+			return dst_path
+
+		def on_progress(done: int, total: Optional[int], speed: float, eta: Optional[float]) -> None:
+			if total:
+				dialog.setMaximum(100)
+				dialog.setValue(int(done * 100 / total))
+			eta_text = format_seconds(int(eta)) if eta is not None else "—"
+			dialog.setLabelText(f"Скачано {SettingsTab._format_bytes(done)} — {_format_speed(speed)}, осталось {eta_text}")
+
+		def on_done(path: str) -> None:
+			self._download_task = None
+			dialog.close()
+			self._log(f"downloaded new exe to {path}")
+			self._run_updater_or_launch(path)
+
+		def on_error(err: str) -> None:
+			self._download_task = None
+			dialog.close()
+			self._log(f"download error: {err}")
+			if not task.cancel_event.is_set():
+				QMessageBox.warning(self, "Обновление", f"Не удалось скачать обновление: {err}")
+
+		task = self._run_task(work, on_done, on_error)
+		task.progress.connect(on_progress)
+		dialog.canceled.connect(task.cancel_event.set)
+		self._download_task = task
+		dialog.show()
 
 	@staticmethod
 	def _http_get(url: str) -> str:
@@ -2770,55 +4354,14 @@ class MainWindow(QMainWindow):
 		except Exception:
 			return None
 
-	@staticmethod
-	def _http_download(url: str, dst_path: str) -> None:
-		# Надёжное скачивание общедоступного файла Google Drive
-		cj = _cookiejar.CookieJar()
-		opener = _urlrequest.build_opener(_urlrequest.HTTPCookieProcessor(cj))
-		opener.addheaders = [('User-Agent','Mozilla/5.0')]
-		data = b''
-		
-		# 0) Если это ссылка с id=, сначала пробуем стабильный зеркальный хост (обычно без confirm)
-		qid = ''
-		if 'id=' in url:
-			try:
-				from urllib.parse import urlparse, parse_qs
-				qid = parse_qs(urlparse(url).query).get('id', [''])[0]
-				if qid:
-					alt = f'https://drive.usercontent.google.com/download?id={qid}&export=download'
-					try:
-						resp = opener.open(alt, timeout=30)
-						data = resp.read()
-					except Exception:
-						data = b''
-			except Exception:
-				qid = ''
-
-		# 1) Обычная ссылка uc?export=download — при необходимости обрабатываем confirm
-		if not data:
-			try:
-				resp = opener.open(url, timeout=30)
-				data = resp.read()
-				# Если HTML — ищем ссылку confirm
-				if data.startswith(b'<!') or b'<html' in data[:500].lower():
-					text = data.decode('utf-8', errors='ignore')
-					m = re.search(r'href=\"(/uc\?export=download[^\"]*confirm=[^\"]+)', text)
-					if m:
-						confirm_url = 'https://drive.google.com' + m.group(1).replace('&amp;', '&')
-						resp = opener.open(confirm_url, timeout=30)
-						data = resp.read()
-					elif qid:
-						# Фолбэк: на зеркальный хост, если confirm не найден
-						alt = f'https://drive.usercontent.google.com/download?id={qid}&export=download'
-						resp = opener.open(alt, timeout=30)
-						data = resp.read()
-			except Exception:
-				data = b''
-
-		if not data:
-			raise RuntimeError('Пустой ответ при скачивании файла')
-		with open(dst_path, 'wb') as f:
-			f.write(data)
+	def _manifest_sha256(self, manifest: Optional[dict]) -> Optional[str]:
+		"""SHA-256 сборки из манифеста: поле sha256 или файл по sha256_url (публикуется CI)."""
+		if not manifest:
+			return None
+		digest = str(manifest.get('sha256') or '').strip()
+		if not digest and manifest.get('sha256_url'):
+			digest = (self._http_get(str(manifest['sha256_url'])).split() or [''])[0]
+		return digest.lower() if re.fullmatch(r'[0-9a-fA-F]{64}', digest or '') else None
 
 	def _updater_path(self) -> Optional[str]:
 		"""Возвращает путь к updater.exe. Если он встроен в onefile, копирует его в папку данных.
@@ -2829,8 +4372,6 @@ class MainWindow(QMainWindow):
 		"""
 		try:
 			persist = os.path.join(MainWindow._data_dir(), 'updater.exe')
-			if os.path.exists(persist):
-				return persist
 			# Источник 1: _MEIPASS (встроенный бинарь)
 			source_candidates: list[str] = []
 			if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
@@ -2841,11 +4382,16 @@ class MainWindow(QMainWindow):
 			for src in source_candidates:
 				try:
 					if os.path.exists(src):
-						# Копируем во внешнюю постоянную папку
-						shutil.copy2(src, persist)
+						# Копируем во внешнюю постоянную папку; устаревшую копию обновляем,
+						# чтобы новые аргументы (--parent-pid) понимал сам обновлятор
+						import filecmp
+						if not os.path.exists(persist) or not filecmp.cmp(src, persist, shallow=False):
+							shutil.copy2(src, persist)
 						return persist
 				except Exception:
 					pass
+			if os.path.exists(persist):
+				return persist
 			return None
 		except Exception:
 			return None
@@ -2866,14 +4412,25 @@ class MainWindow(QMainWindow):
 				import subprocess, os
 				DETACHED_PROCESS = 0x00000008
 				CREATE_NEW_PROCESS_GROUP = 0x00000200
+				# Обновлятор ждёт завершения по дескрипторам процессов. В onefile-сборке exe
+				# держит ещё и родительский загрузчик PyInstaller — его тоже ждём
+				pids = [os.getpid()]
+				meipass = getattr(sys, '_MEIPASS', None)
+				if meipass and os.path.normcase(os.path.dirname(app_path)) != os.path.normcase(meipass):
+					pids.append(os.getppid())
+				pid_args: list[str] = []
+				for pid in pids:
+					pid_args += ['--parent-pid', str(pid)]
 				subprocess.Popen(
-					[updater, '--app-path', app_path, '--source-exe', source_exe],
+					[updater, '--app-path', app_path, '--source-exe', source_exe, *pid_args],
 					close_fds=True,
 					creationflags=(DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP)
 				)
 				app = QApplication.instance()
 				if app:
 					app.quit()
+				# os._exit не ждёт потоков: дописываем фоновые сохранения дней и индекс
+				self.storage.flush(5.0)
 				os._exit(0)
 				return
 			except Exception:
@@ -2885,6 +4442,7 @@ class MainWindow(QMainWindow):
 			app = QApplication.instance()
 			if app:
 				app.quit()
+			self.storage.flush(5.0)
 			os._exit(0)
 		except Exception:
 			QMessageBox.information(self, "Обновление", f"Скачано: {source_exe}\nЗапусти новый файл вручную.")
@@ -2893,7 +4451,17 @@ def main() -> None:
 	app = QApplication(sys.argv)
 	window = MainWindow()
 	window.show()
-	sys.exit(app.exec())
+	import single_instance
+	instance = single_instance.current()
+	if instance is not None:
+		instance.message_received.connect(window.handle_instance_args)
+		instance.listen()
+		app.aboutToQuit.connect(instance.release)
+	if len(sys.argv) > 1:
+		window.handle_instance_args(sys.argv[1:], activate=False)
+	code = app.exec()
+	wait_detached_tasks()
+	sys.exit(code)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+"""
+Быстрый ввод GrimmStats: разбор строк вида «fish лещ 300г 0.7», «+17000 trucker»,
+«mine железная 50x120» по каталогам вкладок с нечётким поиском предмета (difflib). Без Qt.
+"""
+import difflib
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from stats_core import CATEGORY_LABELS
+
+# Дополнительные слова для категорий (кроме ключа и названия вкладки)
+CATEGORY_ALIASES = {
+	"trucker": ("дальнобой", "фура"),
+	"farm": (),
+	"mine": ("шахта", "руда"),
+	"fish": ("рыба",),
+	"mushroom": ("грибы",),
+	"logger": ("лес",),
+}
+# Ниже этого сходства (difflib.SequenceMatcher) предмет считается не найденным
+MATCH_CUTOFF = 0.6
+
+_MONEY = re.compile(r"^([+-])(\d+)$")
+_LEVEL = re.compile(r"^(?:l|lvl|ур\.?)(\d+)$")
+_QTY_PRICE = re.compile(r"^(\d+)(г|гр|шт)?[x×х*](\d+(?:[.,]\d+)?)$")
+_QTY_UNIT = re.compile(r"^(\d+)(г|гр|шт)$")
+_NUMBER = re.compile(r"^\d+(?:[.,]\d+)?$")
+
+
+@dataclass
+class CatalogItem:
+	"""Предмет каталога вкладки."""
+	category: str
+	name: str
+	unit: str  # "шт" | "г"
+	level: Optional[int] = None
+	expense: bool = False  # покупка (семена), а не продажа
+	note: str = "{name}"  # шаблон заметки: {name}, {qty}, {level}
+
+
+@dataclass
+class QuickEntry:
+	"""Разобранная строка быстрого ввода."""
+	category: str
+	amount: int  # со знаком: минус — расход
+	note: str = ""
+	item: Optional[str] = None
+	qty: Optional[float] = None
+	unit: Optional[str] = None
+	unit_price: Optional[float] = None
+	level: Optional[int] = None
+
+	def to_entry(self) -> Dict[str, Any]:
+		"""Запись для AppState.add_many."""
+		entry: Dict[str, Any] = {"amount": self.amount, "category": self.category, "note": self.note}
+		for key in ("item", "qty", "unit", "unit_price", "level"):
+			value = getattr(self, key)
+			if value is not None:
+				entry[key] = value
+		return entry
+
+	def describe(self) -> str:
+		title = CATEGORY_LABELS.get(self.category, self.category)
+		money = f"{self.amount:+,}".replace(",", " ")
+		if self.item is None:
+			return f"{title}: {money}" + (f" — {self.note}" if self.note else "")
+		level = f" (ур. {self.level})" if self.level is not None else ""
+		price = f"{self.unit_price:g}"
+		return f"{title}: {self.item}{level} {self.qty:g} {self.unit} × {price} = {money}"
+
+
+def _norm(text: str) -> str:
+	return text.strip().lower().replace("ё", "е")
+
+
+def resolve_category(text: str) -> Optional[str]:
+	"""Категория по ключу (fish), названию вкладки (Рыбалка) или псевдониму, без учёта регистра."""
+	text = _norm(text)
+	for key, title in CATEGORY_LABELS.items():
+		if text in (key, _norm(title)) or text in CATEGORY_ALIASES.get(key, ()):
+			return key
+	return None
+
+
+def match_item(query: str, items: List[CatalogItem], level: Optional[int] = None) -> Optional[CatalogItem]:
+	"""Лучший предмет каталога для query: точное совпадение, затем вхождение, затем difflib.
+
+	Если предмет есть на нескольких уровнях, берётся уровень level или самый младший.
+	"""
+	query = _norm(query)
+	if not query or not items:
+		return None
+	names = {_norm(it.name) for it in items}
+	if query in names:
+		best = query
+	else:
+		contains = [n for n in names if query in n or n in query]
+		if contains:
+			best = max(contains, key=lambda n: difflib.SequenceMatcher(None, query, n).ratio())
+		else:
+			close = difflib.get_close_matches(query, list(names), n=1, cutoff=MATCH_CUTOFF)
+			if not close:
+				return None
+			best = close[0]
+	candidates = [it for it in items if _norm(it.name) == best]
+	if level is not None:
+		for it in candidates:
+			if it.level == level:
+				return it
+	return min(candidates, key=lambda it: it.level or 0)
+
+
+def _number(text: str) -> float:
+	return float(text.replace(",", "."))
+
+
+def parse_quick_entry(text: str, catalog: Dict[str, List[CatalogItem]], default_category: Optional[str] = None) -> QuickEntry:
+	"""Разбирает одну строку быстрого ввода; ValueError с понятным сообщением, если не удалось.
+
+	Категорию можно указать любым словом (обычно первым или последним); без неё берётся
+	default_category, а если её нет — категория найденного предмета.
+	"""
+	tokens = text.split()
+	if not tokens:
+		raise ValueError("пустая строка")
+	category = None
+	if len(tokens) > 1:
+		for pos, token in enumerate(tokens):
+			found = resolve_category(token)
+			if found is not None:
+				category = found
+				tokens.pop(pos)
+				break
+	money: Optional[int] = None
+	level: Optional[int] = None
+	qty: Optional[float] = None
+	price: Optional[float] = None
+	unit: Optional[str] = None
+	numbers: List[float] = []
+	words: List[str] = []
+	for token in tokens:
+		low = _norm(token)
+		m = _MONEY.match(low)
+		if m:
+			money = int(m.group(2)) * (-1 if m.group(1) == "-" else 1)
+			continue
+		m = _LEVEL.match(low)
+		if m:
+			level = int(m.group(1))
+			continue
+		m = _QTY_PRICE.match(low)
+		if m:
+			qty, price = float(m.group(1)), _number(m.group(3))
+			unit = m.group(2)
+			continue
+		m = _QTY_UNIT.match(low)
+		if m:
+			qty, unit = float(m.group(1)), m.group(2)
+			continue
+		if _NUMBER.match(low):
+			numbers.append(_number(low))
+			continue
+		words.append(token)
+
+	category = category or default_category
+	query = " ".join(words)
+	item = None
+	if words and money is None:
+		pool = catalog.get(category, []) if category else [it for items in catalog.values() for it in items]
+		item = match_item(query, pool, level)
+	if item is None:
+		# Денежная запись: «+17000 trucker», «-3000 trucker бензин», «17000»
+		if money is None and len(numbers) == 1 and qty is None:
+			money = int(numbers[0])
+		if money is None:
+			if words and (category is None or catalog.get(category)):
+				raise ValueError(f"не найден предмет «{query}»")
+			raise ValueError("не указана сумма")
+		if category is None:
+			raise ValueError("не указана категория")
+		return QuickEntry(category=category, amount=money, note=query)
+
+	if qty is None and numbers:
+		qty = numbers.pop(0)
+	if price is None and numbers:
+		price = numbers.pop(0)
+	if qty is None or qty <= 0:
+		raise ValueError(f"не указано количество для «{item.name}»")
+	if price is None:
+		raise ValueError(f"не указана цена для «{item.name}»")
+	if item.unit == "г" or unit in ("г", "гр"):
+		qty = float(int(qty))
+	amount = int(qty * price)
+	if item.expense:
+		amount = -amount
+	qty_text = f"{qty:g}"
+	return QuickEntry(
+		category=item.category,
+		amount=amount,
+		note=item.note.format(name=item.name, qty=qty_text, level=item.level),
+		item=item.name,
+		qty=int(qty) if qty == int(qty) else qty,
+		unit=item.unit,
+		unit_price=price if price != int(price) or item.unit == "г" else int(price),
+		level=item.level,
+	)
+
+
+def parse_quick_entries(text: str, catalog: Dict[str, List[CatalogItem]], default_category: Optional[str] = None) -> List[QuickEntry]:
+	"""Несколько записей в одной строке через «;»."""
+	return [parse_quick_entry(part, catalog, default_category) for part in text.split(";") if part.strip()]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Отчёты GrimmStats из командной строки — без Qt и matplotlib.
+Использование:
+  python report.py [--from 2025-01-01] [--to 2025-01-31] [--days 7]
+                   [--category fish ...] [--by-category]
+                   [--granularity day|week|month|total] [--format table|json|csv]
+                   [--data-dir PATH]
+  GrimmStats.exe report ...   (те же аргументы)
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from stats_core import DayStorage, aggregate_days, attach_parent_console, default_base_dir, format_seconds
+
+COLUMNS = ["period", "category", "seconds", "income", "expense", "net", "per_hour", "sessions", "transactions"]
+
+
+def _parse_date(text: str) -> date:
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается дата ГГГГ-ММ-ДД: {text}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="report", description="Сводка статистики GrimmStats")
+    parser.add_argument('--from', dest='date_from', type=_parse_date, help='Первый день (включительно)')
+    parser.add_argument('--to', dest='date_to', type=_parse_date, help='Последний день (включительно), по умолчанию сегодня')
+    parser.add_argument('--days', type=int, default=7, help='Число дней до --to, если --from не задан (по умолчанию 7)')
+    parser.add_argument('--category', action='append', default=[], help='Фильтр категории (можно несколько)')
+    parser.add_argument('--by-category', action='store_true', help='Отдельная строка на каждую категорию')
+    parser.add_argument('--granularity', choices=['day', 'week', 'month', 'total'], default='day')
+    parser.add_argument('--format', choices=['table', 'json', 'csv'], default='table')
+    parser.add_argument('--data-dir', help='Папка данных (по умолчанию %%APPDATA%%\\GrimmStats)')
+    return parser
+
+
+def build_report(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    date_to = args.date_to or date.today()
+    date_from = args.date_from or (date_to - timedelta(days=max(1, args.days) - 1))
+    if date_from > date_to:
+        raise ValueError("--from позже --to")
+    base_dir = args.data_dir or default_base_dir()
+    storage = DayStorage(base_dir, maintenance=False)
+    return aggregate_days(storage.iter_days(date_from, date_to), args.granularity, args.category or None, args.by_category)
+
+
+def write_report(rows: List[Dict[str, Any]], fmt: str, out) -> None:
+    if fmt == 'json':
+        json.dump(rows, out, ensure_ascii=False, indent=2)
+        out.write("\n")
+    elif fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        if not rows:
+            out.write("Нет данных\n")
+            return
+        header = ["Период", "Категория", "Время", "Доход", "Расход", "Чистая", "В час"]
+        table = [[r["period"], r["category"], format_seconds(r["seconds"]), str(r["income"]),
+                  str(r["expense"]), str(r["net"]), f"{r['per_hour']:.2f}"] for r in rows]
+        widths = [max(len(h), *(len(row[i]) for row in table)) for i, h in enumerate(header)]
+        for row in [header] + table:
+            out.write("  ".join(cell.ljust(widths[i]) if i < 2 else cell.rjust(widths[i]) for i, cell in enumerate(row)) + "\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    attach_parent_console()
+    if sys.stdout is None:
+        return 1
+    args = build_parser().parse_args(argv)
+    if args.data_dir and not os.path.isdir(os.path.join(args.data_dir, "data")):
+        print(f"Нет папки данных: {os.path.join(args.data_dir, 'data')}", file=sys.stderr)
+        return 1
+    try:
+        rows = build_report(args)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    write_report(rows, args.format, sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Один экземпляр GrimmStats на папку данных.
+
+Основной экземпляр держит блокировку instance.lock (QLockFile) и слушает локальный сокет
+(QLocalServer). Повторный запуск передаёт свои аргументы по сокету и сразу завершается —
+до импорта matplotlib и создания окна, поэтому второй AppState не появляется.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import List, Optional
+
+from PySide6.QtCore import QLockFile, QObject, Signal
+from PySide6.QtNetwork import QLocalServer, QLocalSocket
+
+# Сколько ждать, пока основной экземпляр начнёт слушать сокет (первый запуск onefile-сборки долгий)
+FORWARD_TIMEOUT = 30.0
+
+# Результат acquire()
+ACQUIRED = "acquired"  # этот процесс основной
+FORWARDED = "forwarded"  # аргументы приняты работающим экземпляром
+TIMEOUT = "timeout"  # блокировка занята, а экземпляр не ответил за timeout
+
+
+def server_name(base_dir: str) -> str:
+	"""Имя сокета: своё для каждой папки данных."""
+	digest = hashlib.sha1(os.path.normcase(os.path.abspath(base_dir)).encode("utf-8")).hexdigest()[:16]
+	return f"GrimmStats-{digest}"
+
+
+class SingleInstance(QObject):
+	"""Блокировка экземпляра и приём аргументов от повторных запусков."""
+
+	message_received = Signal(list)  # argv повторного запуска
+
+	def __init__(self, base_dir: str) -> None:
+		super().__init__()
+		self.name = server_name(base_dir)
+		self.lock = QLockFile(os.path.join(base_dir, "instance.lock"))
+		# Блокировка не устаревает по времени; упавший процесс распознаётся по PID
+		self.lock.setStaleLockTime(0)
+		self.server: Optional[QLocalServer] = None
+		self._buffers: dict = {}
+
+	def acquire(self, argv: List[str], timeout: float = FORWARD_TIMEOUT) -> str:
+		"""ACQUIRED — этот процесс основной. FORWARDED — аргументы переданы работающему
+		экземпляру, TIMEOUT — он не отвечает; в обоих случаях процесс должен завершиться."""
+		deadline = time.monotonic() + timeout
+		while True:
+			if self.lock.tryLock(0):
+				return ACQUIRED
+			if self._forward(argv):
+				return FORWARDED
+			if time.monotonic() >= deadline:
+				return TIMEOUT
+			# Основной экземпляр ещё запускается или уже закрывается — повторим
+			time.sleep(0.1)
+
+	def _forward(self, argv: List[str]) -> bool:
+		socket = QLocalSocket()
+		socket.connectToServer(self.name)
+		if not socket.waitForConnected(500):
+			return False
+		try:
+			payload = json.dumps({"argv": list(argv), "cwd": os.getcwd()}, ensure_ascii=False) + "\n"
+			socket.write(payload.encode("utf-8"))
+			socket.flush()
+			socket.waitForBytesWritten(1000)
+			# Ждём подтверждения, чтобы команда не потерялась, если окно как раз закрывается
+			ack = b""
+			while not ack.endswith(b"\n") and socket.waitForReadyRead(2000):
+				ack += bytes(socket.readAll())
+			return ack.strip() == b"ok"
+		finally:
+			socket.disconnectFromServer()
+
+	def listen(self) -> bool:
+		"""Начинает принимать аргументы повторных запусков (вызывать после создания окна)."""
+		if self.server is not None:
+			return True
+		server = QLocalServer(self)
+		# Сокет, оставшийся от упавшего процесса, мешает listen() на Unix
+		QLocalServer.removeServer(self.name)
+		if not server.listen(self.name):
+			return False
+		server.newConnection.connect(self._on_new_connection)
+		self.server = server
+		return True
+
+	def _on_new_connection(self) -> None:
+		while self.server is not None and self.server.hasPendingConnections():
+			socket = self.server.nextPendingConnection()
+			self._buffers[socket] = b""
+			socket.readyRead.connect(lambda s=socket: self._on_ready_read(s))
+			socket.disconnected.connect(lambda s=socket: self._drop(s))
+			if socket.bytesAvailable():
+				self._on_ready_read(socket)
+
+	def _on_ready_read(self, socket: QLocalSocket) -> None:
+		data = self._buffers.get(socket, b"") + bytes(socket.readAll())
+		self._buffers[socket] = data
+		if b"\n" not in data:
+			return
+		line = data.split(b"\n", 1)[0]
+		try:
+			argv = [str(a) for a in json.loads(line.decode("utf-8")).get("argv", [])]
+		except (ValueError, AttributeError):
+			socket.write(b"error\n")
+			socket.flush()
+			return
+		socket.write(b"ok\n")
+		socket.flush()
+		self.message_received.emit(argv)
+
+	def _drop(self, socket: QLocalSocket) -> None:
+		self._buffers.pop(socket, None)
+		socket.deleteLater()
+
+	def release(self) -> None:
+		if self.server is not None:
+			self.server.close()
+			self.server = None
+		if self.lock.isLocked():
+			self.lock.unlock()
+
+
+_current: Optional[SingleInstance] = None
+
+
+def guard(base_dir: str, argv: List[str]) -> str:
+	"""Захватывает экземпляр для base_dir; всё, кроме ACQUIRED, — процесс должен завершиться."""
+	global _current
+	instance = SingleInstance(base_dir)
+	status = instance.acquire(argv)
+	if status == ACQUIRED:
+		_current = instance
+	return status
+
+
+def current() -> Optional[SingleInstance]:
+	"""Экземпляр, захваченный guard() в этом процессе (None, если guard не вызывался)."""
+	return _current
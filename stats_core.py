@@ -0,0 +1,1691 @@
+"""
+Ядро данных GrimmStats без Qt и matplotlib: сессии, транзакции, хранилище по дням,
+состояние текущего дня и агрегаты. Используется GUI (main.py) и CLI (report.py).
+"""
+import json
+import math
+import os
+import re
+import sys
+import shutil
+import threading
+import traceback
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, field, replace
+from datetime import datetime, date, timedelta
+from typing import Callable, Iterable, Iterator, List, Optional, Dict, Any, Tuple
+
+
+def default_base_dir() -> str:
+	"""Папка данных приложения: %APPDATA%\\GrimmStats (с переносом старой MajesticRPStats)."""
+	base = os.getenv('APPDATA') or os.path.expanduser('~')
+	# Новое имя приложения: GrimmStats. Переносим данные из старой папки при первом запуске
+	new_path = os.path.join(base, 'GrimmStats')
+	old_path = os.path.join(base, 'MajesticRPStats')
+	try:
+		if os.path.isdir(old_path) and not os.path.isdir(new_path):
+			os.rename(old_path, new_path)
+	except Exception:
+		pass
+	path = new_path
+	os.makedirs(path, exist_ok=True)
+	return path
+
+
+_log_lock = threading.Lock()
+
+
+def append_log(base_dir: str, msg: str, name: str = "app.log") -> None:
+	"""Дописывает строку с временем в base_dir/name; можно звать из любого потока."""
+	try:
+		line = f"{datetime.now().isoformat(timespec='seconds')} {msg}\n"
+		with _log_lock:
+			with open(os.path.join(base_dir, name), 'a', encoding='utf-8') as f:
+				f.write(line)
+	except Exception:
+		pass
+
+
+# ------------------------
+# Данные и хранилище
+# ------------------------
+@dataclass
+class WorkSession:
+	start_iso: str
+	end_iso: Optional[str] = None
+	category: str = "trucker"  # trucker | farm | mine | fish | mushroom | logger
+
+	def duration_seconds(self) -> int:
+		start_dt = datetime.fromisoformat(self.start_iso)
+		end_dt = datetime.fromisoformat(self.end_iso) if self.end_iso else datetime.now()
+		return int((end_dt - start_dt).total_seconds())
+
+
+# Необязательные поля строки продажи/покупки в Transaction
+SALE_FIELDS = ("item", "qty", "unit", "unit_price", "level")
+
+
+@dataclass
+class Transaction:
+	amount: int
+	type: str  # income | expense
+	note: str
+	time_iso: str
+	category: str = "trucker"
+	item: Optional[str] = None  # руда, вид рыбы, гриб, порода дерева…
+	qty: Optional[float] = None  # количество в единицах unit
+	unit: Optional[str] = None  # "шт" | "г"
+	unit_price: Optional[float] = None
+	level: Optional[int] = None  # уровень (рыбалка)
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""Словарь для JSON; пустые поля продажи не сохраняются."""
+		data = asdict(self)
+		for key in SALE_FIELDS:
+			if data[key] is None:
+				del data[key]
+		return data
+
+	@classmethod
+	def from_dict(cls, t: Dict[str, Any]) -> "Transaction":
+		return cls(
+			amount=t["amount"],
+			type=t["type"],
+			note=t.get("note", ""),
+			time_iso=t.get("time_iso") or t.get("time") or t["time_iso"],
+			category=t.get("category", "trucker"),
+			**{key: t.get(key) for key in SALE_FIELDS},
+		)
+
+
+# Заметки старых версий, из которых можно восстановить строку продажи
+_LEGACY_NOTES = (
+	(re.compile(r"^Рыба (?P<item>.+) \(L(?P<level>\d+)\) (?P<qty>\d+) г$"), "г"),
+	(re.compile(r"^(?:Гриб|Лес) (?P<item>.+) x(?P<qty>\d+)$"), "шт"),
+	(re.compile(r"^Продажа \((?P<item>.+)\)$"), "шт"),
+)
+
+
+def sale_fields(t: Dict[str, Any]) -> Dict[str, Any]:
+	"""Поля продажи из сырой транзакции; для записей без них — разбор заметки старого формата."""
+	if t.get("item"):
+		return {key: t.get(key) for key in SALE_FIELDS}
+	note = t.get("note") or ""
+	for pattern, unit in _LEGACY_NOTES:
+		m = pattern.match(note)
+		if not m:
+			continue
+		groups = m.groupdict()
+		qty = int(groups["qty"]) if groups.get("qty") else None
+		amount = abs(int(t.get("amount", 0)))
+		return {
+			"item": groups["item"],
+			"qty": qty,
+			"unit": unit,
+			"unit_price": (amount / qty) if qty else None,
+			"level": int(groups["level"]) if groups.get("level") else None,
+		}
+	return {}
+
+
+@dataclass
+class StateEvent:
+	"""Изменение AppState, рассылаемое подписчикам."""
+	kind: str  # session_started | session_stopped | transaction_added | day_rolled | reset | reloaded | edited
+	category: Optional[str] = None
+	delta: int = 0  # изменение чистой прибыли (после batch — сумма подряд идущих добавлений категории)
+	session: Optional[WorkSession] = None
+	transaction: Optional[Transaction] = None
+
+
+# События, после которых данные дня нужно перечитать целиком
+RELOAD_EVENTS = ("reset", "day_rolled", "reloaded", "edited")
+# Расширение файла журнала правок дня
+JOURNAL_EXT = ".journal"
+# Размер журналов правок, после которого настройки предлагают их сжать
+JOURNAL_COMPACT_BYTES = 64 * 1024
+# Файл дня YYYY-MM-DD.json (в отличие от index.json и прочих)
+_DAY_FILE = re.compile(r"^\d{4}-\d{2}-\d{2}\.json$")
+# Глубина отмены (шагов текущего дня)
+UNDO_LIMIT = 200
+# Поля транзакции, которые можно править
+EDITABLE_TX_FIELDS = ("amount", "type", "note", "category") + SALE_FIELDS
+
+# Названия категорий в интерфейсе
+CATEGORY_LABELS = {
+	"trucker": "Дальнобойщик",
+	"farm": "Ферма",
+	"mine": "Карьер",
+	"fish": "Рыбалка",
+	"mushroom": "Грибник",
+	"logger": "Лесоруб",
+}
+
+
+@dataclass
+class StorageUsage:
+	"""Место, занятое папкой данных, в байтах."""
+	days: int = 0  # файлы дней
+	journals: int = 0  # журналы правок
+	other: int = 0  # индекс и прочие .json
+	by_month: Dict[str, int] = field(default_factory=dict)  # "YYYY-MM" -> дни и журналы месяца
+
+	@property
+	def total(self) -> int:
+		return self.days + self.journals + self.other
+
+	@property
+	def compaction_suggested(self) -> bool:
+		return self.journals >= JOURNAL_COMPACT_BYTES
+
+
+def apply_journal_ops(sessions: list, transactions: list, ops: List[Dict[str, Any]], as_objects: bool = False) -> None:
+	"""Применяет операции журнала правок к спискам дня.
+
+	Операции по индексу: tins/tdel/tset — транзакции, sins/sdel/sset — сессии
+	({"op", "i", "v"}). Списки — словари из JSON или, при as_objects, объекты AppState.
+	"""
+	for op in ops:
+		kind = op["op"]
+		items = transactions if kind[0] == "t" else sessions
+		index = int(op["i"])
+		action = kind[1:]
+		if action == "ins":
+			value: Any = dict(op["v"])
+			if as_objects:
+				value = Transaction.from_dict(value) if kind[0] == "t" else WorkSession(**value)
+			items.insert(index, value)
+		elif action == "del":
+			del items[index]
+		elif action == "set":
+			item = items[index]
+			for key, value in op["v"].items():
+				if isinstance(item, dict):
+					item[key] = value
+				else:
+					setattr(item, key, value)
+		else:
+			raise ValueError(f"Неизвестная операция журнала: {kind}")
+
+
+class DayStorage:
+	"""Управляет сохранением/загрузкой статистики за день в JSON.
+
+	Правки и отмены пишутся не перезаписью дня, а строками в журнал YYYY-MM-DD.journal;
+	файл дня хранит номер последней учтённой строки (journal_seq), остальное
+	доигрывается при load_day.
+	"""
+
+	def __init__(self, base_dir: str, maintenance: bool = True) -> None:
+		"""maintenance=False — только чтение: без миграции и авто-очистки (для CLI)."""
+		self.base_dir = base_dir
+		self.data_dir = os.path.join(self.base_dir, "data")
+		os.makedirs(self.data_dir, exist_ok=True)
+		# Дни, запись которых идёт в фоне: читатели получают их из памяти
+		self._pending: Dict[date, Dict[str, Any]] = {}
+		self._pending_lock = threading.Lock()
+		self._writers: List[threading.Thread] = []
+		# Последний номер строки журнала по дням (лениво читается с диска)
+		self._journal_seq: Dict[date, int] = {}
+		self._journal_lock = threading.RLock()
+		# Учёт места: размер каждого файла и суммы по видам/месяцам (см. usage())
+		self._sizes: Optional[Dict[str, int]] = None
+		self._usage = StorageUsage()
+		self._usage_lock = threading.Lock()
+		self.index = DayIndex(self)
+		if not maintenance:
+			return
+		# Миграция данных из старой папки рядом с exe/скриптом
+		try:
+			if not os.listdir(self.data_dir):
+				legacy_root = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+				legacy_dir = os.path.join(legacy_root, "data")
+				if os.path.isdir(legacy_dir):
+					for name in os.listdir(legacy_dir):
+						if name.endswith(".json"):
+							shutil.copy2(os.path.join(legacy_dir, name), os.path.join(self.data_dir, name))
+		except Exception:
+			pass
+		# Авто-очистка старых файлов (>30 дней)
+		try:
+			for name in os.listdir(self.data_dir):
+				if name.endswith(('.json', JOURNAL_EXT)):
+					path = os.path.join(self.data_dir, name)
+					mtime = os.path.getmtime(path)
+					age_days = (datetime.now() - datetime.fromtimestamp(mtime)).days
+					if age_days > 30:
+						os.remove(path)
+		except Exception:
+			pass
+
+	def _file_for(self, day: date) -> str:
+		name = day.strftime("%Y-%m-%d") + ".json"
+		return os.path.join(self.data_dir, name)
+
+	def _count(self, name: str, size: int) -> None:
+		# Вызывается под _usage_lock
+		delta = size - self._sizes.get(name, 0)
+		if size:
+			self._sizes[name] = size
+		else:
+			self._sizes.pop(name, None)
+		if not delta:
+			return
+		month = None
+		if name.endswith(JOURNAL_EXT):
+			self._usage.journals += delta
+			month = name[:7]
+		elif _DAY_FILE.match(name):
+			self._usage.days += delta
+			month = name[:7]
+		else:
+			self._usage.other += delta
+		if month is not None:
+			value = self._usage.by_month.get(month, 0) + delta
+			if value > 0:
+				self._usage.by_month[month] = value
+			else:
+				self._usage.by_month.pop(month, None)
+
+	def _account(self, path: str, size: int) -> None:
+		"""Новый размер файла папки данных (0 — удалён)."""
+		with self._usage_lock:
+			# До первого usage() счётчиков нет — файл учтётся при обходе папки
+			if self._sizes is not None:
+				self._count(os.path.basename(path), size)
+
+	def usage(self, rescan: bool = False) -> StorageUsage:
+		"""Занятое место без обхода папки: счётчики ведутся при записи и удалении файлов.
+
+		Папка читается один раз (или при rescan — если файлы меняли снаружи).
+		"""
+		with self._usage_lock:
+			if self._sizes is None or rescan:
+				self._sizes = {}
+				self._usage = StorageUsage()
+				try:
+					with os.scandir(self.data_dir) as entries:
+						for entry in entries:
+							if entry.name.endswith((".json", JOURNAL_EXT)) and entry.is_file():
+								self._count(entry.name, entry.stat().st_size)
+				except OSError:
+					pass
+			return replace(self._usage, by_month=dict(self._usage.by_month))
+
+	def _journal_for(self, day: date) -> str:
+		return os.path.join(self.data_dir, day.strftime("%Y-%m-%d") + JOURNAL_EXT)
+
+	def _read_journal(self, day: date) -> List[Dict[str, Any]]:
+		steps: List[Dict[str, Any]] = []
+		try:
+			with open(self._journal_for(day), "r", encoding="utf-8") as f:
+				for line in f:
+					try:
+						steps.append(json.loads(line))
+					except ValueError:
+						# Недописанная последняя строка (сбой во время записи) — пропускаем
+						continue
+		except OSError:
+			pass
+		return steps
+
+	def _replay(self, day: date, data: Dict[str, Any]) -> Dict[str, Any]:
+		done = int(data.get("journal_seq", 0))
+		steps = [st for st in self._read_journal(day) if st.get("s", 0) > done]
+		if not steps:
+			return data
+		data = dict(data, sessions=[dict(x) for x in data.get("sessions", [])], transactions=[dict(x) for x in data.get("transactions", [])])
+		for step in steps:
+			apply_journal_ops(data["sessions"], data["transactions"], step.get("ops", []))
+			data["journal_seq"] = step["s"]
+		return data
+
+	def load_day(self, day: date) -> Dict[str, Any]:
+		with self._pending_lock:
+			pending = self._pending.get(day)
+		if pending is not None:
+			return self._replay(day, pending)
+		file_path = self._file_for(day)
+		if not os.path.exists(file_path):
+			return self._replay(day, {"sessions": [], "transactions": []})
+		with open(file_path, "r", encoding="utf-8") as f:
+			return self._replay(day, json.load(f))
+
+	def _last_journal_seq(self, day: date) -> int:
+		# Вызывается под _journal_lock
+		seq = self._journal_seq.get(day)
+		if seq is None:
+			seq = max((int(st.get("s", 0)) for st in self._read_journal(day)), default=0)
+			# После сжатия журнала номер продолжается с учтённого в файле дня
+			try:
+				with open(self._file_for(day), "r", encoding="utf-8") as f:
+					seq = max(seq, int(json.load(f).get("journal_seq", 0)))
+			except (OSError, ValueError, AttributeError):
+				pass
+			self._journal_seq[day] = seq
+		return seq
+
+	def append_journal(self, day: date, ops: List[Dict[str, Any]], data: Optional[Dict[str, Any]] = None) -> int:
+		"""Дописывает шаг правок в журнал дня (без перезаписи файла дня); data — день после шага, для индекса.
+
+		Без data запись индекса сбрасывается и пересчитается при следующем чтении.
+		"""
+		with self._journal_lock:
+			seq = self._last_journal_seq(day) + 1
+			line = json.dumps({"s": seq, "ops": ops}, ensure_ascii=False, separators=(",", ":"))
+			with open(self._journal_for(day), "a", encoding="utf-8") as f:
+				f.write(line + "\n")
+				size = f.tell()
+			self._journal_seq[day] = seq
+		self._account(self._journal_for(day), size)
+		if data is not None:
+			self.index.update(day, data)
+		else:
+			# Подпись журнала и так поменялась, но пока день ждёт записи, rollup отдал бы старую свёртку
+			self.index.remove(day)
+		return seq
+
+	def compact_journal(self, day: date) -> None:
+		"""Вписывает журнал в файл дня и удаляет журнал."""
+		self.flush()
+		# Под блокировкой: правка, дописанная между чтением и удалением журнала, потерялась бы
+		with self._journal_lock:
+			if not os.path.exists(self._journal_for(day)):
+				return
+			self.save_day(day, self.load_day(day))
+			try:
+				os.remove(self._journal_for(day))
+				self._account(self._journal_for(day), 0)
+			except OSError:
+				pass
+
+	def compact_journals(self) -> int:
+		"""Сжимает журналы всех дней; возвращает число дней."""
+		days = self.journal_days()
+		for day in days:
+			self.compact_journal(day)
+		return len(days)
+
+	def journal_days(self) -> List[date]:
+		days: List[date] = []
+		try:
+			for name in os.listdir(self.data_dir):
+				if name.endswith(JOURNAL_EXT):
+					try:
+						days.append(datetime.strptime(name[:-len(JOURNAL_EXT)], "%Y-%m-%d").date())
+					except ValueError:
+						continue
+		except OSError:
+			pass
+		return sorted(days)
+
+	def save_day(self, day: date, data: Dict[str, Any]) -> None:
+		# Запись целиком под блокировкой журнала: фоновое сжатие (прочитать день, записать,
+		# удалить журнал) иначе могло бы затереть файл, записанный автосохранением между его шагами
+		with self._journal_lock:
+			seq = self._last_journal_seq(day)
+			data.pop("journal_seq", None)
+			if seq:
+				# Всё, что есть в журнале на этот момент, уже входит в data
+				data["journal_seq"] = seq
+			file_path = self._file_for(day)
+			# Через временный файл: читатель из другого потока (экспорт, отчёт) не увидит файл недописанным
+			tmp = file_path + ".tmp"
+			with open(tmp, "w", encoding="utf-8") as f:
+				json.dump(data, f, ensure_ascii=False, indent=2)
+				size = f.tell()
+			os.replace(tmp, file_path)
+			self._account(file_path, size)
+			self.index.update(day, data)
+
+	def save_day_background(self, day: date, data: Dict[str, Any]) -> None:
+		"""Пишет файл дня в отдельном потоке; до окончания записи load_day отдаёт data."""
+		with self._pending_lock:
+			self._pending[day] = data
+
+		def write() -> None:
+			try:
+				self.save_day(day, data)
+			except Exception:
+				pass
+			finally:
+				with self._pending_lock:
+					if self._pending.get(day) is data:
+						del self._pending[day]
+
+		thread = threading.Thread(target=write, name=f"save-{day.isoformat()}", daemon=True)
+		self._writers = [t for t in self._writers if t.is_alive()] + [thread]
+		thread.start()
+
+	def flush(self, timeout: Optional[float] = None) -> None:
+		"""Дожидается фоновых записей и сохраняет индекс (перед выходом из приложения)."""
+		for thread in list(self._writers):
+			thread.join(timeout)
+		self.index.save()
+
+	def days_between(self, start: date, end: date) -> List[date]:
+		"""Дни из [start, end], для которых есть файл (или фоновая запись), по возрастанию."""
+		found: set = set()
+		try:
+			for name in os.listdir(self.data_dir):
+				if not name.endswith(".json"):
+					continue
+				try:
+					d = datetime.strptime(name[:-5], "%Y-%m-%d").date()
+				except ValueError:
+					continue
+				if start <= d <= end:
+					found.add(d)
+		except Exception:
+			pass
+		with self._pending_lock:
+			found.update(d for d in self._pending if start <= d <= end)
+		return sorted(found)
+
+	def iter_days(self, start: date, end: date, strict: bool = False) -> Iterator[Tuple[date, Dict[str, Any]]]:
+		"""Лениво отдаёт (день, данные) за период — в памяти держится один день.
+
+		Нечитаемый день пропускается; при strict (экспорт) — ValueError, чтобы выгрузка
+		не оказалась молча неполной.
+		"""
+		for d in self.days_between(start, end):
+			try:
+				data = self.load_day(d)
+			except Exception as e:
+				if strict:
+					raise ValueError(f"Не удалось прочитать день {d.isoformat()}: {e}") from e
+				continue
+			yield d, data
+
+	def load_last_days(self, days: int) -> Dict[date, Dict[str, Any]]:
+		result: Dict[date, Dict[str, Any]] = {}
+		for i in range(days - 1, -1, -1):
+			d = date.today() - timedelta(days=i)
+			result[d] = self.load_day(d)
+		return result
+
+	def delete_day(self, d: date) -> None:
+		self.flush()
+		for file_path in (self._file_for(d), self._journal_for(d)):
+			try:
+				if os.path.exists(file_path):
+					os.remove(file_path)
+					self._account(file_path, 0)
+			except Exception:
+				pass
+		with self._journal_lock:
+			self._journal_seq.pop(d, None)
+		self.index.remove(d)
+
+	def delete_last_days(self, n: int) -> None:
+		for i in range(n):
+			d = date.today() - timedelta(days=i)
+			self.delete_day(d)
+
+	def delete_all(self) -> None:
+		self.flush()
+		try:
+			for name in os.listdir(self.data_dir):
+				if name.endswith((".json", JOURNAL_EXT)):
+					os.remove(os.path.join(self.data_dir, name))
+					self._account(name, 0)
+		except Exception:
+			pass
+		with self._journal_lock:
+			self._journal_seq.clear()
+		self.index.clear()
+
+
+def _hour_buckets(raw: Dict[str, Any], day: date, now: datetime) -> Dict[str, Dict[str, List[int]]]:
+	"""Почасовые корзины дня: {категория: {"час": [чистая прибыль, отработанные секунды]}}."""
+	buckets: Dict[str, Dict[str, List[int]]] = {}
+	day_start = datetime.combine(day, datetime.min.time())
+	day_end = day_start + timedelta(days=1)
+
+	def bucket(category: str, hour: int) -> List[int]:
+		return buckets.setdefault(category, {}).setdefault(str(hour), [0, 0])
+
+	for t in raw.get("transactions", []):
+		try:
+			when = datetime.fromisoformat(t.get("time_iso") or t.get("time"))
+		except (TypeError, ValueError):
+			continue
+		if day_start <= when < day_end:
+			bucket(t.get("category", "trucker"), when.hour)[0] += int(t.get("amount", 0))
+	for s in raw.get("sessions", []):
+		try:
+			start_dt = datetime.fromisoformat(s.get("start_iso") or s.get("start"))
+			end_dt = datetime.fromisoformat(s["end_iso"]) if s.get("end_iso") else now
+		except (TypeError, ValueError):
+			continue
+		cursor = max(start_dt, day_start)
+		end_dt = min(end_dt, day_end)
+		# Режем сессию по границам часов
+		while cursor < end_dt:
+			next_hour = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+			part_end = min(next_hour, end_dt)
+			bucket(s.get("category", "trucker"), cursor.hour)[1] += int((part_end - cursor).total_seconds())
+			cursor = part_end
+	return buckets
+
+
+def rollup_day(raw: Dict[str, Any], day: Optional[date] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+	"""Свёртка одного дня для индекса: продажи по категориям и предметам.
+
+	Время сессии распределяется по предметам (поле seconds): отрезок от начала сессии или
+	предыдущей продажи до продажи достаётся проданным в этот момент предметам (пропорционально
+	доходу), хвост после последней продажи — всем предметам сессии. Если day не задан,
+	время не распределяется.
+	"""
+	items: Dict[str, Dict[str, Dict[str, Any]]] = {}
+	sales: List[Tuple[str, str, datetime, int]] = []
+	for t in raw.get("transactions", []):
+		sale = sale_fields(t)
+		if not sale.get("item"):
+			continue
+		category = t.get("category", "trucker")
+		entry = items.setdefault(category, {}).setdefault(sale["item"], {"qty": 0, "amount": 0, "count": 0, "seconds": 0})
+		amount = int(t.get("amount", 0))
+		entry["amount"] += amount
+		entry["count"] += 1
+		if sale.get("qty"):
+			entry["qty"] += sale["qty"]
+		if sale.get("unit"):
+			entry["unit"] = sale["unit"]
+		if sale.get("level") is not None:
+			entry["level"] = sale["level"]
+		if amount > 0:
+			try:
+				sales.append((category, sale["item"], datetime.fromisoformat(t.get("time_iso") or t.get("time")), amount))
+			except (TypeError, ValueError):
+				pass
+	has_open = False
+	if day is not None and sales:
+		now = now or datetime.now()
+		sales.sort(key=lambda x: x[2])
+		for s in raw.get("sessions", []):
+			category = s.get("category", "trucker")
+			has_open = has_open or not s.get("end_iso")
+			try:
+				start_dt = datetime.fromisoformat(s.get("start_iso") or s.get("start"))
+				end_dt = datetime.fromisoformat(s["end_iso"]) if s.get("end_iso") else now
+			except (TypeError, ValueError):
+				continue
+			day_start = datetime.combine(day, datetime.min.time())
+			start_dt = max(start_dt, day_start)
+			end_dt = min(end_dt, day_start + timedelta(days=1))
+			# Продажи сессии, сгруппированные по моменту (одно нажатие «Добавить» — одна группа)
+			batches: List[Tuple[datetime, Dict[str, int]]] = []
+			for cat, item, when, amount in sales:
+				if cat != category or not (start_dt <= when <= end_dt):
+					continue
+				if not batches or batches[-1][0] != when:
+					batches.append((when, {}))
+				batches[-1][1][item] = batches[-1][1].get(item, 0) + amount
+			if not batches:
+				continue
+			session_income: Dict[str, int] = {}
+			cursor = start_dt
+			for when, by_item in batches:
+				span = (when - cursor).total_seconds()
+				total = sum(by_item.values())
+				for item, amount in by_item.items():
+					items[category][item]["seconds"] += int(round(span * amount / total))
+					session_income[item] = session_income.get(item, 0) + amount
+				cursor = when
+			tail = (end_dt - cursor).total_seconds()
+			if tail > 0:
+				total = sum(session_income.values())
+				for item, amount in session_income.items():
+					items[category][item]["seconds"] += int(round(tail * amount / total))
+	else:
+		has_open = any(not s.get("end_iso") for s in raw.get("sessions", []))
+	result: Dict[str, Any] = {"items": items}
+	if day is not None:
+		result["hours"] = _hour_buckets(raw, day, now or datetime.now())
+	if has_open:
+		result["open"] = True
+	return result
+
+
+class DayIndex:
+	"""Индекс свёрток по дням (data/index.json).
+
+	Держится в памяти и пишется на диск при flush(). У каждой записи есть подпись файла
+	дня (размер, mtime); если файл менялся в обход DayStorage, свёртка пересчитывается.
+	"""
+
+	FILE = "index.json"
+	VERSION = 4
+
+	def __init__(self, storage: "DayStorage") -> None:
+		self.storage = storage
+		self.path = os.path.join(storage.data_dir, self.FILE)
+		self._lock = threading.Lock()
+		self._days: Optional[Dict[str, Dict[str, Any]]] = None
+		self._dirty = False
+
+	def _entries(self) -> Dict[str, Dict[str, Any]]:
+		if self._days is None:
+			days: Dict[str, Dict[str, Any]] = {}
+			try:
+				with open(self.path, "r", encoding="utf-8") as f:
+					raw = json.load(f)
+				if raw.get("version") == self.VERSION:
+					days = dict(raw.get("days", {}))
+			except Exception:
+				pass
+			self._days = days
+		return self._days
+
+	def _signature(self, day: date) -> Optional[List[int]]:
+		try:
+			st = os.stat(self.storage._file_for(day))
+			sig = [st.st_size, st.st_mtime_ns]
+		except OSError:
+			sig = None
+		try:
+			# Правки из журнала тоже меняют свёртку
+			jst = os.stat(self.storage._journal_for(day))
+			return (sig or [0, 0]) + [jst.st_size, jst.st_mtime_ns]
+		except OSError:
+			return sig
+
+	def update(self, day: date, data: Dict[str, Any]) -> None:
+		entry = rollup_day(data, day)
+		entry["sig"] = self._signature(day)
+		with self._lock:
+			self._entries()[day.isoformat()] = entry
+			self._dirty = True
+
+	def remove(self, day: date) -> None:
+		with self._lock:
+			if self._entries().pop(day.isoformat(), None) is not None:
+				self._dirty = True
+
+	def clear(self) -> None:
+		with self._lock:
+			self._days = {}
+			self._dirty = False
+		try:
+			os.remove(self.path)
+			self.storage._account(self.path, 0)
+		except OSError:
+			pass
+
+	def save(self) -> None:
+		with self._lock:
+			if not self._dirty or self._days is None:
+				return
+			payload = {"version": self.VERSION, "days": self._days}
+			try:
+				tmp = self.path + ".tmp"
+				with open(tmp, "w", encoding="utf-8") as f:
+					json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+					size = f.tell()
+				os.replace(tmp, self.path)
+				self.storage._account(self.path, size)
+				self._dirty = False
+			except Exception:
+				pass
+
+	def rollup(self, day: date) -> Dict[str, Any]:
+		"""Свёртка дня; пересчитывается, если файл дня новее записи индекса.
+
+		День с незакрытой сессией (обычно сегодняшний) свёртывается заново при каждом
+		чтении, чтобы время шло, — это один файл.
+		"""
+		with self._lock:
+			entry = self._entries().get(day.isoformat())
+		if entry is not None and entry.get("open"):
+			return rollup_day(self.storage.load_day(day), day)
+		sig = self._signature(day)
+		if entry is not None and entry.get("sig") == sig:
+			return entry
+		with self.storage._pending_lock:
+			pending = day in self.storage._pending
+		if entry is not None and pending:
+			return entry
+		self.update(day, self.storage.load_day(day))
+		with self._lock:
+			return self._entries()[day.isoformat()]
+
+	def rollups(self, start: date, end: date) -> Iterator[Tuple[date, Dict[str, Any]]]:
+		for d in self.storage.days_between(start, end):
+			yield d, self.rollup(d)
+
+	def items_between(self, start: date, end: date, category: Optional[str] = None) -> Dict[Tuple[str, str], Dict[str, Any]]:
+		"""Сумма продаж по (категория, предмет) за период: qty, amount, count, seconds, unit, avg_price."""
+		result: Dict[Tuple[str, str], Dict[str, Any]] = {}
+		for _d, entry in self.rollups(start, end):
+			for cat, items in entry.get("items", {}).items():
+				if category is not None and cat != category:
+					continue
+				for item, stats in items.items():
+					acc = result.setdefault((cat, item), {"qty": 0, "amount": 0, "count": 0, "seconds": 0})
+					for key in ("qty", "amount", "count", "seconds"):
+						acc[key] += stats.get(key, 0)
+					for key in ("unit", "level"):
+						if key in stats:
+							acc[key] = stats[key]
+		for acc in result.values():
+			acc["avg_price"] = (acc["amount"] / acc["qty"]) if acc["qty"] else None
+		return result
+
+	def hour_grid(self, start: date, end: date, category: Optional[str] = None) -> Tuple[List[List[int]], List[List[int]]]:
+		"""Сетки 7×24 (день недели × час) сумм чистой прибыли и отработанных секунд за период."""
+		net = [[0] * 24 for _ in range(7)]
+		seconds = [[0] * 24 for _ in range(7)]
+		for d, entry in self.rollups(start, end):
+			weekday = d.weekday()
+			for cat, hours in entry.get("hours", {}).items():
+				if category is not None and cat != category:
+					continue
+				for hour, (h_net, h_sec) in hours.items():
+					net[weekday][int(hour)] += h_net
+					seconds[weekday][int(hour)] += h_sec
+		return net, seconds
+
+	def item_series(self, item: str, start: date, end: date, category: Optional[str] = None) -> List[Tuple[date, float, int]]:
+		"""Динамика по предмету: (день, количество, сумма) — например, тренд цены руды."""
+		series: List[Tuple[date, float, int]] = []
+		for d, entry in self.rollups(start, end):
+			qty, amount = 0, 0
+			found = False
+			for cat, items in entry.get("items", {}).items():
+				if (category is None or cat == category) and item in items:
+					found = True
+					qty += items[item].get("qty", 0)
+					amount += items[item].get("amount", 0)
+			if found:
+				series.append((d, qty, amount))
+		return series
+
+
+# Окна скользящего темпа (в минутах) и постоянная времени EWMA (в секундах работы)
+RATE_WINDOWS = (15, 60)
+RATE_RING_MINUTES = 60
+RATE_EWMA_TAU = 600.0
+# Меньше стольких секунд работы в окне — темп не показывается
+RATE_MIN_SECONDS = 60.0
+
+
+class _RateRing:
+	"""Кольцо поминутных корзин (чистая прибыль, секунды работы) одной категории."""
+
+	def __init__(self) -> None:
+		self.minute: Optional[int] = None  # номер текущей минуты (timestamp // 60)
+		self.slot_minute: List[Optional[int]] = [None] * RATE_RING_MINUTES
+		self.slot_net: List[int] = [0] * RATE_RING_MINUTES
+		self.slot_sec: List[float] = [0.0] * RATE_RING_MINUTES
+		# Суммы по окнам поддерживаются инкрементально при смене минуты
+		self.win_net: Dict[int, int] = {w: 0 for w in RATE_WINDOWS}
+		self.win_sec: Dict[int, float] = {w: 0.0 for w in RATE_WINDOWS}
+		self.ewma_net = 0.0
+		self.ewma_sec = 0.0
+		self.samples: List[Optional[float]] = [None] * RATE_RING_MINUTES  # EWMA на конец минуты
+		self.running_since: Optional[float] = None
+		self.last: Optional[float] = None
+
+	def clear_slots(self) -> None:
+		self.slot_minute = [None] * RATE_RING_MINUTES
+		self.slot_net = [0] * RATE_RING_MINUTES
+		self.slot_sec = [0.0] * RATE_RING_MINUTES
+		self.samples = [None] * RATE_RING_MINUTES
+		self.win_net = {w: 0 for w in RATE_WINDOWS}
+		self.win_sec = {w: 0.0 for w in RATE_WINDOWS}
+
+	def ewma_rate(self) -> Optional[float]:
+		if self.ewma_sec < RATE_MIN_SECONDS:
+			return None
+		return self.ewma_net / (self.ewma_sec / 3600.0)
+
+	def roll_to(self, minute: int) -> None:
+		if self.minute is None or minute - self.minute > RATE_RING_MINUTES:
+			# Первый вызов или долгий перерыв: всё кольцо устарело
+			self.clear_slots()
+			self.minute = minute
+			return
+		while self.minute < minute:
+			self.samples[self.minute % RATE_RING_MINUTES] = self.ewma_rate()
+			self.minute += 1
+			for w in RATE_WINDOWS:
+				old = self.minute - w
+				i = old % RATE_RING_MINUTES
+				if self.slot_minute[i] == old:
+					self.win_net[w] -= self.slot_net[i]
+					self.win_sec[w] -= self.slot_sec[i]
+			i = self.minute % RATE_RING_MINUTES
+			self.slot_minute[i] = self.minute
+			self.slot_net[i] = 0
+			self.slot_sec[i] = 0.0
+
+	def add_net(self, amount: int) -> None:
+		i = self.minute % RATE_RING_MINUTES
+		if self.slot_minute[i] != self.minute:
+			self.slot_minute[i] = self.minute
+			self.slot_net[i] = 0
+			self.slot_sec[i] = 0.0
+		self.slot_net[i] += amount
+		for w in RATE_WINDOWS:
+			self.win_net[w] += amount
+		self.ewma_net += amount
+
+	def adjust_net(self, ts: float, amount: int) -> None:
+		"""Поправка задним числом (правка, отмена): сумма со временем ts попадает в корзину
+		своей минуты, если та ещё в кольце, и в окна, которые её покрывают; в EWMA — с
+		затуханием за работу после ts. O(RATE_RING_MINUTES), без перечитывания дня."""
+		minute = min(int(ts // 60), self.minute)
+		oldest = self.minute - RATE_RING_MINUTES + 1
+		later_sec = 0.0
+		for m in range(max(minute + 1, oldest), self.minute + 1):
+			i = m % RATE_RING_MINUTES
+			if self.slot_minute[i] == m:
+				later_sec += self.slot_sec[i]
+		i = minute % RATE_RING_MINUTES
+		if minute >= oldest and self.slot_minute[i] == minute:
+			# Внутри своей минуты работа считается равномерной
+			span_end = min(self.last, (minute + 1) * 60.0)
+			span = span_end - minute * 60.0
+			if span > 0:
+				later_sec += self.slot_sec[i] * min(1.0, max(0.0, span_end - ts) / span)
+		self.ewma_net += amount * math.exp(-later_sec / RATE_EWMA_TAU)
+		if minute < oldest:
+			return
+		if self.slot_minute[i] != minute:
+			self.slot_minute[i] = minute
+			self.slot_net[i] = 0
+			self.slot_sec[i] = 0.0
+		self.slot_net[i] += amount
+		for w in RATE_WINDOWS:
+			if minute > self.minute - w:
+				self.win_net[w] += amount
+
+	def add_seconds(self, seconds: float) -> None:
+		i = self.minute % RATE_RING_MINUTES
+		if self.slot_minute[i] != self.minute:
+			self.slot_minute[i] = self.minute
+			self.slot_net[i] = 0
+			self.slot_sec[i] = 0.0
+		self.slot_sec[i] += seconds
+		for w in RATE_WINDOWS:
+			self.win_sec[w] += seconds
+		# EWMA по времени работы: старые продажи затухают, пока идёт работа
+		decay = math.exp(-seconds / RATE_EWMA_TAU)
+		self.ewma_net *= decay
+		self.ewma_sec = self.ewma_sec * decay + RATE_EWMA_TAU * (1.0 - decay)
+
+
+class RateTracker:
+	"""Потоковый темп заработка по категориям: последние 15 минут, последний час и EWMA.
+
+	Кольцо поминутных корзин обновляется за O(1) на транзакцию и на тик; день
+	целиком перечитывается только при seed (запуск, сброс, перечитывание, правка сессий).
+	"""
+
+	def __init__(self) -> None:
+		self._rings: Dict[str, _RateRing] = {}
+
+	def _ring(self, category: str) -> _RateRing:
+		ring = self._rings.get(category)
+		if ring is None:
+			ring = self._rings[category] = _RateRing()
+		return ring
+
+	def _advance(self, ring: _RateRing, ts: float) -> None:
+		if ring.last is None or ts < ring.last:
+			ring.roll_to(int(ts // 60))
+			ring.last = ts
+			return
+		if ring.running_since is not None:
+			# Время работы раскладывается по минутам, в которые оно пришлось
+			t = ring.last
+			while t < ts:
+				minute = int(t // 60)
+				ring.roll_to(minute)
+				piece_end = min(ts, (minute + 1) * 60.0)
+				ring.add_seconds(piece_end - t)
+				t = piece_end
+		ring.roll_to(int(ts // 60))
+		ring.last = ts
+
+	def start(self, category: str, when: datetime) -> None:
+		ring = self._ring(category)
+		ts = when.timestamp()
+		self._advance(ring, ts)
+		ring.running_since = ts
+
+	def stop(self, category: str, when: datetime) -> None:
+		ring = self._ring(category)
+		self._advance(ring, when.timestamp())
+		ring.running_since = None
+
+	def add(self, category: str, amount: int, when: datetime) -> None:
+		ring = self._ring(category)
+		self._advance(ring, when.timestamp())
+		ring.add_net(amount)
+
+	def adjust(self, category: str, amount: int, when: datetime) -> None:
+		"""Добавляет (или, с минусом, убирает) сумму транзакции со временем when, в том числе прошедшим."""
+		ring = self._ring(category)
+		ts = when.timestamp()
+		if ring.last is None or ts >= ring.last:
+			self.add(category, amount, when)
+		else:
+			ring.adjust_net(ts, amount)
+
+	def rates(self, category: str, now: Optional[datetime] = None) -> Dict[str, Optional[float]]:
+		"""Темп в час: {"15m", "60m", "ewma"}; None — в окне слишком мало работы."""
+		ring = self._ring(category)
+		self._advance(ring, (now or datetime.now()).timestamp())
+		out: Dict[str, Optional[float]] = {}
+		for w in RATE_WINDOWS:
+			sec = ring.win_sec[w]
+			out[f"{w}m"] = ring.win_net[w] / (sec / 3600.0) if sec >= RATE_MIN_SECONDS else None
+		out["ewma"] = ring.ewma_rate()
+		return out
+
+	def sparkline(self, category: str) -> List[Optional[float]]:
+		"""EWMA-темп на конец каждой из последних минут (старые → новые)."""
+		ring = self._ring(category)
+		if ring.minute is None:
+			return []
+		return [ring.samples[(ring.minute - RATE_RING_MINUTES + k) % RATE_RING_MINUTES] for k in range(RATE_RING_MINUTES)]
+
+	def seed(self, sessions: List[WorkSession], transactions: List[Transaction], now: Optional[datetime] = None) -> None:
+		"""Заполняет трекер по данным дня одним проходом по событиям, отсортированным по времени."""
+		now = now or datetime.now()
+		self._rings = {}
+		events: List[Tuple[datetime, int, str, int]] = []
+		for s in sessions:
+			events.append((datetime.fromisoformat(s.start_iso), 0, s.category, 0))
+			if s.end_iso:
+				events.append((datetime.fromisoformat(s.end_iso), 2, s.category, 0))
+		for t in transactions:
+			events.append((datetime.fromisoformat(t.time_iso), 1, t.category, t.amount))
+		events.sort(key=lambda e: (e[0], e[1]))
+		for when, order, category, amount in events:
+			if when > now:
+				when = now
+			if order == 0:
+				self.start(category, when)
+			elif order == 2:
+				self.stop(category, when)
+			else:
+				self.add(category, amount, when)
+		for category in list(self._rings):
+			self._advance(self._rings[category], now.timestamp())
+
+
+class AppState:
+	"""Логика учёта по дням и категориям."""
+
+	def __init__(self, storage: DayStorage) -> None:
+		self.storage = storage
+		self._listeners: List[Callable[[StateEvent], None]] = []
+		# Состояние batch(): глубина вложенности, отложенное сохранение и события
+		self._batch_depth = 0
+		self._batch_dirty = False
+		self._batch_events: List[StateEvent] = []
+		self._batch_backup: Optional[Tuple[date, List[WorkSession], List[Transaction], Dict[str, Optional[int]], list, list]] = None
+		self._batch_journal: List[Dict[str, Any]] = []
+		self.rates = RateTracker()
+		self._load(date.today())
+		self.rates.seed(self.sessions, self.transactions)
+
+	def _load(self, day: date) -> None:
+		self.day = day
+		self._set_data(self.storage.load_day(self.day))
+
+	def _set_data(self, raw: Dict[str, Any]) -> None:
+		self.sessions: List[WorkSession] = []
+		for s in raw.get("sessions", []):
+			self.sessions.append(
+				WorkSession(
+					start_iso=s.get("start_iso") or s.get("start") or s["start_iso"],
+					end_iso=s.get("end_iso"),
+					category=s.get("category", "trucker"),
+				)
+			)
+		self.transactions: List[Transaction] = [Transaction.from_dict(t) for t in raw.get("transactions", [])]
+
+		self._reindex_running()
+		# Шаги отмены/повтора текущего дня: (название, прямые операции, обратные операции)
+		self._undo: List[Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]] = []
+		self._redo: List[Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]] = []
+
+	def _reindex_running(self) -> None:
+		self._running_index_by_category: Dict[str, Optional[int]] = {"trucker": None, "farm": None, "mine": None, "fish": None, "mushroom": None, "logger": None}
+		for idx, s in enumerate(self.sessions):
+			if s.end_iso is None and self._running_index_by_category.get(s.category) is None:
+				self._running_index_by_category[s.category] = idx
+
+	def subscribe(self, listener: Callable[[StateEvent], None]) -> None:
+		"""Подписывает listener на изменения состояния (вызывается синхронно после сохранения)."""
+		if listener not in self._listeners:
+			self._listeners.append(listener)
+
+	def unsubscribe(self, listener: Callable[[StateEvent], None]) -> None:
+		try:
+			self._listeners.remove(listener)
+		except ValueError:
+			pass
+
+	def _emit(self, event: StateEvent) -> None:
+		if self._batch_depth:
+			self._batch_events.append(event)
+			return
+		self._dispatch(event)
+
+	def _dispatch(self, event: StateEvent) -> None:
+		for listener in list(self._listeners):
+			try:
+				listener(event)
+			except Exception:
+				# Сломанный подписчик не должен мешать остальным, но и молча пропадать тоже
+				append_log(self.storage.base_dir, f"listener {getattr(listener, '__qualname__', listener)} failed on {event.kind}:\n{traceback.format_exc()}")
+
+	@contextmanager
+	def batch(self) -> Iterator["AppState"]:
+		"""Группа изменений с одним сохранением дня; события рассылаются после блока.
+
+		Вложенные batch() сливаются с внешним. Если блок завершился исключением, изменения
+		в памяти откатываются, файл не пишется и события не рассылаются.
+		"""
+		self._batch_depth += 1
+		if self._batch_depth == 1:
+			self._batch_dirty = False
+			self._batch_events = []
+			self._batch_journal = []
+			self._batch_backup = (self.day, [replace(s) for s in self.sessions], [replace(t) for t in self.transactions], dict(self._running_index_by_category), list(self._undo), list(self._redo))
+		try:
+			yield self
+		except BaseException:
+			self._batch_depth -= 1
+			if self._batch_depth == 0:
+				backup, self._batch_backup = self._batch_backup, None
+				if backup is not None and backup[0] == self.day:
+					# Стек отмены восстанавливается целиком: у предела UNDO_LIMIT его длина не растёт
+					_day, self.sessions, self.transactions, self._running_index_by_category, self._undo, self._redo = backup
+					self.rates.seed(self.sessions, self.transactions)
+					self._batch_events = []
+					self._batch_journal = []
+					self._batch_dirty = False
+				else:
+					# День сменился внутри блока — откатывать некуда, сохраняем как есть
+					self._finish_batch()
+			raise
+		self._batch_depth -= 1
+		if self._batch_depth == 0:
+			self._batch_backup = None
+			self._finish_batch()
+
+	def _finish_batch(self) -> None:
+		events, self._batch_events = self._batch_events, []
+		ops, self._batch_journal = self._batch_journal, []
+		if self._batch_dirty:
+			# Полная запись дня уже содержит правки — журнал не нужен
+			self._batch_dirty = False
+			self._autosave()
+		elif ops:
+			# Свёртку дня индекс пересчитает при чтении
+			self.storage.append_journal(self.day, ops)
+		# Подряд идущие добавления одной категории — одно событие с суммарной delta
+		merged: List[StateEvent] = []
+		for event in events:
+			last = merged[-1] if merged else None
+			if event.kind == "transaction_added" and last is not None and last.kind == "transaction_added" and last.category == event.category:
+				merged[-1] = StateEvent(kind="transaction_added", category=event.category, delta=last.delta + event.delta, transaction=event.transaction)
+			elif event.kind == "edited" and any(e.kind == "edited" for e in merged):
+				continue
+			else:
+				merged.append(event)
+		for event in merged:
+			self._dispatch(event)
+
+	def roll_day(self, today: Optional[date] = None) -> bool:
+		"""Переход на новый день: открытые сессии режутся в 00:00 и продолжаются в новом дне.
+
+		Файл завершённого дня пишется в фоне (DayStorage.save_day_background).
+		Возвращает True, если день сменился.
+		"""
+		today = today or date.today()
+		if today <= self.day:
+			return False
+		while self.day < today:
+			next_day = self.day + timedelta(days=1)
+			midnight = datetime.combine(next_day, datetime.min.time()).isoformat(timespec="seconds")
+			carried: List[str] = []
+			for category, idx in self._running_index_by_category.items():
+				if idx is not None:
+					self.sessions[idx].end_iso = midnight
+					carried.append(category)
+			self.storage.save_day_background(self.day, self._snapshot())
+			self._load(next_day)
+			for category in carried:
+				if self._running_index_by_category.get(category) is None:
+					self.sessions.append(WorkSession(start_iso=midnight, category=category))
+					self._running_index_by_category[category] = len(self.sessions) - 1
+		self._autosave()
+		self._emit(StateEvent(kind="day_rolled"))
+		return True
+
+	def _ensure_day(self) -> None:
+		# Страховка на случай, если таймер полуночи не сработал (сон системы и т.п.)
+		if date.today() != self.day:
+			self.roll_day()
+
+	def start(self, category: str) -> None:
+		self._ensure_day()
+		if self._running_index_by_category.get(category) is not None:
+			return
+		now = datetime.now()
+		session = WorkSession(start_iso=now.isoformat(timespec="seconds"), category=category)
+		self.sessions.append(session)
+		self.rates.start(category, now)
+		self._running_index_by_category[category] = len(self.sessions) - 1
+		self._autosave()
+		self._emit(StateEvent(kind="session_started", category=category, session=session))
+
+	def stop(self, category: str) -> None:
+		self._ensure_day()
+		idx = self._running_index_by_category.get(category)
+		if idx is None:
+			return
+		now = datetime.now()
+		self.sessions[idx].end_iso = now.isoformat(timespec="seconds")
+		self._running_index_by_category[category] = None
+		self.rates.stop(category, now)
+		self._autosave()
+		self._emit(StateEvent(kind="session_stopped", category=category, session=self.sessions[idx]))
+
+	def add_income(self, amount: int, note: str = "", category: str = "trucker", **sale: Any) -> None:
+		"""sale — необязательные поля строки продажи: item, qty, unit, unit_price, level."""
+		self._add_transaction(amount=abs(amount), ttype="income", note=note, category=category, sale=sale)
+
+	def add_expense(self, amount: int, note: str = "", category: str = "trucker", **sale: Any) -> None:
+		self._add_transaction(amount=-abs(amount), ttype="expense", note=note, category=category, sale=sale)
+
+	def add_many(self, entries: Iterable[Dict[str, Any]]) -> List[Transaction]:
+		"""Добавляет пачку транзакций с одним временем, одним сохранением дня и одним событием на категорию.
+
+		Запись: {"amount": сумма со знаком (минус — расход), "category", "note", ...поля продажи}.
+		Пачка проверяется целиком до записи (целая сумма, известная категория, поля продажи):
+		при ошибке не добавляется ничего.
+		"""
+		self._ensure_day()
+		now = datetime.now()
+		time_iso = now.isoformat(timespec="seconds")
+		pending: List[Transaction] = []
+		for entry in entries:
+			entry = dict(entry)
+			amount = entry.pop("amount")
+			category = entry.pop("category", "trucker")
+			note = entry.pop("note", "")
+			pending.append(self._make_transaction(amount, None, note, category, entry, time_iso))
+		with self.batch():
+			first = len(self.transactions)
+			for tx in pending:
+				self._append_transaction(tx, now)
+			if pending:
+				self._record(
+					f"добавление {len(pending)} записей" if len(pending) > 1 else "добавление записи",
+					[{"op": "tins", "i": first + k, "v": tx.to_dict()} for k, tx in enumerate(pending)],
+					[{"op": "tdel", "i": first + k} for k in reversed(range(len(pending)))],
+				)
+		return pending
+
+	@staticmethod
+	def _make_transaction(amount: int, ttype: Optional[str], note: str, category: str, sale: Dict[str, Any], time_iso: str) -> Transaction:
+		"""Проверяет поля и собирает транзакцию; ttype=None — тип по знаку суммы."""
+		# bool — подкласс int, но суммой не является
+		if not isinstance(amount, int) or isinstance(amount, bool):
+			raise TypeError(f"Сумма должна быть целым числом: {amount!r}")
+		if ttype is None:
+			ttype = "income" if amount >= 0 else "expense"
+		if category not in CATEGORY_LABELS:
+			raise ValueError(f"Неизвестная категория: {category}")
+		unknown = set(sale) - set(SALE_FIELDS)
+		if unknown:
+			raise TypeError(f"Неизвестные поля продажи: {', '.join(sorted(unknown))}")
+		return Transaction(amount=amount, type=ttype, note=note, time_iso=time_iso, category=category, **sale)
+
+	def _add_transaction(self, amount: int, ttype: str, note: str, category: str, sale: Optional[Dict[str, Any]] = None) -> None:
+		self._ensure_day()
+		now = datetime.now()
+		tx = self._make_transaction(amount, ttype, note, category, sale or {}, now.isoformat(timespec="seconds"))
+		index = len(self.transactions)
+		self._append_transaction(tx, now)
+		self._record("добавление записи", [{"op": "tins", "i": index, "v": tx.to_dict()}], [{"op": "tdel", "i": index}])
+
+	def _append_transaction(self, tx: Transaction, now: datetime) -> None:
+		self.transactions.append(tx)
+		self.rates.add(tx.category, tx.amount, now)
+		self._autosave()
+		self._emit(StateEvent(kind="transaction_added", category=tx.category, delta=tx.amount, transaction=tx))
+
+	def reset(self) -> None:
+		"""Очищает текущий день в памяти и на диске."""
+		self.sessions = []
+		self.transactions = []
+		self._running_index_by_category = {"trucker": None, "farm": None, "mine": None, "fish": None, "mushroom": None, "logger": None}
+		self._undo = []
+		self._redo = []
+		self.rates = RateTracker()
+		self._autosave()
+		self._emit(StateEvent(kind="reset"))
+
+	def day_data(self) -> Dict[str, Any]:
+		"""Записи текущего дня в формате файла дня (копия)."""
+		return self._snapshot()
+
+	def replace_day(self, data: Dict[str, Any]) -> None:
+		"""Заменяет записи текущего дня (данные в формате файла дня) и сохраняет день.
+
+		Для импорта: файл сегодняшнего дня пишет только AppState, иначе запись из
+		другого потока могла бы затереть свежие транзакции. Стек отмены сбрасывается.
+		"""
+		self._ensure_day()
+		self._set_data(data)
+		self.rates.seed(self.sessions, self.transactions)
+		self._autosave()
+		self._emit(StateEvent(kind="reloaded"))
+
+	def reload(self) -> None:
+		"""Перечитывает текущий день с диска (например, после импорта истории)."""
+		self.storage.flush()
+		self._load(self.day)
+		self.rates.seed(self.sessions, self.transactions)
+		self._emit(StateEvent(kind="reloaded"))
+
+	# --- Правка, удаление, отмена ---
+
+	def _record(self, label: str, forward: List[Dict[str, Any]], inverse: List[Dict[str, Any]]) -> None:
+		self._undo.append((label, forward, inverse))
+		del self._undo[:-UNDO_LIMIT]
+		self._redo = []
+
+	def _apply_edit(self, ops: List[Dict[str, Any]]) -> None:
+		"""Применяет операции в памяти и дописывает их в журнал дня (без перезаписи файла).
+
+		Правка транзакции стоит O(1): темп получает разницу сумм (RateTracker.adjust), а
+		свёртку дня индекс пересчитает при следующем чтении. Правка
+		сессии перестраивает индекс идущих сессий и темп дня. Событие edited рассылает
+		вызывающий — после обновления стеков отмены.
+		"""
+		sessions_changed = False
+		for op in ops:
+			if op["op"][0] == "t":
+				self._apply_tx_op(op)
+			else:
+				apply_journal_ops(self.sessions, self.transactions, [op], as_objects=True)
+				sessions_changed = True
+		if sessions_changed:
+			self._reindex_running()
+			self.rates.seed(self.sessions, self.transactions)
+		if self._batch_depth:
+			self._batch_journal.extend(ops)
+		else:
+			self.storage.append_journal(self.day, ops)
+
+	def _apply_tx_op(self, op: Dict[str, Any]) -> None:
+		"""Одна операция над транзакцией с поправкой темпа на разницу сумм."""
+		index = int(op["i"])
+
+		def key(t: Transaction) -> Tuple[str, int, str]:
+			return t.category, t.amount, t.time_iso
+
+		# tset меняет объект на месте — старые поля запоминаем до применения
+		old = None if op["op"] == "tins" else key(self.transactions[index])
+		apply_journal_ops(self.sessions, self.transactions, [op], as_objects=True)
+		new = None if op["op"] == "tdel" else key(self.transactions[index])
+		if old == new:
+			return
+		if old is not None:
+			self.rates.adjust(old[0], -old[1], datetime.fromisoformat(old[2]))
+		if new is not None:
+			self.rates.adjust(new[0], new[1], datetime.fromisoformat(new[2]))
+
+	def _edit(self, label: str, forward: List[Dict[str, Any]], inverse: List[Dict[str, Any]]) -> None:
+		self._apply_edit(forward)
+		self._record(label, forward, inverse)
+		self._emit(StateEvent(kind="edited"))
+
+	def _check_index(self, items: list, index: int) -> None:
+		if not 0 <= index < len(items):
+			raise IndexError(f"Нет записи с номером {index}")
+
+	def edit_transaction(self, index: int, **changes: Any) -> None:
+		"""Меняет поля транзакции дня: amount (со знаком), type, note, category, поля продажи.
+
+		Если у продажи с количеством меняется сумма, а цена не передана, цена пересчитывается.
+		"""
+		self._ensure_day()
+		self._check_index(self.transactions, index)
+		tx = self.transactions[index]
+		unknown = set(changes) - set(EDITABLE_TX_FIELDS)
+		if unknown:
+			raise TypeError(f"Нельзя изменить поля: {', '.join(sorted(unknown))}")
+		if "category" in changes and changes["category"] not in CATEGORY_LABELS:
+			raise ValueError(f"Неизвестная категория: {changes['category']}")
+		if "amount" in changes:
+			changes["amount"] = int(changes["amount"])
+			changes.setdefault("type", "income" if changes["amount"] >= 0 else "expense")
+			if tx.qty and "unit_price" not in changes:
+				changes["unit_price"] = round(abs(changes["amount"]) / tx.qty, 2)
+		ttype = changes.get("type", tx.type)
+		amount = changes.get("amount", tx.amount)
+		if ttype not in ("income", "expense") or (ttype == "income") != (amount >= 0):
+			raise ValueError("Знак суммы не соответствует типу записи")
+		changes = {k: v for k, v in changes.items() if getattr(tx, k) != v}
+		if not changes:
+			return
+		old = {k: getattr(tx, k) for k in changes}
+		self._edit("изменение записи", [{"op": "tset", "i": index, "v": changes}], [{"op": "tset", "i": index, "v": old}])
+
+	def delete_transaction(self, index: int) -> None:
+		self._ensure_day()
+		self._check_index(self.transactions, index)
+		tx = self.transactions[index]
+		self._edit("удаление записи", [{"op": "tdel", "i": index}], [{"op": "tins", "i": index, "v": tx.to_dict()}])
+
+	def edit_session(self, index: int, start_iso: Optional[str] = None, end_iso: Optional[str] = None) -> None:
+		"""Сдвигает границы сессии. У идущей сессии меняется только начало."""
+		self._ensure_day()
+		self._check_index(self.sessions, index)
+		session = self.sessions[index]
+		changes: Dict[str, Any] = {}
+		if start_iso is not None and start_iso != session.start_iso:
+			changes["start_iso"] = start_iso
+		if end_iso is not None and end_iso != session.end_iso:
+			if session.end_iso is None:
+				raise ValueError("Идущую сессию нужно сначала остановить")
+			changes["end_iso"] = end_iso
+		if not changes:
+			return
+		start_dt = datetime.fromisoformat(changes.get("start_iso", session.start_iso))
+		end_dt = datetime.fromisoformat(changes.get("end_iso", session.end_iso)) if session.end_iso else datetime.now()
+		if end_dt < start_dt:
+			raise ValueError("Конец сессии раньше начала")
+		old = {k: getattr(session, k) for k in changes}
+		self._edit("изменение сессии", [{"op": "sset", "i": index, "v": changes}], [{"op": "sset", "i": index, "v": old}])
+
+	def delete_session(self, index: int) -> None:
+		self._ensure_day()
+		self._check_index(self.sessions, index)
+		session = self.sessions[index]
+		self._edit("удаление сессии", [{"op": "sdel", "i": index}], [{"op": "sins", "i": index, "v": asdict(session)}])
+
+	def undo_label(self) -> Optional[str]:
+		return self._undo[-1][0] if self._undo else None
+
+	def redo_label(self) -> Optional[str]:
+		return self._redo[-1][0] if self._redo else None
+
+	def undo(self) -> Optional[str]:
+		"""Отменяет последний шаг дня; возвращает его название или None, если отменять нечего."""
+		self._ensure_day()
+		if not self._undo:
+			return None
+		label, forward, inverse = self._undo.pop()
+		self._apply_edit(inverse)
+		self._redo.append((label, forward, inverse))
+		self._emit(StateEvent(kind="edited"))
+		return label
+
+	def redo(self) -> Optional[str]:
+		self._ensure_day()
+		if not self._redo:
+			return None
+		label, forward, inverse = self._redo.pop()
+		self._apply_edit(forward)
+		self._undo.append((label, forward, inverse))
+		self._emit(StateEvent(kind="edited"))
+		return label
+
+	def is_running(self, category: Optional[str] = None) -> bool:
+		if category is not None:
+			return self._running_index_by_category.get(category) is not None
+		return any(idx is not None for idx in self._running_index_by_category.values())
+
+	def total_seconds(self, category: Optional[str] = None) -> int:
+		seconds = 0
+		for s in self.sessions:
+			if category is not None and s.category != category:
+				continue
+			seconds += s.duration_seconds()
+		return seconds
+
+	def total_income(self, category: Optional[str] = None) -> int:
+		return sum(t.amount for t in self.transactions if t.type == "income" and (category is None or t.category == category))
+
+	def total_expense(self, category: Optional[str] = None) -> int:
+		return -sum(t.amount for t in self.transactions if t.type == "expense" and (category is None or t.category == category))
+
+	def net_profit(self, category: Optional[str] = None) -> int:
+		return self.total_income(category) - self.total_expense(category)
+
+	def live_rates(self, category: str) -> Dict[str, Optional[float]]:
+		"""Текущий темп категории (см. RateTracker.rates), без пересчёта дня."""
+		return self.rates.rates(category)
+
+	def profit_per_hour(self, category: Optional[str] = None) -> float:
+		seconds = self.total_seconds(category)
+		if seconds <= 0:
+			return 0.0
+		return self.net_profit(category) / (seconds / 3600.0)
+
+	def current_session(self, category: str) -> Optional[WorkSession]:
+		idx = self._running_index_by_category.get(category)
+		return self.sessions[idx] if idx is not None else None
+
+	def last_session(self, category: str) -> Optional[WorkSession]:
+		for s in reversed(self.sessions):
+			if s.category == category:
+				return s
+		return None
+
+	def current_or_last_session(self, category: str) -> Optional[WorkSession]:
+		return self.current_session(category) or self.last_session(category)
+
+	def session_totals(self, session: WorkSession, category: Optional[str] = None) -> Tuple[int, int, int]:
+		start_dt = datetime.fromisoformat(session.start_iso)
+		end_dt = datetime.fromisoformat(session.end_iso) if session.end_iso else datetime.now()
+		inc = 0
+		exp = 0
+		for t in self.transactions:
+			if category is not None and t.category != category:
+				continue
+			time_dt = datetime.fromisoformat(t.time_iso)
+			if start_dt <= time_dt <= end_dt:
+				if t.type == "income":
+					inc += t.amount
+				else:
+					exp += -t.amount
+		return inc, exp, inc - exp
+
+	def _snapshot(self) -> Dict[str, Any]:
+		return {"sessions": [asdict(s) for s in self.sessions], "transactions": [t.to_dict() for t in self.transactions]}
+
+	def _autosave(self) -> None:
+		if self._batch_depth:
+			self._batch_dirty = True
+			return
+		self.storage.save_day(self.day, self._snapshot())
+
+
+# ------------------------
+# Вспомогательные функции
+# ------------------------
+
+def format_seconds(total_seconds: int) -> str:
+	hours = total_seconds // 3600
+	minutes = (total_seconds % 3600) // 60
+	seconds = total_seconds % 60
+	return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def parse_amount(text: str) -> Optional[int]:
+	if not text:
+		return None
+	clean = text.strip().replace(" ", "").replace(",", ".")
+	if not clean:
+		return None
+	try:
+		value = float(clean)
+		return int(value)
+	except ValueError:
+		return None
+
+
+def parse_decimal(text: str) -> Optional[float]:
+	if not text:
+		return None
+	clean = text.strip().replace(" ", "").replace(",", ".")
+	if not clean:
+		return None
+	try:
+		return float(clean)
+	except ValueError:
+		return None
+
+
+def compute_day_series(sessions: List[WorkSession], transactions: List[Transaction]) -> Tuple[List[datetime], List[int], List[float]]:
+	events: List[datetime] = [datetime.fromisoformat(t.time_iso) for t in transactions]
+	if not events:
+		return [], [], []
+	events.sort()
+	now_dt = datetime.now()
+	if events[-1] < now_dt:
+		events.append(now_dt)
+
+	tx_sorted = sorted(transactions, key=lambda t: t.time_iso)
+	tx_idx = 0
+	cum_net = 0
+	net_series: List[int] = []
+	rph_series: List[float] = []
+	for moment in events:
+		while tx_idx < len(tx_sorted) and datetime.fromisoformat(tx_sorted[tx_idx].time_iso) <= moment:
+			cum_net += tx_sorted[tx_idx].amount
+			tx_idx += 1
+		sec = 0
+		for s in sessions:
+			start_dt = datetime.fromisoformat(s.start_iso)
+			end_dt = datetime.fromisoformat(s.end_iso) if s.end_iso else moment
+			if moment <= start_dt:
+				continue
+			clip_end = min(end_dt, moment)
+			if clip_end > start_dt:
+				sec += int((clip_end - start_dt).total_seconds())
+		rph = (cum_net / (sec / 3600.0)) if sec > 0 else 0.0
+		net_series.append(cum_net)
+		rph_series.append(rph)
+	return events, net_series, rph_series
+
+
+def compute_last_n_days(storage: DayStorage, n: int) -> Tuple[List[date], List[int], List[float]]:
+	raw_days = storage.load_last_days(n)
+	dates_list: List[date] = []
+	net_per_day: List[int] = []
+	rph_per_day: List[float] = []
+	for d, raw in raw_days.items():
+		sessions = [WorkSession(**s) for s in raw.get("sessions", [])]
+		transactions = [Transaction.from_dict(t) for t in raw.get("transactions", [])]
+		net = sum(t.amount for t in transactions)
+		sec = 0
+		for s in sessions:
+			sec += WorkSession(**asdict(s)).duration_seconds()
+		rph = (net / (sec / 3600.0)) if sec > 0 else 0.0
+		dates_list.append(d)
+		net_per_day.append(net)
+		rph_per_day.append(rph)
+	return dates_list, net_per_day, rph_per_day
+
+
+def attach_parent_console() -> None:
+	"""Собранный exe оконный (--windowed): для консольных команд подключаемся к консоли родителя."""
+	if sys.stdout is not None or os.name != 'nt':
+		return
+	try:
+		import ctypes
+		ATTACH_PARENT_PROCESS = -1
+		if ctypes.windll.kernel32.AttachConsole(ATTACH_PARENT_PROCESS):
+			sys.stdout = open('CONOUT$', 'w', encoding='utf-8', newline='')
+			sys.stderr = sys.stdout
+	except Exception:
+		pass
+
+
+def session_seconds_on(session: WorkSession, day: date, now: Optional[datetime] = None) -> int:
+	"""Длительность сессии в пределах дня day; незакрытая сессия прошлого дня обрезается полночью."""
+	day_start = datetime.combine(day, datetime.min.time())
+	day_end = day_start + timedelta(days=1)
+	start_dt = datetime.fromisoformat(session.start_iso)
+	end_dt = datetime.fromisoformat(session.end_iso) if session.end_iso else min(now or datetime.now(), day_end)
+	seconds = (min(end_dt, day_end) - max(start_dt, day_start)).total_seconds()
+	return max(0, int(seconds))
+
+
+def period_key(day: date, granularity: str) -> str:
+	"""Ключ периода для агрегации: day | week | month | total."""
+	if granularity == "day":
+		return day.isoformat()
+	if granularity == "week":
+		year, week, _ = day.isocalendar()
+		return f"{year}-W{week:02d}"
+	if granularity == "month":
+		return day.strftime("%Y-%m")
+	if granularity == "total":
+		return "total"
+	raise ValueError(f"Неизвестная гранулярность: {granularity}")
+
+
+def aggregate_days(
+	days: Iterable[Tuple[date, Dict[str, Any]]],
+	granularity: str = "day",
+	categories: Optional[Iterable[str]] = None,
+	by_category: bool = False,
+) -> List[Dict[str, Any]]:
+	"""Сводит дни в строки {period, category, seconds, income, expense, net, per_hour, sessions, transactions}.
+
+	days — пары (день, сырые данные), например DayStorage.iter_days(). Без by_category
+	категории складываются в одну строку с category="all".
+	"""
+	wanted = set(categories) if categories else None
+	rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+	now = datetime.now()
+
+	def row_for(period: str, category: str) -> Dict[str, Any]:
+		key = (period, category if by_category else "all")
+		row = rows.get(key)
+		if row is None:
+			row = {"period": key[0], "category": key[1], "seconds": 0, "income": 0, "expense": 0, "net": 0, "per_hour": 0.0, "sessions": 0, "transactions": 0}
+			rows[key] = row
+		return row
+
+	for d, raw in days:
+		period = period_key(d, granularity)
+		for s in raw.get("sessions", []):
+			category = s.get("category", "trucker")
+			if wanted is not None and category not in wanted:
+				continue
+			session = WorkSession(start_iso=s.get("start_iso") or s.get("start"), end_iso=s.get("end_iso"), category=category)
+			row = row_for(period, category)
+			row["seconds"] += session_seconds_on(session, d, now)
+			row["sessions"] += 1
+		for t in raw.get("transactions", []):
+			category = t.get("category", "trucker")
+			if wanted is not None and category not in wanted:
+				continue
+			amount = int(t.get("amount", 0))
+			row = row_for(period, category)
+			if t.get("type") == "income":
+				row["income"] += amount
+			else:
+				row["expense"] += -amount
+			row["net"] += amount
+			row["transactions"] += 1
+	result = sorted(rows.values(), key=lambda r: (r["period"], r["category"]))
+	for row in result:
+		row["per_hour"] = round(row["net"] / (row["seconds"] / 3600.0), 2) if row["seconds"] > 0 else 0.0
+	return result
@@ -2,7 +2,10 @@
 """
 Небольшой обновлятор: ждёт завершения целевого приложения, подменяет exe и запускает его.
 Использование:
-  updater.exe --app-path "C:\\path\\GrimmStats.exe" --source-exe "C:\\path\\new.exe" [--backup]
+  updater.exe --app-path "C:\\path\\GrimmStats.exe" --source-exe "C:\\path\\new.exe" [--parent-pid PID ...] [--backup]
+Если переданы --parent-pid, обновлятор ждёт завершения этих процессов по их дескрипторам
+(без опроса блокировки файла) и делает одну атомарную замену. Время этапов пишется
+в updater.log строкой "timing key=value ...".
 """
 import argparse
 import os
@@ -53,21 +56,67 @@ def wait_for_unlock(path: str, timeout_sec: int = 60) -> bool:
     return not is_file_locked(path)
 
 
-def replace_file(target: str, source: str, backup: bool = True) -> None:
-    os.makedirs(os.path.dirname(target), exist_ok=True)
-    # Подождём освобождения файла
-    _log(f"wait unlock: {target}")
-    wait_for_unlock(target, 120)
+def _wait_process_windows(pid: int, timeout_sec: float) -> bool | None:
+    """Ждёт процесс через WaitForSingleObject. None — дескриптор получить не удалось."""
+    SYNCHRONIZE = 0x00100000
+    WAIT_OBJECT_0 = 0x0
+    ERROR_INVALID_PARAMETER = 87
+    kernel32 = ctypes.windll.kernel32
+    kernel32.OpenProcess.restype = ctypes.c_void_p
+    kernel32.WaitForSingleObject.argtypes = [ctypes.c_void_p, ctypes.c_uint32]
+    kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+    handle = kernel32.OpenProcess(SYNCHRONIZE, False, int(pid))
+    if not handle:
+        # Процесса с таким PID уже нет
+        if kernel32.GetLastError() == ERROR_INVALID_PARAMETER:
+            return True
+        return None
+    try:
+        return kernel32.WaitForSingleObject(handle, int(timeout_sec * 1000)) == WAIT_OBJECT_0
+    finally:
+        kernel32.CloseHandle(handle)
 
-    # Резервная копия
-    if backup and os.path.exists(target):
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def wait_for_process(pid: int, timeout_sec: float = 60) -> bool:
+    """Блокируется до завершения процесса pid. True — процесс завершился."""
+    if pid <= 0 or pid == os.getpid():
+        return True
+    if os.name == 'nt':
         try:
-            shutil.copy2(target, target + '.bak')
-            _log("backup created")
-        except Exception:
-            _log("backup create failed")
+            done = _wait_process_windows(pid, timeout_sec)
+            if done is not None:
+                return done
+        except Exception as e:
+            _log(f"process wait failed: {e}")
+        return False
+    # Переносимый фолбэк: проверка существования процесса с коротким шагом
+    deadline = time.monotonic() + timeout_sec
+    while _pid_alive(pid):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.02)
+    return True
 
-    # Жёсткая замена
+
+def replace_file(target: str, source: str, backup: bool = True,
+                 parent_pids: list[int] | None = None, timing: dict | None = None) -> None:
+    timing = timing if timing is not None else {}
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    # Готовим новый exe рядом с целевым, пока приложение ещё закрывается
+    t0 = time.perf_counter()
     tmp_target = target + '.tmp'
     if os.path.exists(tmp_target):
         try:
@@ -75,19 +124,53 @@ def replace_file(target: str, source: str, backup: bool = True) -> None:
         except Exception:
             pass
     shutil.copy2(source, tmp_target)
-    # Несколько попыток замены (на случай блокировки синхронизатора/антивируса)
+    timing['stage'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    waited = False
+    if parent_pids:
+        waited = all(wait_for_process(pid, 60) for pid in parent_pids)
+        _log(f"wait parents {parent_pids}: {'exited' if waited else 'timeout/unknown'}")
+    if not waited:
+        # Старый путь: PID не передан или ожидание не удалось — опрашиваем блокировку файла
+        _log(f"wait unlock: {target}")
+        wait_for_unlock(target, 120)
+    timing['wait'] = time.perf_counter() - t0
+
+    # Резервная копия: жёсткая ссылка мгновенна, копия — если ФС её не поддерживает
+    t0 = time.perf_counter()
+    if backup and os.path.exists(target):
+        bak = target + '.bak'
+        try:
+            if os.path.exists(bak):
+                os.remove(bak)
+            try:
+                os.link(target, bak)
+            except Exception:
+                shutil.copy2(target, bak)
+            _log("backup created")
+        except Exception:
+            _log("backup create failed")
+    timing['backup'] = time.perf_counter() - t0
+
+    # Атомарная замена. Повторы с нарастающей паузой — только если файл
+    # ещё держит антивирус/синхронизатор
+    t0 = time.perf_counter()
     last_err: Exception | None = None
-    for attempt in range(1, 61):
+    delay = 0.05
+    for attempt in range(1, 13):
         try:
             os.replace(tmp_target, target)
-            _log(f"replace success on attempt {attempt}")
+            if attempt > 1:
+                _log(f"replace success on attempt {attempt}")
             last_err = None
             break
         except Exception as e:
             last_err = e
-            if attempt in (1, 10, 30, 60):
-                _log(f"replace failed (attempt {attempt}): {e}")
-            time.sleep(1.0)
+            _log(f"replace failed (attempt {attempt}): {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+    timing['swap'] = time.perf_counter() - t0
     if last_err is not None:
         # На случай упорной блокировки — пробуем прямую копию
         try:
@@ -148,8 +231,13 @@ def main() -> int:
     parser.add_argument('--source-exe', required=False, help='Путь к новому exe (временный/локальный)')
     parser.add_argument('--backup', action='store_true', default=True)
     parser.add_argument('--start-args', default='')
-    args = parser.parse_args()
-    _log(f"start: app={args.app_path} source={args.source_exe}")
+    parser.add_argument('--parent-pid', type=int, action='append', default=[],
+                        help='PID процесса, завершения которого нужно дождаться (можно несколько)')
+    args, unknown = parser.parse_known_args()
+    t_start = time.perf_counter()
+    _log(f"start: app={args.app_path} source={args.source_exe} parents={args.parent_pid}")
+    if unknown:
+        _log(f"ignored args: {unknown}")
 
     if not args.app_path or not args.source_exe:
         try:
@@ -163,14 +251,19 @@ def main() -> int:
     target = os.path.abspath(args.app_path)
     source = os.path.abspath(args.source_exe)
 
-    # Подождём завершения основного приложения (если updater запущен из него)
-    time.sleep(0.5)
+    timing: dict = {}
+
+    def _log_timing(result: str) -> None:
+        timing['total'] = time.perf_counter() - t_start
+        parts = ' '.join(f"{k}={v:.3f}" for k, v in timing.items())
+        _log(f"timing result={result} {parts}")
 
     try:
-        replace_file(target, source, backup=bool(args.backup))
+        replace_file(target, source, backup=bool(args.backup), parent_pids=args.parent_pid, timing=timing)
     except Exception as e:
         # Выведем ошибку и завершение
         _log(f"replace error: {e}")
+        _log_timing('replace_failed')
         return 1
 
     # Запустим обновлённое приложение
@@ -178,43 +271,27 @@ def main() -> int:
         cmd = [target]
         if args.start_args:
             cmd += args.start_args.split(' ')
+        t0 = time.perf_counter()
         subprocess.Popen(cmd, close_fds=True)
+        timing['launch'] = time.perf_counter() - t0
         _log("started updated app")
-        # После успешного запуска новой версии удалим резервную копию и временный файл
+        # После запуска новой версии удалим резервную копию и временный файл.
+        # Это отдельные файлы, их никто не держит — одна попытка, иначе удаление после перезагрузки
+        t0 = time.perf_counter()
         try:
-            def _try_remove(path: str) -> bool:
+            MOVEFILE_DELAY_UNTIL_REBOOT = 0x4
+            for leftover in (target + '.bak', target + '.tmp'):
+                if not os.path.exists(leftover):
+                    continue
                 try:
-                    if os.path.exists(path):
-                        os.remove(path)
-                    return True
+                    os.remove(leftover)
                 except Exception:
-                    return False
-
-            bak = target + '.bak'
-            tmp = target + '.tmp'
-            # до 60 попыток в течение ~30 сек (на случай задержки антивируса)
-            for _i in range(60):
-                ok_bak = True if (not os.path.exists(bak)) else _try_remove(bak)
-                ok_tmp = True if (not os.path.exists(tmp)) else _try_remove(tmp)
-                if ok_bak and ok_tmp:
-                    break
-                time.sleep(0.5)
-            # Если всё ещё не удалось — планируем удаление после перезагрузки
-            try:
-                if os.path.exists(bak):
-                    MOVEFILE_DELAY_UNTIL_REBOOT = 0x4
-                    import ctypes as _ct
-                    _ct.windll.kernel32.MoveFileExW(bak, None, MOVEFILE_DELAY_UNTIL_REBOOT)
-                    _log('scheduled .bak removal on reboot')
-                if os.path.exists(tmp):
-                    MOVEFILE_DELAY_UNTIL_REBOOT = 0x4
-                    import ctypes as _ct
-                    _ct.windll.kernel32.MoveFileExW(tmp, None, MOVEFILE_DELAY_UNTIL_REBOOT)
-                    _log('scheduled .tmp removal on reboot')
-            except Exception:
-                pass
+                    ctypes.windll.kernel32.MoveFileExW(leftover, None, MOVEFILE_DELAY_UNTIL_REBOOT)
+                    _log(f"scheduled {os.path.basename(leftover)} removal on reboot")
         except Exception:
             pass
+        timing['cleanup'] = time.perf_counter() - t0
+        _log_timing('ok')
     except Exception as e:
         _log(f"start error: {e}")
         # Попробуем откатиться на резервную копию и запустить её
@@ -225,9 +302,11 @@ def main() -> int:
                     cmd += args.start_args.split(' ')
                 subprocess.Popen(cmd, close_fds=True)
                 _log("rollback to backup and started")
+                _log_timing('rollback')
                 return 0
         except Exception as e2:
             _log(f"rollback error: {e2}")
+        _log_timing('start_failed')
         return 2
     return 0
 